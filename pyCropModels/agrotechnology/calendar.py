@@ -1,10 +1,69 @@
 """
 Global crop calendar
 """
+import os
 import datetime as dt
+import numpy as np
 import xarray as xr
 import math
 
+# dates are clamped into the simulated season, see calendar_dates
+EARLIEST_PLANT = "04-22"
+LATEST_HARVEST = "09-30"
+CLAMPED_HARVEST = "09-29"
+
+
+def calendar_dates(dataset: xr.Dataset, lon, lat, year="2022") -> dict:
+    """Sowing and harvest dates of many points from one crop calendar
+
+    Args:
+        dataset (xr.Dataset): crop calendar with "plant" and "harvest"
+            day-of-year on (latitude, longitude)
+        lon: array of longitudes
+        lat: array of latitudes
+        year (optional): year of the dates
+
+    Returns:
+        dict: "plant_day" and "harvest_day" as datetime64[D] arrays (NaT for
+            missing cells) and the "valid" mask
+    """
+    lon = np.atleast_1d(np.asarray(lon, dtype=float))
+    lat = np.atleast_1d(np.asarray(lat, dtype=float))
+    lat_idx = dataset.indexes["latitude"].get_indexer(lat, method="nearest")
+    lon_idx = dataset.indexes["longitude"].get_indexer(lon, method="nearest")
+    points = dataset[["plant", "harvest"]].isel(
+        latitude=xr.DataArray(lat_idx, dims="point"),
+        longitude=xr.DataArray(lon_idx, dims="point"),
+    )
+    plant_doy = points.plant.values.astype(float)
+    harvest_doy = points.harvest.values.astype(float)
+
+    first_day = np.datetime64(f"{year}-01-01", "D")
+    next_year = np.datetime64(f"{int(year) + 1}-01-01", "D")
+    days_in_year = (next_year - first_day).astype(int)
+    valid = np.isfinite(plant_doy) & np.isfinite(harvest_doy)
+    for doy in (plant_doy, harvest_doy):
+        valid &= (doy >= 1) & (doy < days_in_year + 1)
+
+    def to_date(doy):
+        days = np.where(valid, doy, 1).astype(int) - 1
+        return first_day + days.astype("timedelta64[D]")
+
+    plant_day = to_date(plant_doy)
+    harvest_day = to_date(harvest_doy)
+    plant_day = np.maximum(plant_day, np.datetime64(f"{year}-{EARLIEST_PLANT}", "D"))
+    harvest_day = np.where(
+        harvest_day > np.datetime64(f"{year}-{LATEST_HARVEST}", "D"),
+        np.datetime64(f"{year}-{CLAMPED_HARVEST}", "D"),
+        harvest_day,
+    )
+    not_a_time = np.datetime64("NaT", "D")
+    return {
+        "plant_day": np.where(valid, plant_day, not_a_time),
+        "harvest_day": np.where(valid, harvest_day, not_a_time),
+        "valid": valid,
+    }
+
 
 class Agrotechnology:
     """
@@ -13,9 +72,9 @@ class Agrotechnology:
     2. AWS: add reading files from AWS S3 storage or from source Drive files (archive?)
     """
 
-    def __init__(self) -> None:
+    def __init__(self, pathCalendar: str = "/home/mgasanov/agro/CropCalendar") -> None:
 
-        self.pathCalendar = "/home/mgasanov/agro/CropCalendar"
+        self.pathCalendar = pathCalendar
         self.dictCalendars = {
             "barley": "Barley.crop.calendar.fill.nc",
             "soybean": "Soybeans.crop.calendar.fill.nc",
@@ -23,27 +82,43 @@ class Agrotechnology:
             "maize": "Maize.crop.calendar.fill.nc",
             "wheat": "Wheat.crop.calendar.fill.nc",
         }
+        self._calendars = {}
+
+    def open_calendar(self, crop: str) -> xr.Dataset:
+        """Calendar of a crop, opened on first use and kept in memory"""
+        if crop not in self._calendars:
+            if crop not in self.dictCalendars:
+                msg = "No crop calendar for '%s', expected one of %s" % (
+                    crop,
+                    list(self.dictCalendars),
+                )
+                raise ValueError(msg)
+            path = os.path.join(self.pathCalendar, self.dictCalendars[crop])
+            with xr.open_dataset(path) as ds:
+                self._calendars[crop] = ds[["plant", "harvest"]].load()
+        return self._calendars[crop]
+
+    def getCropCalendars(self, crop: str, lon, lat, year="2022") -> dict:
+        """Sowing and harvest dates of many points, see calendar_dates
+
+        Args:
+            crop (str): key of dictCalendars
+            lon: array of longitudes
+            lat: array of latitudes
+            year (optional): year of the dates
+
+        Returns:
+            dict: "plant_day", "harvest_day" (datetime64[D]) and "valid"
+        """
+        return calendar_dates(self.open_calendar(crop), lon=lon, lat=lat, year=year)
 
     def getCropCalendar(
         self, dataset: xr.Dataset, lon: float, lat: float, year: str = "2022"
     ) -> dict:
 
-        harvest_flt = float(
-            dataset.sel(latitude=lat, longitude=lon, method="nearest").harvest.values
-        )
-        plant_flt = float(
-            dataset.sel(latitude=lat, longitude=lon, method="nearest").plant.values
-        )
-        if (math.isnan(harvest_flt)) or (math.isnan(plant_flt)):
+        dates = calendar_dates(dataset, lon=[lon], lat=[lat], year=year)
+        if not dates["valid"][0]:
             return {"plant_day": "NaN", "harvest_day": "NaN"}
-        harvest_day = str(
-            dt.datetime.strptime(f"{year} {int(harvest_flt)}", "%Y %j").date()
-        )
-        plant_day = str(
-            dt.datetime.strptime(f"{year} {int(plant_flt)}", "%Y %j").date()
-        )
-        if harvest_day > f"{year}-09-30":
-            harvest_day = f"{year}-09-29"
-        if plant_day < f"{year}-04-22":
-            plant_day = f"{year}-04-22"
+        harvest_day = str(dates["harvest_day"][0])
+        plant_day = str(dates["plant_day"][0])
         return {"plant_day": plant_day, "harvest_day": harvest_day}
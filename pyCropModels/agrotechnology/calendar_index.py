@@ -0,0 +1,208 @@
+"""
+Crop calendar on the weather grid
+
+The crop calendars and the NASA POWER grid have different resolutions.
+CalendarGridIndex resolves the calendar cell of every weather cell once per
+crop, keeps the sowing and harvest dates of every year per weather cell and
+is saved as a small npz file, so grid runs read dates by cell id.
+"""
+import os
+import logging
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from pyCropModels.agrotechnology.calendar import Agrotechnology, calendar_dates
+
+logger = logging.getLogger(__name__)
+
+
+class CalendarGridIndex:
+    """Sowing and harvest dates of every cell of a weather grid
+
+    Cell ids are flat indices lat_idx * n_lon + lon_idx of the grid, as in
+    PointExtractor.cell_id.
+
+    Args:
+        lat (np.ndarray): latitudes of the weather grid
+        lon (np.ndarray): longitudes of the weather grid
+        cells (dict): {crop: flat calendar cell of every weather cell}
+        dates (dict): {(crop, year): {"plant_day", "harvest_day", "valid"}}
+    """
+
+    def __init__(
+        self, lat: np.ndarray, lon: np.ndarray, cells: dict, dates: dict
+    ) -> None:
+        self.lat = np.asarray(lat, dtype=float)
+        self.lon = np.asarray(lon, dtype=float)
+        self.cells = cells
+        self._dates = dates
+
+    @classmethod
+    def build(
+        cls,
+        agrotechnology: Agrotechnology,
+        lat,
+        lon,
+        crops: Iterable[str],
+        years: Iterable,
+    ) -> "CalendarGridIndex":
+        """Regrid the crop calendars onto a weather grid
+
+        Args:
+            agrotechnology (Agrotechnology): source of the crop calendars
+            lat: latitudes of the weather grid
+            lon: longitudes of the weather grid
+            crops (Iterable[str]): keys of Agrotechnology.dictCalendars
+            years (Iterable): years of the dates
+
+        Returns:
+            CalendarGridIndex: index of the grid
+        """
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        lon_grid, lat_grid = np.meshgrid(lon, lat)
+        lon_grid, lat_grid = lon_grid.ravel(), lat_grid.ravel()
+        cells, dates = {}, {}
+        for crop in crops:
+            calendar = agrotechnology.open_calendar(crop)
+            lat_idx = calendar.indexes["latitude"].get_indexer(
+                lat_grid, method="nearest"
+            )
+            lon_idx = calendar.indexes["longitude"].get_indexer(
+                lon_grid, method="nearest"
+            )
+            cells[crop] = (lat_idx * calendar.sizes["longitude"] + lon_idx).astype(
+                np.int32
+            )
+            for year in years:
+                dates[crop, str(year)] = calendar_dates(
+                    calendar, lon=lon_grid, lat=lat_grid, year=year
+                )
+        msg = "Calendar index of %i weather cells, crops %s, years %s" % (
+            lon_grid.size,
+            list(cells),
+            sorted({year for _, year in dates}),
+        )
+        logger.info(msg)
+        return cls(lat=lat, lon=lon, cells=cells, dates=dates)
+
+    @classmethod
+    def load(cls, path: str) -> "CalendarGridIndex":
+        """Index saved with save()"""
+        cells, dates = {}, {}
+        with np.load(path) as index:
+            for key in index.files:
+                if key.startswith("cell_"):
+                    cells[key[len("cell_") :]] = index[key]
+                elif key.startswith("plant_"):
+                    crop, year = key[len("plant_") :].rsplit("_", 1)
+                    plant_day = index[key]
+                    dates[crop, year] = {
+                        "plant_day": plant_day,
+                        "harvest_day": index[f"harvest_{crop}_{year}"],
+                        "valid": ~np.isnat(plant_day),
+                    }
+            lat, lon = index["lat"], index["lon"]
+        return cls(lat=lat, lon=lon, cells=cells, dates=dates)
+
+    @classmethod
+    def open(
+        cls,
+        path: str,
+        agrotechnology: Agrotechnology,
+        lat,
+        lon,
+        crops: Iterable[str],
+        years: Iterable,
+    ) -> "CalendarGridIndex":
+        """Index of path, built and saved first if it misses the grid,
+        a crop or a year
+
+        Args:
+            path (str): npz file of the index
+            agrotechnology (Agrotechnology): source of the crop calendars
+            lat: latitudes of the weather grid
+            lon: longitudes of the weather grid
+            crops (Iterable[str]): keys of Agrotechnology.dictCalendars
+            years (Iterable): years of the dates
+        """
+        crops, years = list(crops), list(years)
+        if os.path.exists(path):
+            index = cls.load(path)
+            if index.covers(lat=lat, lon=lon, crops=crops, years=years):
+                return index
+            msg = "Calendar index %s does not cover the run, rebuilding" % path
+            logger.info(msg)
+        index = cls.build(agrotechnology, lat=lat, lon=lon, crops=crops, years=years)
+        index.save(path)
+        return index
+
+    def covers(self, lat, lon, crops: Iterable[str], years: Iterable) -> bool:
+        """True if the index is on this grid and has all crops and years"""
+        if not np.array_equal(self.lat, np.asarray(lat, dtype=float)):
+            return False
+        if not np.array_equal(self.lon, np.asarray(lon, dtype=float)):
+            return False
+        return all((crop, str(year)) in self._dates for crop in crops for year in years)
+
+    def on_grid(self, lon, lat, atol: float = 1e-6) -> np.ndarray:
+        """Mask of the points that are cells of the index grid
+
+        cell_id() maps any point to its nearest cell, points of another grid
+        or outside the index would silently get the dates of that cell.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        if not len(self.lat) or not len(self.lon):
+            return np.zeros(len(lat), dtype=bool)
+        lat_idx = pd.Index(self.lat).get_indexer(lat, method="nearest")
+        lon_idx = pd.Index(self.lon).get_indexer(lon, method="nearest")
+        return np.isclose(self.lat[lat_idx], lat, rtol=0, atol=atol) & np.isclose(
+            self.lon[lon_idx], lon, rtol=0, atol=atol
+        )
+
+    def save(self, path: str) -> None:
+        """Write the index to an npz file"""
+        arrays = {"lat": self.lat, "lon": self.lon}
+        for crop, cells in self.cells.items():
+            arrays[f"cell_{crop}"] = cells
+        for (crop, year), dates in self._dates.items():
+            arrays[f"plant_{crop}_{year}"] = dates["plant_day"]
+            arrays[f"harvest_{crop}_{year}"] = dates["harvest_day"]
+        tmp_path = path + ".tmp.npz"
+        np.savez_compressed(tmp_path, **arrays)
+        os.replace(tmp_path, path)
+
+    def cell_id(self, lon, lat) -> np.ndarray:
+        """Flat id of the nearest grid cell of every point"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        lat_idx = pd.Index(self.lat).get_indexer(lat, method="nearest")
+        lon_idx = pd.Index(self.lon).get_indexer(lon, method="nearest")
+        return lat_idx * len(self.lon) + lon_idx
+
+    def dates(self, crop: str, year, cell_id: Optional[np.ndarray] = None) -> dict:
+        """Sowing and harvest dates of cells
+
+        Args:
+            crop (str): crop of the index
+            year: year of the index
+            cell_id (np.ndarray, optional): flat cell ids, all cells by default
+
+        Returns:
+            dict: "plant_day" and "harvest_day" as datetime64[D] arrays (NaT
+                for cells without calendar) and the "valid" mask
+        """
+        if (crop, str(year)) not in self._dates:
+            msg = "No calendar of '%s' in %s in the index, built for %s" % (
+                crop,
+                year,
+                sorted(self._dates),
+            )
+            raise KeyError(msg)
+        dates = self._dates[crop, str(year)]
+        if cell_id is None:
+            return dates
+        return {key: values[cell_id] for key, values in dates.items()}
@@ -14,25 +14,35 @@ import pandas as pd
 from datetime import datetime
 import numpy as np
 import datetime as dt
-import requests
+from typing import Optional
 
 import xarray as xr
 
+from pyCropModels.utils.elevation import ElevationProvider, default_elevation_provider
+from pyCropModels.weather.extract import PointExtractor
+from pyCropModels.weather.cell_weather import CellWeatherCache
+from pyCropModels.models.dssat_workspace import DSSATWorkspacePool
+
 
 class DSSATModel:
-    def __init__(self, ds_weather: xr.Dataset, ds_solar: xr.Dataset) -> None:
+    def __init__(
+        self,
+        ds_weather: xr.Dataset,
+        ds_solar: xr.Dataset,
+        elevation_provider: Optional[ElevationProvider] = None,
+        workspaces: Optional[DSSATWorkspacePool] = None,
+        cell_weather: Optional[CellWeatherCache] = None,
+    ) -> None:
         self.ds_weather = ds_weather
         self.ds_solar = ds_solar
-
-        self.MJ_to_J = lambda x: x * 1e6
-        self.mm_to_cm = lambda x: x / 10.0
-        self.K_to_C = lambda x: x - 273.15
-        # self.tdew_to_hpa = lambda x: ea_from_tdew(x) * 10.0
-        self.to_date = lambda d: d.date()
-        self.HTTP_OK = 200
-        self.kg_m2_to_mm = lambda x: x * 86400
-        self.ms_to_kmd = lambda x: x * 86.4
-        self.watt_to_joules = lambda x: x * 86400
+        self.extractor = PointExtractor(ds_weather=ds_weather, ds_solar=ds_solar)
+        # canonical weather per cell, pass a shared cache to reuse the
+        # weather of other models
+        self.cell_weather = cell_weather or CellWeatherCache(
+            ds_weather=ds_weather, ds_solar=ds_solar
+        )
+        self.elevation_provider = elevation_provider or default_elevation_provider()
+        self._workspaces = workspaces
         # To-do: add ALLSKY_SFC_PAR_TOT to weather
 
     def _csvdate_to_date(self, x, dateformat):
@@ -45,9 +55,21 @@ class DSSATModel:
         dt_f = dt.datetime.strptime(str(x), dateformat)
         return dt_f
 
+    @property
+    def workspaces(self) -> DSSATWorkspacePool:
+        """Run directories of this model, one persistent directory by default"""
+        if self._workspaces is None:
+            self._workspaces = DSSATWorkspacePool(size=1)
+        return self._workspaces
+
+    def close(self):
+        """Remove the run directories"""
+        if self._workspaces is not None:
+            self._workspaces.close()
+
     def get_elevation(self, longitude: float, latitude: float) -> float:
         """_get_elevation
-        Get elevation from OpenTopoData API by lon and lat
+        Get elevation of the point from the elevation provider
 
         Args:
             longitude (float): longitude in WGS84
@@ -56,16 +78,7 @@ class DSSATModel:
         Returns:
             float: elevation (m)
         """
-        url = (
-            f"https://api.opentopodata.org/v1/aster30m?locations={latitude},{longitude}"
-        )
-        resp = requests.get(url=url, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
-            elevation = data["results"][0]["elevation"]
-        else:
-            elevation = 200
-        return elevation
+        return self.elevation_provider(longitude=longitude, latitude=latitude)
 
     def select_from_xarray(self, longitude: float, latitude: float) -> pd.DataFrame:
         """Select weather from Xarray dataset
@@ -77,52 +90,15 @@ class DSSATModel:
         Returns:
             pd.DataFrame: weather dataframe
         """
-        point_weather = self.ds_weather.sel(
-            lon=longitude, lat=latitude, method="nearest"
-        )
-        point_solar = self.ds_solar.sel(lon=longitude, lat=latitude, method="nearest")
-        df_power = self.xr_dataset_to_pandas(ds=point_weather)
-
-        df_solar = self.xr_dataset_to_pandas(ds=point_solar)
-
-        df_power["DAY"] = pd.to_datetime(point_weather.time.values, format="%Y%m%d")
-
-        df_solar = (
-            df_solar.apply(self.watt_to_joules) / 1e6
-        )  # Convert to MJ for A,B computing
-
-        df_power = pd.concat([df_power, df_solar], axis=1)
-        return df_power
-
-    def xr_dataset_to_pandas(self, ds: xr.Dataset) -> pd.DataFrame:
-        """Convert xarray point to pandas -> faster than implimented"""
-        dict_to_pandas = {}
-        for key in list(ds.keys()):
-            dict_to_pandas[key] = ds[key].values
-        return pd.DataFrame(dict_to_pandas)
+        values, _ = self.extractor.extract(longitude=[longitude], latitude=[latitude])
+        return self.extractor.to_frame(values[0])
 
     def get_dssat_weather(self, longitude: float, latitude: float):
-
-        df_power = self.select_from_xarray(longitude=longitude, latitude=latitude)
-
-        # Convert POWER data to a dataframe with PCSE compatible inputs
-        df_dssat = pd.DataFrame(
-            {
-                "DATE": df_power.DAY.apply(self.to_date),
-                "TMEAN": df_power.T2M.apply(self.K_to_C),
-                "TMIN": df_power.T2M_MIN.apply(self.K_to_C),
-                "TMAX": df_power.T2M_MAX.apply(self.K_to_C),
-                "WIND": df_power.WS2M.apply(self.ms_to_kmd),
-                "RAD": df_power.ALLSKY_SFC_SW_DWN,
-                "RAIN": df_power.PRECTOTCORR.apply(self.kg_m2_to_mm),
-                "DEWP": df_power.T2MDEW.apply(self.K_to_C),
-                "RHUM": df_power.RH2M,
-            }
-        )
-        df_dssat.loc[:, "DATE"] = df_dssat.loc[:, "DATE"].apply(
-            lambda x: self._csvdate_to_date(x, "%Y-%m-%d")
+        """DSSAT weather of the grid cell of the point, see CellWeather.to_dssat"""
+        df_dssat = (
+            self.cell_weather.get(lon=longitude, lat=latitude).complete().to_dssat()
         )
-        self.df_dssat = df_dssat.reset_index(drop=True)
+        self.df_dssat = df_dssat
         return df_dssat
 
     def compute(
@@ -133,8 +109,41 @@ class DSSATModel:
         lon: float,
         harvest: datetime,
         sowing: datetime,
+        variable: str = "CWAD",
     ):
+        """Run DSSAT for one point, see simulate
+
+        Args:
+            variable (str, optional): PlantGro output to return the maximum
+                of, e.g. "HWAD" for the yield instead of the biomass
 
+        Returns:
+            float: maximum of the variable (kg/ha)
+        """
+        output_1 = self.simulate(
+            crop_name=crop_name,
+            cultivar=cultivar,
+            lat=lat,
+            lon=lon,
+            harvest=harvest,
+            sowing=sowing,
+        )
+        return float(output_1[variable].max())
+
+    def simulate(
+        self,
+        crop_name: str,
+        cultivar: str,
+        lat: float,
+        lon: float,
+        harvest: datetime,
+        sowing: datetime,
+    ) -> pd.DataFrame:
+        """Run DSSAT for one point
+
+        Returns:
+            pd.DataFrame: PlantGro output
+        """
         df_weather = self.get_dssat_weather(latitude=lat, longitude=lon)
         df_weather["DATE"] = pd.to_datetime(df_weather["DATE"])
         weather_cols = ["DATE", "TMIN", "TMAX", "RAD", "RAIN", "RHUM"]
@@ -160,19 +169,15 @@ class DSSATModel:
         man.harvest_details["HDATE"] = harvest.strftime("%y%j")
         man.harvest_details["HPC"] = 100
 
-        #
-        dssat = DSSAT()
-        dssat.setup()
-
-        dssat.run(
-            soil=soil,
-            weather=wth,
-            crop=crop,
-            management=man,
-        )
-        if dssat.output["PlantGro"]:  # type: ignore
-            output_1 = dssat.output["PlantGro"]  # type: ignore
-            dssat.close()
-            return float(output_1["CWAD"].max())
+        with self.workspaces.acquire() as dssat:
+            dssat.run(
+                soil=soil,
+                weather=wth,
+                crop=crop,
+                management=man,
+            )
+            output = dssat.output or {}
+        if output.get("PlantGro") is not None and not output["PlantGro"].empty:
+            return output["PlantGro"]
         else:
             raise ValueError("DSSAT no output")
@@ -0,0 +1,157 @@
+"""
+Process-parallel DSSAT execution
+
+Every worker process owns a DSSATModel with its own persistent run
+directory, so N dscsm048 processes run at once without sharing files.
+"""
+import os
+import time
+import shutil
+import logging
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, Optional
+
+import numpy as np
+import xarray as xr
+
+logger = logging.getLogger(__name__)
+
+# DSSATModel of the current worker process, see _init_worker
+_worker_model = None
+
+
+def _init_worker(ds_weather: xr.Dataset, ds_solar: xr.Dataset, root: str):
+    """Build the model and its run directory once per worker process"""
+    global _worker_model
+    from pyCropModels.models.dssat import DSSATModel
+    from pyCropModels.models.dssat_workspace import DSSATWorkspacePool
+
+    workspaces = DSSATWorkspacePool(
+        size=1, root=os.path.join(root, f"worker_{os.getpid()}")
+    )
+    _worker_model = DSSATModel(
+        ds_weather=ds_weather, ds_solar=ds_solar, workspaces=workspaces
+    )
+
+
+def _run_task(i: int, kwargs: dict) -> dict:
+    """Run DSSATModel.simulate in the worker, failures are reported"""
+    start = time.perf_counter()
+    result = {"index": i, "pid": os.getpid(), "output": None, "error": None}
+    try:
+        result["output"] = _worker_model.simulate(**kwargs)  # type: ignore
+    except Exception as e:
+        result["error"] = str(e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+class DSSATParallelExecutor:
+    """Run many DSSAT simulations on a pool of processes
+
+    Args:
+        ds_weather (xr.Dataset): AWS NASA POWER meteorology
+        ds_solar (xr.Dataset): AWS NASA POWER radiation
+        max_workers (int, optional): number of concurrent dscsm048 runs,
+            defaults to the number of CPUs
+        workdir (str, optional): directory for the worker run directories,
+            defaults to the system temp directory
+    """
+
+    def __init__(
+        self,
+        ds_weather: xr.Dataset,
+        ds_solar: xr.Dataset,
+        max_workers: Optional[int] = None,
+        workdir: Optional[str] = None,
+    ) -> None:
+        self.ds_weather = ds_weather
+        self.ds_solar = ds_solar
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.workdir = workdir
+        self.timings = []
+
+    def iter_run(self, tasks: Iterable[dict]):
+        """Run tasks and yield their results as they finish
+
+        Args:
+            tasks (Iterable[dict]): keyword arguments of DSSATModel.simulate,
+                i.e. crop_name, cultivar, lat, lon, harvest and sowing
+
+        Yields:
+            dict: "index" of the task, PlantGro "output" (None on failure),
+                "error", "seconds" of the run and "pid" of the worker
+        """
+        self.timings = []
+        # workers exit without atexit hooks, their directories go with root
+        root = tempfile.mkdtemp(prefix="pycropmodels_dssat_", dir=self.workdir)
+        try:
+            yield from self._iter_run(tasks, root)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+    def _iter_run(self, tasks: Iterable[dict], root: str):
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            initializer=_init_worker,
+            initargs=(self.ds_weather, self.ds_solar, root),
+        ) as executor:
+            futures = [
+                executor.submit(_run_task, i, kwargs) for i, kwargs in enumerate(tasks)
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                self.timings.append(result["seconds"])
+                if result["error"] is not None:
+                    msg = "DSSAT task %i failed: %s" % (
+                        result["index"],
+                        result["error"],
+                    )
+                    logger.warning(msg)
+                yield result
+
+    def run(self, tasks: Iterable[dict]) -> list:
+        """Run tasks, PlantGro outputs in task order (None for failed runs)"""
+        start = time.perf_counter()
+        results = sorted(self.iter_run(tasks), key=lambda r: r["index"])
+        stats = self.timing_stats(wall_seconds=time.perf_counter() - start)
+        msg = (
+            "%i DSSAT runs on %i workers in %.1f s, %.2f s per run (p95 %.2f s), "
+            "%.1f runs/s"
+        ) % (
+            stats["runs"],
+            self.max_workers,
+            stats["wall_seconds"],
+            stats["mean_seconds"],
+            stats["p95_seconds"],
+            stats["runs_per_second"],
+        )
+        logger.info(msg)
+        return [r["output"] for r in results]
+
+    def timing_stats(self, wall_seconds: Optional[float] = None) -> dict:
+        """Per-run timing of the last run, to size the pool to the machine
+
+        Args:
+            wall_seconds (float, optional): elapsed time of the whole batch
+
+        Returns:
+            dict: runs, mean/p50/p95 seconds per run, and with wall_seconds
+                the throughput in runs per second
+        """
+        timings = np.asarray(self.timings, dtype=float)
+        stats = {
+            "runs": len(timings),
+            "mean_seconds": np.nan,
+            "p50_seconds": np.nan,
+            "p95_seconds": np.nan,
+        }
+        if len(timings):
+            stats["mean_seconds"] = float(timings.mean())
+            stats["p50_seconds"] = float(np.percentile(timings, 50))
+            stats["p95_seconds"] = float(np.percentile(timings, 95))
+        if wall_seconds is not None:
+            stats["wall_seconds"] = wall_seconds
+            stats["runs_per_second"] = len(timings) / wall_seconds
+        return stats
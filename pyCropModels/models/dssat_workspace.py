@@ -0,0 +1,79 @@
+"""
+Pool of persistent DSSAT run directories
+
+A DSSAT instance is set up once per run directory and reused. Between runs
+DSSAT.run() only removes the previous *.OUT/*.INP files and rewrites the
+weather, soil, cultivar and X-file inputs.
+"""
+import os
+import queue
+import atexit
+import shutil
+import logging
+import tempfile
+from contextlib import contextmanager
+from typing import Optional
+
+from DSSATTools import DSSAT
+
+logger = logging.getLogger(__name__)
+
+
+class DSSATWorkspacePool:
+    """Fixed set of pre-provisioned DSSAT run directories
+
+    Args:
+        size (int, optional): number of run directories, one per concurrent run
+        root (str, optional): parent directory of the run directories,
+            defaults to a new temporary directory
+    """
+
+    def __init__(self, size: int = 1, root: Optional[str] = None) -> None:
+        self.size = size
+        self.root = root or tempfile.mkdtemp(prefix="pycropmodels_dssat_")
+        os.makedirs(self.root, exist_ok=True)
+        self._free = queue.Queue()
+        self.paths = []
+        for i in range(size):
+            path = os.path.join(self.root, f"run_{i}")
+            dssat = DSSAT()
+            dssat.setup(cwd=path)
+            self.paths.append(path)
+            self._free.put(dssat)
+        self._closed = False
+        atexit.register(self.close)
+        msg = "DSSAT workspace pool of %i run directories in %s" % (size, self.root)
+        logger.info(msg)
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """Borrow a set up DSSAT instance, blocks while all are in use
+
+        Args:
+            timeout (float, optional): seconds to wait for a free instance
+
+        Yields:
+            DSSAT: instance running in its own persistent directory
+        """
+        if self._closed:
+            msg = "DSSAT workspace pool in %s is closed" % self.root
+            raise RuntimeError(msg)
+        dssat = self._free.get(timeout=timeout)
+        try:
+            yield dssat
+        finally:
+            self._free.put(dssat)
+
+    def close(self) -> None:
+        """Remove all run directories, safe to call more than once"""
+        if self._closed:
+            return
+        self._closed = True
+        shutil.rmtree(self.root, ignore_errors=True)
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
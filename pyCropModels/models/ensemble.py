@@ -0,0 +1,265 @@
+"""
+Multi-model ensemble executor
+
+WOFOST, DSSAT and MONICA run side by side for a set of points, each model on
+a pool of its own: PCSE computes in the Python process, so WOFOST gets a
+process pool, while DSSAT and MONICA mostly wait on their executables, so
+threads of the main process are enough to keep them busy. All runs are
+submitted at once and the per-point ensemble mean and spread are updated as
+results arrive, so a slow model does not hold back the others.
+
+Every model reports the dry matter yield of the harvested organs in kg/ha,
+so the mean and spread compare like with like: WOFOST TWSO, MONICA Yield and
+DSSAT HWAD (the default of DSSATModel.compute is the biomass CWAD).
+"""
+import os
+import time
+import logging
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    as_completed,
+)
+from contextlib import ExitStack
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from pyCropModels.models.grid import (
+    MODELS,
+    _init_worker,
+    _run_cell,
+    make_model,
+    prepare_weather,
+    run_task,
+    task_kwargs,
+    worker_root,
+)
+from pyCropModels.models.dssat_workspace import DSSATWorkspacePool
+from pyCropModels.weather.cell_weather import shared_cell_weather
+
+logger = logging.getLogger(__name__)
+
+POOL_KINDS = ("process", "thread")
+# PCSE is CPU-bound Python, DSSAT and MONICA wait on subprocesses
+DEFAULT_POOL_KINDS = {"wofost": "process", "dssat": "thread", "monica": "thread"}
+# compute() arguments selecting the yield of the harvested organs
+YIELD_KWARGS = {"dssat": {"variable": "HWAD"}}
+
+
+class RunningStats:
+    """Streaming mean and variance of many points (Welford's algorithm)
+
+    Args:
+        n_points (int): number of points
+    """
+
+    def __init__(self, n_points: int) -> None:
+        self.count = np.zeros(n_points, dtype=int)
+        self.mean = np.full(n_points, np.nan)
+        self._m2 = np.zeros(n_points)
+
+    def update(self, i: int, value: float) -> None:
+        """Add a value of point i, NaN values are skipped"""
+        if np.isnan(value):
+            return
+        self.count[i] += 1
+        if self.count[i] == 1:
+            self.mean[i] = value
+            return
+        delta = value - self.mean[i]
+        self.mean[i] += delta / self.count[i]
+        self._m2[i] += delta * (value - self.mean[i])
+
+    def variance(self, ddof: int = 1) -> np.ndarray:
+        """Variance of every point, NaN with ddof or fewer values"""
+        variance = np.full(len(self.count), np.nan)
+        enough = self.count > ddof
+        variance[enough] = self._m2[enough] / (self.count[enough] - ddof)
+        return variance
+
+    def std(self, ddof: int = 1) -> np.ndarray:
+        """Standard deviation of every point, see variance"""
+        return np.sqrt(self.variance(ddof=ddof))
+
+
+class EnsembleExecutor:
+    """Run several crop models for the same points at the same time
+
+    Args:
+        weather (dict): dict returned by AwsNasaPower.download()
+        crops (dict): {model: (crop, crop_variety)} of the models to run,
+            names as each model expects them
+        pool_sizes (dict, optional): {model: concurrent runs}, defaults to
+            the number of CPUs for every model
+        pool_kinds (dict, optional): {model: "process" | "thread"}, see
+            DEFAULT_POOL_KINDS
+        cell_weather_size (int, optional): cells kept in the CellWeatherCache
+            shared by the thread pool models
+        model_kwargs (dict, optional): {model: kwargs} passed to make_model,
+            e.g. the workers of MONICA; picklable for process pools
+    """
+
+    def __init__(
+        self,
+        weather: dict,
+        crops: dict,
+        pool_sizes: Optional[dict] = None,
+        pool_kinds: Optional[dict] = None,
+        cell_weather_size: int = 256,
+        model_kwargs: Optional[dict] = None,
+    ) -> None:
+        unknown = set(crops) - set(MODELS)
+        if unknown:
+            msg = f"Unknown models {sorted(unknown)}, expected some of {MODELS}"
+            raise ValueError(msg)
+        self.weather = weather
+        self.crops = crops
+        self.models = list(crops)
+        cpus = os.cpu_count() or 1
+        self.pool_sizes = {model: cpus for model in self.models}
+        self.pool_sizes.update(pool_sizes or {})
+        self.pool_kinds = {model: DEFAULT_POOL_KINDS[model] for model in self.models}
+        self.pool_kinds.update(pool_kinds or {})
+        for model, kind in self.pool_kinds.items():
+            if kind not in POOL_KINDS:
+                msg = f"Unknown pool kind '{kind}' of {model}, expected {POOL_KINDS}"
+                raise ValueError(msg)
+        self.cell_weather_size = cell_weather_size
+        self.model_kwargs = model_kwargs or {}
+        self.timings = {}
+
+    def _thread_model(self, model: str, cell_weather, stack: ExitStack):
+        """Model adapter shared by the threads of a pool"""
+        size = self.pool_sizes[model]
+        kwargs = dict(self.model_kwargs.get(model, {}))
+        if model == "dssat" and "workspaces" not in kwargs:
+            kwargs["workspaces"] = stack.enter_context(DSSATWorkspacePool(size=size))
+        elif model == "monica":
+            kwargs.setdefault("max_workers", size)
+        return make_model(model, self.weather, cell_weather=cell_weather, **kwargs)
+
+    def _submit(self, stack: ExitStack, tasks: dict) -> dict:
+        """Start the pools and submit all tasks, {future: model}"""
+        cell_weather = shared_cell_weather(self.weather, maxsize=self.cell_weather_size)
+        pools = {}
+        for model in self.models:
+            prepare_weather(model, self.weather)
+            size = self.pool_sizes[model]
+            if self.pool_kinds[model] == "process":
+                root = stack.enter_context(worker_root(model))
+                executor = ProcessPoolExecutor(
+                    max_workers=size,
+                    initializer=_init_worker,
+                    initargs=(model, self.weather, self.model_kwargs.get(model), root),
+                )
+                pools[model] = (stack.enter_context(executor), _run_cell, ())
+            else:
+                adapter = self._thread_model(model, cell_weather, stack)
+                executor = ThreadPoolExecutor(
+                    max_workers=size, thread_name_prefix=model
+                )
+                pools[model] = (stack.enter_context(executor), run_task, (adapter,))
+        futures = {}
+        # interleave the models, so every pool starts working at once
+        for batch in zip(*(tasks[model] for model in self.models)):
+            for model, task in zip(self.models, batch):
+                executor, fn, args = pools[model]
+                futures[executor.submit(fn, *args, task)] = model
+        return futures
+
+    def _tasks(self, lat, lon, sowing, harvest) -> dict:
+        n_points = len(lat)
+        sowing = np.broadcast_to(np.asarray(sowing, dtype=object), (n_points,))
+        harvest = np.broadcast_to(np.asarray(harvest, dtype=object), (n_points,))
+        tasks = {}
+        for model in self.models:
+            crop, crop_variety = self.crops[model]
+            tasks[model] = [
+                (
+                    i,
+                    task_kwargs(
+                        model,
+                        crop=crop,
+                        crop_variety=crop_variety,
+                        lat=lat[i],
+                        lon=lon[i],
+                        sowing=sowing[i],
+                        harvest=harvest[i],
+                    )
+                    | YIELD_KWARGS.get(model, {}),
+                )
+                for i in range(n_points)
+            ]
+        return tasks
+
+    def iter_run(self, lat, lon, sowing, harvest):
+        """Run all models for all points and yield results as they arrive
+
+        Args:
+            lat: latitudes of the points
+            lon: longitudes of the points
+            sowing: sowing date (str "%Y-%m-%d" or datetime), one for all
+                points or one per point
+            harvest: harvest date, same layout as sowing
+
+        Yields:
+            tuple: (model, point index, value, RunningStats of the points),
+                value is NaN for failed runs
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        tasks = self._tasks(lat, lon, sowing=sowing, harvest=harvest)
+        stats = RunningStats(len(lat))
+        start = time.perf_counter()
+        self.timings = {}
+        msg = "Start ensemble of %s for %i points, pools %s" % (
+            self.models,
+            len(lat),
+            {m: (self.pool_kinds[m], self.pool_sizes[m]) for m in self.models},
+        )
+        logger.info(msg)
+        with ExitStack() as stack:
+            futures = self._submit(stack, tasks)
+            remaining = {model: len(lat) for model in self.models}
+            for future in as_completed(futures):
+                model = futures[future]
+                i, value = future.result()
+                stats.update(i, value)
+                remaining[model] -= 1
+                if not remaining[model]:
+                    self.timings[model] = time.perf_counter() - start
+                    msg = "%s finished %i points in %.1f s" % (
+                        model,
+                        len(lat),
+                        self.timings[model],
+                    )
+                    logger.info(msg)
+                yield model, i, value, stats
+
+    def run(self, lat, lon, sowing, harvest) -> pd.DataFrame:
+        """Run all models for all points, see iter_run
+
+        Returns:
+            pd.DataFrame: lat, lon, one column per model with its yield
+                (kg/ha, see the module docstring), the ensemble
+                "mean", its "spread" (standard deviation across models) and
+                "n_models" with a result
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=float))
+        lon = np.atleast_1d(np.asarray(lon, dtype=float))
+        values = {model: np.full(len(lat), np.nan) for model in self.models}
+        stats = RunningStats(len(lat))
+        for model, i, value, stats in self.iter_run(lat, lon, sowing, harvest):
+            values[model][i] = value
+        return pd.DataFrame(
+            {
+                "lat": lat,
+                "lon": lon,
+                **values,
+                "mean": stats.mean,
+                "spread": stats.std(),
+                "n_models": stats.count,
+            }
+        )
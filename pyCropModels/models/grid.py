@@ -0,0 +1,419 @@
+"""
+Grid runner
+
+Fan crop model runs out over the cells of a NASA POWER weather grid
+"""
+import os
+import shutil
+import tempfile
+import datetime as dt
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Optional, Union
+
+import numpy as np
+import geopandas as gpd
+import xarray as xr
+
+logger = logging.getLogger(__name__)
+
+MODELS = ("wofost", "dssat", "monica")
+
+# Model instance of the current worker process, see _init_worker
+_worker_model = None
+
+
+def make_model(model: str, weather: dict, cell_weather=None, **kwargs):
+    """Build a crop model adapter on top of the AWS NASA POWER weather
+
+    Args:
+        model (str): one of "wofost", "dssat" or "monica"
+        weather (dict): dict returned by AwsNasaPower.download()
+        cell_weather (CellWeatherCache, optional): canonical cell weather
+            shared by the models built on the same weather
+        **kwargs: passed to the adapter, e.g. workspaces of DSSATModel or
+            max_workers of MONICA
+
+    Returns:
+        model adapter with a compute() method
+    """
+    if model == "wofost":
+        from pyCropModels.models.wofost import WOFOST
+
+        return WOFOST(dataset=weather, cell_weather=cell_weather, **kwargs)
+    if model == "dssat":
+        from pyCropModels.models.dssat import DSSATModel
+
+        return DSSATModel(
+            ds_weather=weather["meteo"],
+            ds_solar=weather["solar"],
+            cell_weather=cell_weather,
+            **kwargs,
+        )
+    if model == "monica":
+        from pyCropModels.models.monica import MONICA
+        from pyCropModels.weather.cell_weather import shared_cell_weather
+
+        if cell_weather is None:
+            cell_weather = shared_cell_weather(weather)
+        return MONICA(cell_weather=cell_weather, **kwargs)
+    msg = f"Unknown model '{model}', expected one of {MODELS}"
+    raise ValueError(msg)
+
+
+def prepare_weather(model: str, weather: dict) -> dict:
+    """Compute the inputs shared by all cells once, before the workers get
+    a copy of weather: the reference ET cube of WOFOST, see
+    shared_reference_et"""
+    if model == "wofost":
+        from pyCropModels.weather.aws_weather import shared_reference_et
+
+        shared_reference_et(weather)
+    return weather
+
+
+def _init_worker(
+    model: str,
+    weather: dict,
+    model_kwargs: Optional[dict] = None,
+    root: Optional[str] = None,
+):
+    """Build the model once per worker process, see make_model
+
+    Args:
+        root (str, optional): batch directory of the DSSAT run directories
+            of the worker, see worker_root
+    """
+    global _worker_model
+    kwargs = dict(model_kwargs or {})
+    if model == "dssat" and root is not None and "workspaces" not in kwargs:
+        from pyCropModels.models.dssat_workspace import DSSATWorkspacePool
+
+        kwargs["workspaces"] = DSSATWorkspacePool(
+            size=1, root=os.path.join(root, f"worker_{os.getpid()}")
+        )
+    _worker_model = make_model(model=model, weather=weather, **kwargs)
+
+
+@contextmanager
+def worker_root(model: str):
+    """Batch directory of the run directories of the workers of a model
+
+    Pool workers exit without running atexit hooks, so their DSSAT run
+    directories are put under one directory removed at the end of the
+    batch. Yields None for models without run directories.
+    """
+    if model != "dssat":
+        yield None
+        return
+    root = tempfile.mkdtemp(prefix="pycropmodels_dssat_")
+    try:
+        yield root
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def run_task(model, task: tuple) -> tuple:
+    """Run a model adapter for one cell, failures are reported as NaN
+
+    Args:
+        model: model adapter with a compute() method
+        task (tuple): (index, compute() keyword arguments)
+
+    Returns:
+        tuple: (index, value)
+    """
+    i, kwargs = task
+    try:
+        return i, float(model.compute(**kwargs))
+    except Exception as e:
+        msg = "Cell (lat=%s, lon=%s) failed: %s" % (kwargs["lat"], kwargs["lon"], e)
+        logger.warning(msg)
+        return i, np.nan
+
+
+def _run_cell(task: tuple):
+    """Run the worker model for one cell, see run_task"""
+    return run_task(_worker_model, task)
+
+
+def to_model_date(model: str, date: Union[str, dt.datetime]):
+    """WOFOST takes ISO strings, DSSAT and MONICA take datetime"""
+    if isinstance(date, str):
+        date = dt.datetime.strptime(date, "%Y-%m-%d")
+    if model == "wofost":
+        return date.strftime("%Y-%m-%d")
+    return date
+
+
+def task_kwargs(
+    model: str, crop: str, crop_variety: str, lat: float, lon: float, sowing, harvest
+) -> dict:
+    """compute() keyword arguments of a model adapter for one point"""
+    kwargs = {
+        "lat": float(lat),
+        "lon": float(lon),
+        "sowing": to_model_date(model, sowing),
+        "harvest": to_model_date(model, harvest),
+    }
+    if model == "dssat":
+        kwargs.update(crop_name=crop, cultivar=crop_variety)
+    else:
+        kwargs.update(crop=crop, crop_variety=crop_variety)
+    return kwargs
+
+
+class GridRunner:
+    """Run WOFOST, DSSAT or MONICA for every weather cell inside a region
+
+    Args:
+        weather (dict): dict returned by AwsNasaPower.download()
+        gdf (gpd.GeoDataFrame): region of interest
+        model (str): "wofost", "dssat" or "monica"
+        crop (str): crop name of the model
+        crop_variety (str): variety (cultivar) of the crop
+        max_workers (int, optional): size of the process pool,
+            defaults to the number of CPUs. Use 1 to run in-process.
+        chunksize (int, optional): cells sent to a worker at once
+    """
+
+    def __init__(
+        self,
+        weather: dict,
+        gdf: gpd.GeoDataFrame,
+        model: str,
+        crop: str,
+        crop_variety: str,
+        max_workers: Optional[int] = None,
+        chunksize: int = 16,
+    ) -> None:
+        if model not in MODELS:
+            msg = f"Unknown model '{model}', expected one of {MODELS}"
+            raise ValueError(msg)
+        self.weather = weather
+        self.gdf = gdf
+        self.model = model
+        self.crop = crop
+        self.crop_variety = crop_variety
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.lat = weather["meteo"].lat.values
+        self.lon = weather["meteo"].lon.values
+        self.cells = self.get_cells()
+
+    def get_cells(self) -> np.ndarray:
+        """Indices (lat_idx, lon_idx) of the grid cells inside the region
+
+        Returns:
+            np.ndarray: array of shape (n_cells, 2)
+        """
+        lon_grid, lat_grid = np.meshgrid(self.lon, self.lat)
+        points = gpd.GeoSeries(
+            gpd.points_from_xy(lon_grid.ravel(), lat_grid.ravel()), crs="EPSG:4326"
+        )
+        region = self.gdf.set_crs("EPSG:4326", allow_override=True)  # type: ignore
+        inside = points.within(region.geometry.union_all()).values
+        lat_idx, lon_idx = np.unravel_index(np.flatnonzero(inside), lon_grid.shape)
+        return np.column_stack([lat_idx, lon_idx])
+
+    def _tasks(self, sowing, harvest):
+        n_cells = len(self.cells)
+        sowing = np.broadcast_to(np.asarray(sowing, dtype=object), (n_cells,))
+        harvest = np.broadcast_to(np.asarray(harvest, dtype=object), (n_cells,))
+        for i, (lat_idx, lon_idx) in enumerate(self.cells):
+            if sowing[i] is None or harvest[i] is None:
+                continue
+            kwargs = task_kwargs(
+                self.model,
+                crop=self.crop,
+                crop_variety=self.crop_variety,
+                lat=self.lat[lat_idx],
+                lon=self.lon[lon_idx],
+                sowing=sowing[i],
+                harvest=harvest[i],
+            )
+            yield i, kwargs
+
+    def run(self, sowing, harvest) -> xr.Dataset:
+        """Simulate all cells of the region
+
+        Args:
+            sowing: sowing date (str "%Y-%m-%d" or datetime), either one
+                date for the whole region or one per cell of self.cells,
+                cells with None are not simulated
+            harvest: harvest date, same layout as sowing
+
+        Returns:
+            xr.Dataset: "yield" on the (lat, lon) weather grid, NaN outside
+                the region and for failed or skipped cells
+        """
+        tasks = self._tasks(sowing=sowing, harvest=harvest)
+        msg = "Start %s run for %i cells with %i workers" % (
+            self.model,
+            len(self.cells),
+            self.max_workers,
+        )
+        logger.info(msg)
+        prepare_weather(self.model, self.weather)
+        with worker_root(self.model) as root:
+            if self.max_workers == 1:
+                _init_worker(self.model, self.weather, root=root)
+                results = map(_run_cell, tasks)
+                values = self._collect(results)
+            else:
+                with ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    initializer=_init_worker,
+                    initargs=(self.model, self.weather, None, root),
+                ) as executor:
+                    results = executor.map(_run_cell, tasks, chunksize=self.chunksize)
+                    values = self._collect(results)
+        logger.info("Finished %s run" % self.model)
+        return self.to_dataset(values)
+
+    def calendar_dates(self, calendar_index, year, crop: Optional[str] = None):
+        """Sowing and harvest dates of self.cells from a CalendarGridIndex
+
+        Args:
+            calendar_index (CalendarGridIndex): calendar on the weather grid
+            year: year of the dates
+            crop (str, optional): calendar crop, defaults to self.crop
+
+        Returns:
+            tuple: (sowing, harvest) lists of "%Y-%m-%d" per cell, None for
+                cells without calendar and cells not on the grid of the index
+        """
+        crop = crop or self.crop.lower()
+        lon = self.lon[self.cells[:, 1]]
+        lat = self.lat[self.cells[:, 0]]
+        if calendar_index.covers(
+            lat=self.lat, lon=self.lon, crops=[crop], years=[year]
+        ):
+            covered = np.ones(len(self.cells), dtype=bool)
+        else:
+            # e.g. a tile of the grid of the index, or another grid
+            covered = calendar_index.on_grid(lon=lon, lat=lat)
+            if not covered.all():
+                msg = "%i of %i cells are not on the grid of the calendar index" % (
+                    int((~covered).sum()),
+                    len(covered),
+                )
+                logger.warning(msg)
+        cell_id = calendar_index.cell_id(lon=lon, lat=lat)
+        dates = calendar_index.dates(crop=crop, year=year, cell_id=cell_id)
+        valid = dates["valid"] & covered
+        sowing, harvest = [], []
+        for ok, plant_day, harvest_day in zip(
+            valid, dates["plant_day"], dates["harvest_day"]
+        ):
+            sowing.append(str(plant_day) if ok else None)
+            harvest.append(str(harvest_day) if ok else None)
+        return sowing, harvest
+
+    def run_calendar(self, calendar_index, year, crop: Optional[str] = None):
+        """Simulate all cells with their dates from a CalendarGridIndex,
+        see calendar_dates() and run()"""
+        sowing, harvest = self.calendar_dates(calendar_index, year=year, crop=crop)
+        return self.run(sowing=sowing, harvest=harvest)
+
+    def _collect(self, results) -> np.ndarray:
+        values = np.full(len(self.cells), np.nan)
+        for i, value in results:
+            values[i] = value
+        return values
+
+    def to_dataset(self, values: np.ndarray) -> xr.Dataset:
+        """Put per-cell values back on the (lat, lon) weather grid
+
+        Args:
+            values (np.ndarray): one value per cell of self.cells
+
+        Returns:
+            xr.Dataset: dataset with "yield" variable
+        """
+        grid = np.full((len(self.lat), len(self.lon)), np.nan)
+        grid[self.cells[:, 0], self.cells[:, 1]] = values
+        ds = xr.Dataset(
+            {"yield": (("lat", "lon"), grid)},
+            coords={"lat": self.lat, "lon": self.lon},
+            attrs={
+                "model": self.model,
+                "crop": self.crop,
+                "crop_variety": self.crop_variety,
+            },
+        )
+        return ds
+
+
+def run_tiled(
+    power,
+    model: str,
+    crop: str,
+    crop_variety: str,
+    sowing,
+    harvest,
+    time_start: str,
+    time_end: str,
+    memory_budget_mb: float = 1024.0,
+    download_kwargs: Optional[dict] = None,
+    calendar_index=None,
+    year=None,
+    **runner_kwargs,
+) -> xr.Dataset:
+    """Run a region tile by tile, with one tile of weather in memory at a time
+
+    Args:
+        power (AwsNasaPower): downloader of the region
+        model (str): "wofost", "dssat" or "monica"
+        crop (str): crop name of the model
+        crop_variety (str): variety (cultivar) of the crop
+        sowing: sowing date of the whole region, unused with calendar_index
+        harvest: harvest date of the whole region, unused with calendar_index
+        time_start (str): first day of weather
+        time_end (str): last day of weather
+        memory_budget_mb (float, optional): peak weather memory per tile
+        download_kwargs (dict, optional): passed to AwsNasaPower.download()
+        calendar_index (CalendarGridIndex, optional): per-cell sowing and
+            harvest dates of year instead of sowing and harvest, cells off
+            its grid are not simulated
+        year (optional): calendar year, required with calendar_index
+        **runner_kwargs: passed to GridRunner, e.g. max_workers
+
+    Returns:
+        xr.Dataset: "yield" on the (lat, lon) weather grid of the region,
+            empty lat and lon if no weather cell is inside the region
+    """
+    results = []
+    tiles = power.iter_tiles(
+        time_start=time_start,
+        time_end=time_end,
+        memory_budget_mb=memory_budget_mb,
+        **(download_kwargs or {}),
+    )
+    for tile, weather in tiles:
+        runner = GridRunner(
+            weather=weather,
+            gdf=tile,
+            model=model,
+            crop=crop,
+            crop_variety=crop_variety,
+            **runner_kwargs,
+        )
+        if len(runner.cells) and calendar_index is not None:
+            results.append(runner.run_calendar(calendar_index, year=year))
+        elif len(runner.cells):
+            results.append(runner.run(sowing=sowing, harvest=harvest))
+        del runner, weather
+    if not results:
+        msg = "No weather cells of %s in the region, nothing was run" % model
+        logger.warning(msg)
+        return xr.Dataset(
+            {"yield": (("lat", "lon"), np.empty((0, 0)))},
+            coords={"lat": np.array([], dtype=float), "lon": np.array([], dtype=float)},
+            attrs={"model": model, "crop": crop, "crop_variety": crop_variety},
+        )
+    ds = xr.merge(
+        results, compat="no_conflicts", join="outer", combine_attrs="override"
+    )
+    return ds.sortby(["lat", "lon"])
@@ -2,9 +2,18 @@ import json
 import pandas as pd
 import subprocess
 import os
+import shutil
+import tempfile
+import threading
 import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
 import xarray as xr
 from ..agrotechnology.calendar import Agrotechnology
+from .monica_output import read_out_csv, read_yield
+from .monica_env import cropsDict, dumps, get_template
+from .monica_worker import MonicaWorkerPool
+from ..weather.cell_weather import CellWeatherCache
 
 ## Example -> Реализация запуска бинарника
 
@@ -55,17 +64,65 @@ def csvdate_to_date(x, dateformat):
 
 
 def weather_to_monica(weather: pd.DataFrame, dst: str):
-    weather.loc[:, "de-date"] = pd.to_datetime(weather["de-date"], format="%d.%m.%Y")
-    weather.round(2).to_csv(dst, sep=";", index=False)
+    """Write a MONICA climate file, de-date stays "%d.%m.%Y" as the
+    climate.csv-options header expects"""
+    weather = weather.round(2).assign(
+        **{"de-date": pd.to_datetime(weather["de-date"], format="%d.%m.%Y")}
+    )
+    weather.to_csv(dst, sep=";", index=False, date_format="%d.%m.%Y")
     return weather
 
 
 calendar = Agrotechnology()
 
 
+MONICA_INPUT_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "monica",
+    "monica_input",
+)
+
+
 class MONICA:
-    def __init__(self) -> None:
-        pass
+    """MONICA runs, each in its own sandbox directory
+
+    Every run writes its crop, site and sim files, patched from the cached
+    MonicaEnvTemplate, into a fresh temporary directory and runs monica-run
+    there, so runs never share files.
+
+    Args:
+        input_dir (str, optional): directory with crop.json, site.json,
+            sim-monica.json and climate-monica.csv
+        monica_cmd (str, optional): MONICA executable
+        max_workers (int, optional): maximum number of concurrent runs,
+            monica-run processes or worker requests, defaults to the number
+            of CPUs
+        workdir (str, optional): parent directory of the sandboxes,
+            defaults to the system temp directory
+        workers (MonicaWorkerPool, optional): persistent workers receiving
+            the env documents instead of a monica-run per sandbox
+        cell_weather (CellWeatherCache, optional): weather of the grid
+            cells, written as the climate file of every run; without it
+            all runs use climate-monica.csv of input_dir
+    """
+
+    def __init__(
+        self,
+        input_dir: str = MONICA_INPUT_DIR,
+        monica_cmd: str = "monica-run",
+        max_workers: Optional[int] = None,
+        workdir: Optional[str] = None,
+        workers: Optional[MonicaWorkerPool] = None,
+        cell_weather: Optional[CellWeatherCache] = None,
+    ) -> None:
+        self.input_dir = input_dir
+        self.monica_cmd = monica_cmd
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.workdir = workdir
+        self.template = get_template(input_dir)
+        self.workers = workers
+        self.cell_weather = cell_weather
+        self._slots = threading.BoundedSemaphore(self.max_workers)
 
     def compute(
         self,
@@ -76,71 +133,102 @@ class MONICA:
         harvest: dt.datetime,
         sowing: dt.datetime,
     ):
-        calendar_dataset = xr.Dataset()
-        cropCalendar = calendar.getCropCalendar(
-            dataset=calendar_dataset, lon=lon, lat=lat, year=year
-        )
-        if (cropCalendar["plant_day"] == "NaN") or (
-            cropCalendar["harvest_day"] == "NaN"
-        ):
-            return "NaN"
-        path_monica = "../monica/monica_input/"
-        dst = os.path.join(path_monica, "climate-monica.csv")
-        crop_res = prepareCrop(
-            path=path_monica,
+        env = self.template.env(
             crop_name=crop,
-            planting=cropCalendar["plant_day"],
-            harvest=cropCalendar["harvest_day"],
+            crop_variety=crop_variety,
+            planting=sowing.strftime("%Y-%m-%d"),
+            harvest=harvest.strftime("%Y-%m-%d"),
+            latitude=lat,
         )
-
-        site_res = prepareSite(path=path_monica, latitude=lat)
-        # Run monica
-        path_sim_file = "monica_run.sh"
-        cmd_monica = "bash"
-
-        cmd = "monica-run"
-        res_monica_run = subprocess.run([cmd, path_sim_file], universal_newlines=True)
-        print(res_monica_run)
-        daily_monica = pd.read_csv(
-            "./out.csv", skiprows=[0, 2], skipfooter=30, engine="python"
-        )
-        out_monica = pd.read_csv("./out.csv", skiprows=1, nrows=2)
-        monica_yield = out_monica.loc[1, "Yield"]
+        with tempfile.TemporaryDirectory(prefix="monica_", dir=self.workdir) as sandbox:
+            climate = self.prepare_sandbox(sandbox, lon=lon, lat=lat)
+            if self.workers is not None:
+                with self._slots:
+                    return self.workers.submit(env, climate=climate)
+            self.template.write(env, sandbox)
+            self.run(sandbox)
+
+            monica_yield = read_yield(os.path.join(sandbox, "out.csv"))
         return monica_yield
 
-
-def prepareCrop(path: str, crop_name: str, planting: str, harvest: str) -> dict:
+    def compute_many(self, tasks: Iterable[dict]) -> list:
+        """Run many simulations, at most max_workers at the same time
+
+        Args:
+            tasks (Iterable[dict]): keyword arguments of compute()
+
+        Returns:
+            list: yield per task, in task order
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(lambda kwargs: self.compute(**kwargs), tasks))
+
+    def prepare_sandbox(
+        self, sandbox: str, lon: Optional[float] = None, lat: Optional[float] = None
+    ) -> str:
+        """Put the climate file next to the run env files
+
+        The climate is the weather of the cell of (lon, lat) if the model has
+        a cell_weather cache, otherwise climate-monica.csv of input_dir.
+
+        Returns:
+            str: path of the climate file in the sandbox
+        """
+        dst = os.path.join(sandbox, "climate-monica.csv")
+        if self.cell_weather is not None and lon is not None and lat is not None:
+            weather = self.cell_weather.get(lon=lon, lat=lat).complete()
+            weather_to_monica(weather.to_monica(), dst)
+            return dst
+        climate = os.path.join(self.input_dir, "climate-monica.csv")
+        try:
+            os.symlink(os.path.abspath(climate), dst)
+        except OSError:
+            shutil.copy(climate, sandbox)
+        return dst
+
+    def run(self, sandbox: str):
+        """Run monica-run in the sandbox, bounded by max_workers"""
+        with self._slots:
+            res_monica_run = subprocess.run(
+                [self.monica_cmd, "sim-monica.json"],
+                cwd=sandbox,
+                capture_output=True,
+                universal_newlines=True,
+            )
+        if res_monica_run.returncode != 0:
+            msg = "monica-run failed in %s: %s" % (
+                sandbox,
+                res_monica_run.stderr[-500:],
+            )
+            raise RuntimeError(msg)
+        return res_monica_run
+
+
+def prepareCrop(
+    path: str,
+    crop_name: str,
+    planting: str,
+    harvest: str,
+    out_dir: Optional[str] = None,
+) -> dict:
 
     """
     Prepare crop dict for MONICA JSON file
 
     """
 
-    crop_file = os.path.join(path, "crop.json")
+    cropJson = get_template(path).crop_env(
+        crop_name=crop_name, planting=planting, harvest=harvest
+    )
 
-    with open(crop_file, "r") as j:
-        cropJson = json.loads(j.read())
-
-    # planting date
-    cropJson["cropRotation"][0]["worksteps"][0]["date"] = planting
-    # harvest date
-    cropJson["cropRotation"][0]["worksteps"][1]["date"] = harvest
-    for target in ["species", "cultivar"]:
-        cropJson["cropRotation"][0]["worksteps"][0]["crop"]["cropParams"][target][
-            1
-        ] = cropsDict[crop_name][target]
-    cropJson["cropRotation"][0]["worksteps"][0]["crop"]["residueParams"][1] = cropsDict[
-        crop_name
-    ]["crop-residues"]
-
-    cropfName = os.path.join(path, "crop-monica.json")
+    cropfName = os.path.join(out_dir or path, "crop-monica.json")
     with open(cropfName, "w") as file:
-        json.dump(cropJson, file, ensure_ascii=False, indent=4)
+        file.write(dumps(cropJson))
 
     return cropJson
 
 
-def prepareSite(path: str, latitude: float) -> dict:
+def prepareSite(path: str, latitude: float, out_dir: Optional[str] = None) -> dict:
     """
     Prepare site dict for MONICA JSON file
 
@@ -148,13 +236,9 @@ def prepareSite(path: str, latitude: float) -> dict:
 
     """
 
-    site_file = os.path.join(path, "site.json")
-
-    with open(site_file, "r") as j:
-        siteJson = json.loads(j.read())
-    siteJson["SiteParameters"]["Latitude"] = latitude
-    sitefName = os.path.join(path, "site-monica.json")
+    siteJson = get_template(path).site_env(latitude=latitude)
+    sitefName = os.path.join(out_dir or path, "site-monica.json")
     with open(sitefName, "w") as file:
-        json.dump(siteJson, file, ensure_ascii=False, indent=4)
+        file.write(dumps(siteJson))
 
     return siteJson
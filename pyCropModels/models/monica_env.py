@@ -0,0 +1,164 @@
+"""
+In-memory MONICA env templates
+
+The base crop, site and sim documents of an input directory are read once
+per process. A run env only replaces the few fields that change per run and
+shares everything else with the template, so treat env documents as
+read-only.
+"""
+import os
+import json
+from functools import lru_cache
+from typing import Optional
+
+# MONICA parameter files (relative to MONICA_PARAMETERS) per crop
+cropsDict = {
+    "barley": {
+        "species": "crops/barley.json",
+        "cultivar": "crops/barley/spring-barley.json",
+        "crop-residues": "crop-residues/barley.json",
+        "is-winter-crop": False,
+    },
+    "wheat": {
+        "species": "crops/wheat.json",
+        "cultivar": "crops/wheat/winter-wheat.json",
+        "crop-residues": "crop-residues/wheat.json",
+        "is-winter-crop": True,
+    },
+    "maize": {
+        "species": "crops/maize.json",
+        "cultivar": "crops/maize/grain-maize.json",
+        "crop-residues": "crop-residues/maize.json",
+        "is-winter-crop": False,
+    },
+}
+
+# file names referenced by sim-monica.json
+ENV_FILES = {
+    "crop": "crop-monica.json",
+    "site": "site-monica.json",
+    "sim": "sim-monica.json",
+}
+
+
+def dumps(doc: dict) -> str:
+    """Compact JSON of a MONICA document"""
+    return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+
+def _load(path: str) -> dict:
+    with open(path, "r") as j:
+        return json.loads(j.read())
+
+
+class MonicaEnvTemplate:
+    """Base MONICA documents of an input directory
+
+    Args:
+        input_dir (str): directory with crop.json, site.json and
+            sim-monica.json
+    """
+
+    def __init__(self, input_dir: str) -> None:
+        self.input_dir = input_dir
+        self.crop = _load(os.path.join(input_dir, "crop.json"))
+        self.site = _load(os.path.join(input_dir, "site.json"))
+        self.sim = _load(os.path.join(input_dir, "sim-monica.json"))
+
+    def crop_env(
+        self,
+        crop_name: str,
+        planting: str,
+        harvest: str,
+        crop_variety: Optional[str] = None,
+    ) -> dict:
+        """Crop document with the crop, sowing and harvest of one run
+
+        Args:
+            crop_name (str): key of cropsDict
+            planting (str): sowing date "%Y-%m-%d"
+            harvest (str): harvest date "%Y-%m-%d"
+            crop_variety (str, optional): cultivar file name (without .json)
+                in crops/<crop_name>/, defaults to the cultivar of cropsDict
+        """
+        if crop_name not in cropsDict:
+            msg = "Unknown MONICA crop '%s', expected one of %s" % (
+                crop_name,
+                list(cropsDict),
+            )
+            raise ValueError(msg)
+        params = cropsDict[crop_name]
+        cultivar = params["cultivar"]
+        if crop_variety:
+            cultivar = f"crops/{crop_name}/{crop_variety}.json"
+
+        rotation = self.crop["cropRotation"][0]
+        sowing_step, harvest_step = rotation["worksteps"][:2]
+        crop = dict(
+            sowing_step["crop"],
+            cropParams={
+                "species": ["include-from-file", params["species"]],
+                "cultivar": ["include-from-file", cultivar],
+            },
+            residueParams=["include-from-file", params["crop-residues"]],
+        )
+        crop["is-winter-crop"] = params["is-winter-crop"]
+        worksteps = [
+            dict(sowing_step, date=planting, crop=crop),
+            dict(harvest_step, date=harvest),
+        ] + rotation["worksteps"][2:]
+        return dict(
+            self.crop,
+            cropRotation=[dict(rotation, worksteps=worksteps)]
+            + self.crop["cropRotation"][1:],
+        )
+
+    def site_env(self, latitude: float, soil_layers: Optional[list] = None) -> dict:
+        """Site document with the latitude and soil profile of one run
+
+        Args:
+            latitude (float): site latitude
+            soil_layers (list, optional): SoilProfileParameters layers,
+                defaults to the profile of site.json
+        """
+        site_parameters = dict(self.site["SiteParameters"], Latitude=latitude)
+        if soil_layers is not None:
+            site_parameters["SoilProfileParameters"] = soil_layers
+        return dict(self.site, SiteParameters=site_parameters)
+
+    def env(
+        self,
+        crop_name: str,
+        planting: str,
+        harvest: str,
+        latitude: float,
+        crop_variety: Optional[str] = None,
+        soil_layers: Optional[list] = None,
+    ) -> dict:
+        """Crop, site and sim documents of one run
+
+        Returns:
+            dict: {"crop": dict, "site": dict, "sim": dict}
+        """
+        return {
+            "crop": self.crop_env(
+                crop_name=crop_name,
+                planting=planting,
+                harvest=harvest,
+                crop_variety=crop_variety,
+            ),
+            "site": self.site_env(latitude=latitude, soil_layers=soil_layers),
+            "sim": self.sim,
+        }
+
+    def write(self, env: dict, out_dir: str) -> None:
+        """Write the documents of env as compact JSON into out_dir"""
+        for key, doc in env.items():
+            with open(os.path.join(out_dir, ENV_FILES[key]), "w") as file:
+                file.write(dumps(doc))
+
+
+@lru_cache(maxsize=None)
+def get_template(input_dir: str) -> MonicaEnvTemplate:
+    """Template of input_dir, loaded once per process"""
+    return MonicaEnvTemplate(os.path.abspath(input_dir))
@@ -0,0 +1,141 @@
+"""
+Parser of the MONICA out.csv file
+
+out.csv holds one block per output section ("daily", "crop", "yearly",
+"run"): the quoted section name, a header row, a units row, the data rows
+and a blank line.
+"""
+import os
+
+import numpy as np
+
+TAIL_BLOCK = 64 * 1024
+
+
+def _section_name(line: str, sep: str):
+    """Name of a section start line, None for any other line"""
+    if line.startswith('"') and line.endswith('"') and sep not in line:
+        return line.strip('"')
+    return None
+
+
+def _typed(values: list) -> np.ndarray:
+    """Column of strings to a float, datetime64[D] or str array"""
+    try:
+        return np.array([v if v != "" else "nan" for v in values], dtype=float)
+    except ValueError:
+        pass
+    try:
+        return np.array(values, dtype="datetime64[D]")
+    except ValueError:
+        return np.array(values, dtype=object)
+
+
+def _to_arrays(columns: list, rows: list) -> dict:
+    """Rows of one section to a dict of typed column arrays"""
+    if not rows:
+        return {name: np.array([]) for name in columns}
+    values = list(zip(*rows))
+    return {name: _typed(list(v)) for name, v in zip(columns, values)}
+
+
+def parse_out_csv(lines, sep: str = ",", units: bool = True, sections=None) -> dict:
+    """Parse out.csv lines in one pass
+
+    Args:
+        lines: iterable of lines, e.g. an open file
+        sep (str, optional): csv separator of the sim file csv-options
+        units (bool, optional): sections have a units row
+        sections (optional): names of the sections to keep, all by default.
+            Parsing stops once all of them are read.
+
+    Returns:
+        dict: {section: {column: np.ndarray}}, plus "units" as
+            {section: {column: unit}}
+    """
+    wanted = None if sections is None else set(sections)
+    result = {"units": {}}
+    name, columns, unit_row, rows = None, None, None, []
+    expect_units = False
+
+    def close():
+        if name is not None and columns is not None:
+            if wanted is None or name in wanted:
+                result[name] = _to_arrays(columns, rows)
+                result["units"][name] = dict(zip(columns, unit_row or []))
+
+    for line in lines:
+        line = line.rstrip("\r\n")
+        section = _section_name(line, sep)
+        if section is not None or (line == "" and name is not None):
+            close()
+            if wanted is not None and wanted.issubset(result):
+                return result
+            name, columns, unit_row, rows = section, None, None, []
+            continue
+        if name is None or line == "":
+            continue
+        if columns is None:
+            columns = line.split(sep)
+            expect_units = units
+        elif expect_units:
+            unit_row = line.split(sep)
+            expect_units = False
+        elif wanted is None or name in wanted:
+            rows.append(line.split(sep))
+    close()
+    return result
+
+
+def read_out_csv(path: str, sep: str = ",", units: bool = True) -> dict:
+    """All sections of a MONICA out.csv as typed arrays, see parse_out_csv"""
+    with open(path, "r") as f:
+        return parse_out_csv(f, sep=sep, units=units)
+
+
+def read_yield(
+    path: str,
+    section: str = "crop",
+    column: str = "Yield",
+    sep: str = ",",
+    units: bool = True,
+) -> float:
+    """Yield of the last crop, read from the tail of out.csv
+
+    The summary sections follow the daily section, so only the end of the
+    file is read, growing the block until the section start is in it.
+
+    Args:
+        path (str): path of out.csv
+        section (str, optional): section holding the yield
+        column (str, optional): yield column
+        sep (str, optional): csv separator
+        units (bool, optional): sections have a units row
+
+    Returns:
+        float: value of column in the last row of section
+    """
+    marker = f'"{section}"'.encode()
+    size = os.path.getsize(path)
+    block = TAIL_BLOCK
+    with open(path, "rb") as f:
+        while True:
+            start = max(0, size - block)
+            f.seek(start)
+            tail = f.read()
+            i = tail.rfind(marker)
+            line_start = tail[i - 1 : i] == b"\n" or (i == 0 and start == 0)
+            line_end = tail[i + len(marker) : i + len(marker) + 1] in (b"\r", b"\n")
+            if i != -1 and line_start and line_end:
+                break
+            if start == 0:
+                msg = "No '%s' section in %s" % (section, path)
+                raise ValueError(msg)
+            block *= 4
+    lines = tail[i:].decode().splitlines()
+    parsed = parse_out_csv(lines, sep=sep, units=units, sections=[section])
+    values = parsed[section][column]
+    if len(values) == 0:
+        msg = "Empty '%s' section in %s" % (section, path)
+        raise ValueError(msg)
+    return float(values[-1])
@@ -0,0 +1,388 @@
+"""
+Persistent MONICA workers
+
+A worker is a long-running process that reads one JSON request per line on
+stdin and answers with one JSON line on stdout:
+
+    {"id": 1, "env": {"crop": {...}, "site": {...}, "sim": {...}},
+     "climate": "/path/climate.csv"}
+    {"id": 1, "yield": 5123.4}  or  {"id": 1, "error": "..."}
+
+MonicaWorkerPool keeps N workers alive and sends them env documents, so no
+Python process is started per simulation. Whether MONICA itself starts per
+simulation depends on the worker:
+
+    python -m pyCropModels.models.monica_worker --stand-in
+        answers without MONICA, for tests
+    python -m pyCropModels.models.monica_worker --monica-cmd monica-run
+        still starts monica-run for every request, in a sandbox kept for
+        the life of the worker, so only the Python side startup is saved
+    python -m pyCropModels.models.monica_worker --zmq
+        starts one monica-zmq-server and sends it the env of every request,
+        so MONICA starts once per worker (needs monica_io3 and pyzmq)
+"""
+import os
+import sys
+import json
+import queue
+import shutil
+import hashlib
+import argparse
+import datetime as dt
+import logging
+import subprocess
+import socket
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from pyCropModels.models.monica_env import ENV_FILES, dumps
+from pyCropModels.models.monica_output import read_yield
+
+logger = logging.getLogger(__name__)
+
+
+def stand_in_yield(env: dict, climate: Optional[str] = None) -> float:
+    """Deterministic stand-in for a MONICA run, not a crop model
+
+    Depends on the sowing date, harvest date, cultivar and latitude of the
+    env, so tests can tell runs apart.
+    """
+    sowing, harvest = env["crop"]["cropRotation"][0]["worksteps"][:2]
+    cultivar = sowing["crop"]["cropParams"]["cultivar"][1]
+    latitude = env["site"]["SiteParameters"]["Latitude"]
+    season = dt.date.fromisoformat(harvest["date"]) - dt.date.fromisoformat(
+        sowing["date"]
+    )
+    offset = int(hashlib.md5(cultivar.encode()).hexdigest()[:4], 16) % 500
+    return 3000.0 + 10.0 * season.days + 20.0 * float(latitude) + offset
+
+
+class MonicaRunHandler:
+    """Run monica-run for each request in one sandbox owned by the worker
+
+    Args:
+        monica_cmd (str, optional): MONICA executable
+    """
+
+    def __init__(self, monica_cmd: str = "monica-run") -> None:
+        self.monica_cmd = monica_cmd
+        self.sandbox = tempfile.mkdtemp(prefix="monica_worker_")
+
+    def __call__(self, env: dict, climate: Optional[str] = None) -> float:
+        for key, doc in env.items():
+            with open(os.path.join(self.sandbox, ENV_FILES[key]), "w") as file:
+                file.write(dumps(doc))
+        if climate is not None:
+            link_climate(climate, os.path.join(self.sandbox, env["sim"]["climate.csv"]))
+        out_csv = os.path.join(self.sandbox, "out.csv")
+        if os.path.exists(out_csv):
+            os.remove(out_csv)
+        res = subprocess.run(
+            [self.monica_cmd, ENV_FILES["sim"]],
+            cwd=self.sandbox,
+            capture_output=True,
+            universal_newlines=True,
+        )
+        if res.returncode != 0:
+            msg = "monica-run failed: %s" % res.stderr[-500:]
+            raise RuntimeError(msg)
+        return read_yield(out_csv)
+
+    def close(self) -> None:
+        shutil.rmtree(self.sandbox, ignore_errors=True)
+
+
+def link_climate(climate: str, link: str) -> None:
+    """Point link to climate, replacing the link of an earlier request
+
+    The new link is created next to the old one and moved over it, so the
+    sandbox never holds a missing or half-written climate file.
+    """
+    target = os.path.abspath(climate)
+    if os.path.islink(link) and os.readlink(link) == target:
+        return
+    tmp = "%s.%i.tmp" % (link, os.getpid())
+    if os.path.lexists(tmp):
+        os.remove(tmp)
+    os.symlink(target, tmp)
+    os.replace(tmp, link)
+
+
+def free_port() -> int:
+    """A TCP port on localhost that is free right now"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class MonicaZmqHandler:
+    """Send each request to one monica-zmq-server kept alive by the worker
+
+    The server is started once, every request sends the full MONICA env,
+    built from the crop, site and sim documents with monica_io3, and reads
+    the yield from the results of the reply, so no process is started per
+    simulation.
+
+    Args:
+        server_cmd (list, optional): command starting a MONICA zmq server
+            answering env requests on a REP socket, "{port}" is replaced by
+            the port of the handler
+        section (str, optional): output section holding the yield
+        column (str, optional): yield output
+        timeout (float, optional): seconds to wait for a reply
+    """
+
+    def __init__(
+        self,
+        server_cmd: Optional[list] = None,
+        section: str = "crop",
+        column: str = "Yield",
+        timeout: float = 600.0,
+    ) -> None:
+        try:
+            import zmq
+            import monica_io3
+        except ImportError as e:
+            msg = "MonicaZmqHandler needs pyzmq and monica_io3: %s" % e
+            raise ImportError(msg)
+        self.zmq = zmq
+        self.monica_io3 = monica_io3
+        self.section = section
+        self.column = column
+        self.timeout = timeout
+        port = free_port()
+        self.server_cmd = [
+            arg.format(port=port)
+            for arg in (
+                server_cmd or ["monica-zmq-server", "-bi", "-i", "tcp://*:{port}"]
+            )
+        ]
+        self.address = "tcp://localhost:%i" % port
+        self.server = subprocess.Popen(self.server_cmd)
+        self.context = zmq.Context()
+        self._connect()
+        msg = "Started MONICA zmq server: %s" % " ".join(self.server_cmd)
+        logger.info(msg)
+
+    def _connect(self) -> None:
+        self.socket = self.context.socket(self.zmq.REQ)
+        self.socket.setsockopt(self.zmq.LINGER, 0)
+        self.socket.setsockopt(self.zmq.RCVTIMEO, int(self.timeout * 1000))
+        self.socket.connect(self.address)
+
+    def full_env(self, env: dict, climate: Optional[str] = None) -> dict:
+        """MONICA env of the crop, site and sim documents of a request"""
+        full_env = self.monica_io3.create_env_json_from_json_config(
+            {"crop": env["crop"], "site": env["site"], "sim": env["sim"], "climate": ""}
+        )
+        full_env["csvViaHeaderOptions"] = env["sim"]["climate.csv-options"]
+        if climate is not None:
+            full_env["pathToClimateCSV"] = os.path.abspath(climate)
+        return full_env
+
+    def read_yield(self, reply: dict) -> float:
+        """Last value of the yield output in the section of a reply"""
+        for data in reply.get("data", []):
+            if data.get("origSpec", "").strip('"') != self.section:
+                continue
+            names = [oid.get("displayName") or oid["name"] for oid in data["outputIds"]]
+            if self.column in names and data["results"]:
+                values = data["results"][names.index(self.column)]
+                if values:
+                    return float(values[-1])
+        msg = "No '%s' in the '%s' output of MONICA: %s" % (
+            self.column,
+            self.section,
+            reply.get("errors", []),
+        )
+        raise ValueError(msg)
+
+    def __call__(self, env: dict, climate: Optional[str] = None) -> float:
+        if self.server.poll() is not None:
+            msg = "MONICA zmq server exited with %s" % self.server.returncode
+            raise RuntimeError(msg)
+        self.socket.send_json(self.full_env(env, climate))
+        try:
+            reply = self.socket.recv_json()
+        except self.zmq.Again:
+            # a REQ socket without a reply cannot send again
+            self.socket.close()
+            self._connect()
+            msg = "No reply of the MONICA zmq server in %.0f s" % self.timeout
+            raise RuntimeError(msg)
+        return self.read_yield(reply)
+
+    def close(self) -> None:
+        self.socket.close()
+        self.context.term()
+        if self.server.poll() is None:
+            self.server.terminate()
+            self.server.wait()
+
+
+def serve(handler, stdin=sys.stdin, stdout=sys.stdout) -> None:
+    """Answer JSON line requests with handler(env, climate) until EOF"""
+    for line in stdin:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        response = {"id": request.get("id")}
+        try:
+            response["yield"] = handler(request["env"], request.get("climate"))
+        except Exception as e:
+            response["error"] = str(e)
+        stdout.write(json.dumps(response) + "\n")
+        stdout.flush()
+
+
+class MonicaWorker:
+    """One persistent worker process
+
+    Args:
+        worker_cmd (list): command starting a worker
+    """
+
+    def __init__(self, worker_cmd: list) -> None:
+        self.worker_cmd = worker_cmd
+        self.process = subprocess.Popen(
+            worker_cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            universal_newlines=True,
+            bufsize=1,
+        )
+        self._next_id = 0
+
+    def request(self, env: dict, climate: Optional[str] = None) -> float:
+        """Send one env and wait for its yield"""
+        self._next_id += 1
+        request = {"id": self._next_id, "env": env, "climate": climate}
+        self.process.stdin.write(dumps(request) + "\n")  # type: ignore
+        self.process.stdin.flush()  # type: ignore
+        line = self.process.stdout.readline()  # type: ignore
+        if not line:
+            msg = "MONICA worker %s exited with %s" % (
+                self.worker_cmd,
+                self.process.poll(),
+            )
+            raise RuntimeError(msg)
+        response = json.loads(line)
+        if "error" in response:
+            raise RuntimeError(response["error"])
+        return float(response["yield"])
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def close(self) -> None:
+        if self.alive():
+            self.process.stdin.close()  # type: ignore
+            self.process.wait()
+
+
+class MonicaWorkerPool:
+    """Pool of persistent MONICA workers on the local machine
+
+    Args:
+        size (int, optional): number of workers, defaults to the number of CPUs
+        worker_cmd (list, optional): command starting a worker, defaults to
+            this module running monica-run per request; add "--zmq" to keep
+            one MONICA zmq server per worker instead
+    """
+
+    def __init__(self, size: Optional[int] = None, worker_cmd: Optional[list] = None):
+        self.size = size or os.cpu_count() or 1
+        self.worker_cmd = worker_cmd or [
+            sys.executable,
+            "-m",
+            "pyCropModels.models.monica_worker",
+        ]
+        self._idle = queue.Queue()
+        # every started worker, idle or busy, so close() stops all of them
+        self._workers = []
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.size):
+            worker = MonicaWorker(self.worker_cmd)
+            self._workers.append(worker)
+            self._idle.put(worker)
+        msg = "Started %i MONICA workers: %s" % (self.size, " ".join(self.worker_cmd))
+        logger.info(msg)
+
+    def _replace(self, worker: MonicaWorker) -> MonicaWorker:
+        """New worker in place of a dead one, unless the pool is closed"""
+        with self._lock:
+            if self._closed:
+                return worker
+            self._workers.remove(worker)
+            worker = MonicaWorker(self.worker_cmd)
+            self._workers.append(worker)
+        return worker
+
+    def submit(self, env: dict, climate: Optional[str] = None) -> float:
+        """Run one env on the next idle worker, dead workers are replaced"""
+        if self._closed:
+            msg = "MONICA worker pool is closed"
+            raise RuntimeError(msg)
+        worker = self._idle.get()
+        if not worker.alive():
+            worker = self._replace(worker)
+        try:
+            return worker.request(env, climate)
+        finally:
+            if not worker.alive():
+                worker = self._replace(worker)
+            self._idle.put(worker)
+
+    def map(self, envs: Iterable[dict], climate: Optional[str] = None) -> list:
+        """Run many envs on all workers, yields in env order"""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(executor.map(lambda env: self.submit(env, climate), envs))
+
+    def close(self) -> None:
+        """Stop all workers, also the ones busy with a request"""
+        with self._lock:
+            self._closed = True
+            workers, self._workers = self._workers, []
+        for worker in workers:
+            worker.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Persistent MONICA worker")
+    parser.add_argument(
+        "--stand-in", action="store_true", help="answer without running MONICA"
+    )
+    parser.add_argument("--monica-cmd", default="monica-run", help="MONICA executable")
+    parser.add_argument(
+        "--zmq", action="store_true", help="send the envs to a MONICA zmq server"
+    )
+    parser.add_argument(
+        "--server-cmd",
+        nargs="+",
+        help='MONICA zmq server command, "{port}" is replaced by its port',
+    )
+    args = parser.parse_args()
+    if args.stand_in:
+        serve(stand_in_yield)
+        return
+    if args.zmq:
+        handler = MonicaZmqHandler(server_cmd=args.server_cmd)
+    else:
+        handler = MonicaRunHandler(monica_cmd=args.monica_cmd)
+    try:
+        serve(handler)
+    finally:
+        handler.close()
+
+
+if __name__ == "__main__":
+    main()
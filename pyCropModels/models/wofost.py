@@ -1,26 +1,232 @@
 import datetime as dt
+from collections import OrderedDict
+from typing import Iterable, Optional
 
-import yaml
-from pcse.base import ParameterProvider
+import numpy as np
+import xarray as xr
+from pcse.base import MultiCropDataProvider, ParameterProvider
 from pcse.db import NASAPowerWeatherDataProvider
 from pcse.engine import Engine
 from pcse.fileinput import CABOFileReader, YAMLCropDataProvider, csvweatherdataprovider
 from pcse.models import Wofost71_PP, Wofost71_WLP_FD
 from pcse.util import DummySoilDataProvider, WOFOST71SiteDataProvider
 
-from pyCropModels.weather.aws_weather import Aws_Wofost
+from pyCropModels.weather.aws_weather import Aws_Wofost, shared_reference_et
+from pyCropModels.weather.extract import PointExtractor
+from pyCropModels.weather.cell_weather import CellWeatherCache
+from pyCropModels.models.wofost_output import OutputBuffer, StreamingWofost
+
+
+class WofostRunContext:
+    """Prepared WOFOST inputs of one (crop, variety)
+
+    The crop, site and soil parameter sets are resolved once. A run only
+    builds the agromanagement from a template and applies its overrides.
+
+    Args:
+        cropd: crop data provider, e.g. YAMLCropDataProvider
+        sited: site data provider
+        soild: soil data provider
+        crop (str): crop name
+        crop_variety (str): variety name
+    """
+
+    max_duration = 300
+    campaign_lead = dt.timedelta(20)
+
+    def __init__(self, cropd, sited, soild, crop: str, crop_variety: str) -> None:
+        if isinstance(cropd, MultiCropDataProvider):
+            cropd.set_active_crop(crop, crop_variety)
+        # snapshot, the provider is shared and set_active_crop mutates it
+        self.cropdata = dict(cropd)
+        self.sitedata = dict(sited)
+        self.soildata = dict(soild)
+        self.crop = crop
+        self.crop_variety = crop_variety
+
+    def agromanagement(self, sowing: dt.date, harvest: dt.date) -> list:
+        """Agromanagement of one season, same layout as the parsed YAML"""
+        crop_calendar = {
+            "crop_name": self.crop,
+            "variety_name": self.crop_variety,
+            "crop_start_date": sowing,
+            "crop_start_type": "emergence",
+            "crop_end_date": harvest,
+            "crop_end_type": "harvest",
+            "max_duration": self.max_duration,
+        }
+        campaign = {
+            "CropCalendar": crop_calendar,
+            "TimedEvents": None,
+            "StateEvents": None,
+        }
+        return [{sowing - self.campaign_lead: campaign}]
+
+    def parameters(self, overrides: Optional[dict] = None) -> ParameterProvider:
+        """ParameterProvider of one run
+
+        Args:
+            overrides (dict, optional): parameter values of the run, e.g. the
+                sample of a sensitivity analysis
+        """
+        params = ParameterProvider(
+            cropdata=self.cropdata, sitedata=self.sitedata, soildata=self.soildata
+        )
+        for name, value in (overrides or {}).items():
+            params.set_override(name, value)
+        return params
+
+    def run(
+        self,
+        wdp,
+        sowing,
+        harvest,
+        overrides: Optional[dict] = None,
+        output: Optional[OutputBuffer] = None,
+        point: int = 0,
+    ) -> float:
+        """Simulate one season
+
+        Args:
+            wdp: weather data provider of the site
+            sowing: sowing date, str "%Y-%m-%d" or date
+            harvest: harvest date, str "%Y-%m-%d" or date
+            overrides (dict, optional): parameter values of the run
+            output (OutputBuffer, optional): buffer receiving the daily and
+                summary variables of its OutputSpec
+            point (int, optional): index of the run in output
+
+        Returns:
+            float: yield TWSO (kg/ha), NaN if output is given and its summary
+                does not hold TWSO
+        """
+        agro = self.agromanagement(sowing=to_date(sowing), harvest=to_date(harvest))
+        params = self.parameters(overrides)
+        if output is None:
+            wofost = Wofost71_WLP_FD(params, wdp, agro)
+        else:
+            wofost = StreamingWofost(params, wdp, agro, output=output, point=point)
+        wofost.run_till_terminate()
+        r = wofost.get_summary_output()
+        fld_yield = r[-1].get("TWSO")
+        return np.nan if fld_yield is None else fld_yield
+
+
+def to_date(day) -> dt.date:
+    """str "%Y-%m-%d", date or datetime to date"""
+    if isinstance(day, str):
+        return dt.datetime.strptime(day, "%Y-%m-%d").date()
+    if isinstance(day, dt.datetime):
+        return day.date()
+    return day
+
+
+class WeatherProviderCache:
+    """Size-bounded LRU cache of Aws_Wofost providers per weather grid cell
+
+    Points are keyed by their grid cell, so all crops, varieties, sowing
+    dates and points inside one cell share a provider built at the cell
+    centre.
+
+    Args:
+        dataset (dict): dict returned by AwsNasaPower.download()
+        maxsize (int, optional): maximum number of cached providers
+        cell_weather (CellWeatherCache, optional): canonical weather of the
+            cells, shared with other models of an ensemble
+        ds_et (xr.Dataset, optional): reference ET of the dataset, see
+            weather_reference_et, sliced by the providers instead of
+            computing the ET of their cell
+    """
+
+    def __init__(
+        self,
+        dataset: dict,
+        maxsize: int = 256,
+        cell_weather: Optional[CellWeatherCache] = None,
+        ds_et: Optional[xr.Dataset] = None,
+    ) -> None:
+        self.dataset = dataset
+        self.maxsize = maxsize
+        self.cell_weather = cell_weather
+        self.ds_et = ds_et
+        self.extractor = PointExtractor(
+            ds_weather=dataset["meteo"], ds_solar=dataset["solar"]
+        )
+        self._providers = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, lon: float, lat: float) -> Aws_Wofost:
+        """Weather provider of the grid cell of (lon, lat)"""
+        cell_id = int(self.extractor.cell_id([lon], [lat])[0])
+        if cell_id in self._providers:
+            self.hits += 1
+            self._providers.move_to_end(cell_id)
+            return self._providers[cell_id]
+
+        self.misses += 1
+        lat_idx, lon_idx = divmod(cell_id, len(self.extractor.lon))
+        cell_lon = float(self.extractor.lon[lon_idx])
+        cell_lat = float(self.extractor.lat[lat_idx])
+        wdp = Aws_Wofost(
+            longitude=cell_lon,
+            latitude=cell_lat,
+            ds_solar=self.dataset["solar"],
+            ds_weather=self.dataset["meteo"],
+            ds_et=self.ds_et,
+            cell_weather=(
+                self.cell_weather.get(lon=cell_lon, lat=cell_lat)
+                if self.cell_weather is not None
+                else None
+            ),
+        )
+        self._providers[cell_id] = wdp
+        if len(self._providers) > self.maxsize:
+            self._providers.popitem(last=False)
+        return wdp
+
+    def stats(self) -> dict:
+        """Hit/miss statistics of the cache"""
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / calls if calls else 0.0,
+            "size": len(self._providers),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self) -> None:
+        """Drop all providers and reset the statistics"""
+        self._providers.clear()
+        self.hits = 0
+        self.misses = 0
 
 
 class WOFOST:
-    def __init__(self, dataset) -> None:
+    def __init__(
+        self,
+        dataset,
+        wdp_cache_size: int = 256,
+        cell_weather: Optional[CellWeatherCache] = None,
+        ds_et: Optional[xr.Dataset] = None,
+    ) -> None:
         self.dataset = dataset  # aws weather dataset
+        # reference ET of all cells at once, shared by the models of dataset
+        self.ds_et = ds_et if ds_et is not None else shared_reference_et(dataset)
+        self.wdp_cache = WeatherProviderCache(
+            dataset, maxsize=wdp_cache_size, cell_weather=cell_weather, ds_et=self.ds_et
+        )
         self._cropd = YAMLCropDataProvider()
         self._sited = WOFOST71SiteDataProvider(WAV=50)
         self.cultivars = {"soybean": "Soybean_904", "maize": "Grain_maize_201"}
 
         self._soild = DummySoilDataProvider()
+        self._contexts = {}
 
     def get_wdp(self, lon: float, lat: float, dataset: dict):
+        if dataset is self.dataset:
+            return self.wdp_cache.get(lon=lon, lat=lat)
         wdp = Aws_Wofost(
             longitude=lon,
             latitude=lat,
@@ -32,6 +238,19 @@ class WOFOST:
     def get_soil(self, lon: float, lat: float):
         return "Done"
 
+    def run_context(self, crop: str, crop_variety: str) -> WofostRunContext:
+        """Prepared run context of (crop, crop_variety), built once"""
+        key = (crop, crop_variety)
+        if key not in self._contexts:
+            self._contexts[key] = WofostRunContext(
+                cropd=self._cropd,
+                sited=self._sited,
+                soild=self._soild,
+                crop=crop,
+                crop_variety=crop_variety,
+            )
+        return self._contexts[key]
+
     def compute(
         self,
         crop: str,
@@ -40,45 +259,61 @@ class WOFOST:
         lon: float,
         harvest: str,
         sowing: str,
+        overrides: Optional[dict] = None,
+        output: Optional[OutputBuffer] = None,
+        point: int = 0,
     ):
         wdp = self.get_wdp(lon=lon, lat=lat, dataset=self.dataset)
-        sowing_dt = dt.datetime.strptime(sowing, "%Y-%m-%d")
-        campaign_start_date = dt.datetime.strftime(
-            sowing_dt - dt.timedelta(20), "%Y-%m-%d"
-        )
-        emergence_date = sowing
-        harvest_date = harvest
-        max_duration = 300
-        soilgrids = self.get_soil(lat=lat, lon=lon)
-        soild = self._soild
+        context = self.run_context(crop=crop, crop_variety=crop_variety)
         #     soild['SMW'] = df.iloc[i, :]['Wilting point']
         #     soild['SMFCF'] = df.iloc[i, :]['Field Capacity']
         #     soild['K0'] = df.iloc[i, :]['Ks (cm/h)']
-        # Here we define the agromanagement for crop
-        agro_yaml = f"""
-        - {campaign_start_date}:
-            CropCalendar:
-                crop_name: {crop}
-                variety_name: {crop_variety}
-                crop_start_date: {sowing}
-                crop_start_type: emergence
-                crop_end_date: {harvest}
-                crop_end_type: harvest
-                max_duration: {max_duration}
-            TimedEvents: null
-            StateEvents: null
-        """
-        agro = yaml.safe_load(agro_yaml)
+        fld_yield = context.run(
+            wdp=wdp,
+            sowing=sowing,
+            harvest=harvest,
+            overrides=overrides,
+            output=output,
+            point=point,
+        )
+        return fld_yield
 
-        firstkey = list(agro[0])[0]
-        cropcalendar = agro[0][firstkey]["CropCalendar"]
-        cropd = self._cropd
-        sited = self._sited
-        cropd.set_active_crop(cropcalendar["crop_name"], cropcalendar["variety_name"])
-        params = ParameterProvider(cropdata=cropd, sitedata=sited, soildata=soild)
+    def compute_many(
+        self,
+        crop: str,
+        crop_variety: str,
+        lat: float,
+        lon: float,
+        runs: Iterable[dict],
+        output: Optional[OutputBuffer] = None,
+    ) -> np.ndarray:
+        """Many runs of one site that differ only in dates or parameters
 
-        wofost = Wofost71_WLP_FD(params, wdp, agro)
-        wofost.run_till_terminate()
-        r = wofost.get_summary_output()
-        fld_yield = r[-1]["TWSO"]
-        return fld_yield
+        The weather and the run context are prepared once for all runs.
+
+        Args:
+            crop (str): crop name
+            crop_variety (str): variety name
+            lat (float): latitude of the site
+            lon (float): longitude of the site
+            runs (Iterable[dict]): per run "sowing", "harvest" and optional
+                "overrides" dict of parameter values
+            output (OutputBuffer, optional): buffer receiving run i as point i
+
+        Returns:
+            np.ndarray: yield TWSO (kg/ha) per run
+        """
+        wdp = self.get_wdp(lon=lon, lat=lat, dataset=self.dataset)
+        context = self.run_context(crop=crop, crop_variety=crop_variety)
+        yields = [
+            context.run(
+                wdp=wdp,
+                sowing=run["sowing"],
+                harvest=run["harvest"],
+                overrides=run.get("overrides"),
+                output=output,
+                point=i,
+            )
+            for i, run in enumerate(runs)
+        ]
+        return np.asarray(yields, dtype=float)
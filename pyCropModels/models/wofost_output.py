@@ -0,0 +1,133 @@
+"""
+Selective and streaming WOFOST output
+
+Only the variables of an OutputSpec are read from the model, daily values
+are written straight into a preallocated (point, day, variable) buffer
+instead of PCSE's list of per-day dicts.
+"""
+import os
+import datetime as dt
+from typing import Optional, Sequence
+
+import numpy as np
+import xarray as xr
+from pcse.models import Wofost71_WLP_FD
+from pcse.traitlets import Instance, Int
+
+
+class OutputSpec:
+    """Daily variables and summary fields kept from a WOFOST run
+
+    Args:
+        daily (Sequence[str], optional): variables stored every day
+        summary (Sequence[str], optional): variables stored at crop finish
+    """
+
+    def __init__(
+        self,
+        daily: Sequence[str] = ("LAI", "TWSO", "SM"),
+        summary: Sequence[str] = ("TWSO",),
+    ) -> None:
+        self.daily = list(daily)
+        self.summary = list(summary)
+
+
+class OutputBuffer:
+    """Preallocated output of many WOFOST runs
+
+    Args:
+        spec (OutputSpec): variables to keep
+        n_points (int): number of runs (points) held by the buffer
+        days (Sequence): days of the output axis, e.g. the weather time axis
+        dtype (optional): dtype of the buffer
+    """
+
+    def __init__(
+        self, spec: OutputSpec, n_points: int, days: Sequence, dtype=np.float32
+    ) -> None:
+        self.spec = spec
+        self.days = np.asarray(days, dtype="datetime64[D]")
+        self.daily = np.full((n_points, len(self.days), len(spec.daily)), np.nan, dtype)
+        self.summary = np.full((n_points, len(spec.summary)), np.nan, dtype)
+
+    def write_day(self, point: int, day: dt.date, values: list) -> None:
+        """Store the daily variables of one point, days off the axis are dropped"""
+        i = (np.datetime64(day, "D") - self.days[0]).astype(int)
+        if 0 <= i < len(self.days):
+            self.daily[point, i] = [np.nan if v is None else v for v in values]
+
+    def write_summary(self, point: int, values: list) -> None:
+        """Store the summary variables of one point"""
+        self.summary[point] = [np.nan if v is None else v for v in values]
+
+    def to_dataset(self, coords: Optional[dict] = None) -> xr.Dataset:
+        """Buffer as dataset, daily variables on (point, time)
+
+        Args:
+            coords (dict, optional): extra coordinates on "point", e.g.
+                {"lat": lats, "lon": lons}
+        """
+        data_vars = {
+            var: (("point", "time"), self.daily[:, :, i])
+            for i, var in enumerate(self.spec.daily)
+        }
+        # daily and summary may share names, e.g. TWSO
+        for i, var in enumerate(self.spec.summary):
+            data_vars[f"{var}_summary"] = ("point", self.summary[:, i])
+        ds = xr.Dataset(
+            data_vars,
+            coords={"time": self.days.astype("datetime64[ns]")},
+        )
+        for name, values in (coords or {}).items():
+            ds = ds.assign_coords({name: ("point", np.asarray(values))})
+        return ds
+
+    def to_zarr(self, path: str, coords: Optional[dict] = None) -> None:
+        """Write the buffer, appending along "point" if the store exists"""
+        ds = self.to_dataset(coords=coords)
+        if os.path.exists(path):
+            ds.to_zarr(path, append_dim="point")
+        else:
+            ds.to_zarr(path, mode="w")
+
+
+class StreamingWofost(Wofost71_WLP_FD):
+    """Wofost71_WLP_FD writing the OutputSpec variables into an OutputBuffer
+
+    Args:
+        parameterprovider: ParameterProvider of the run
+        weatherdataprovider: weather data provider of the site
+        agromanagement (list): agromanagement of the run
+        output (OutputBuffer): buffer receiving the output
+        point (int): index of the run in the buffer
+    """
+
+    output = Instance(OutputBuffer)
+    point = Int(0)
+
+    def __init__(
+        self,
+        parameterprovider,
+        weatherdataprovider,
+        agromanagement,
+        output: OutputBuffer,
+        point: int,
+    ):
+        # set before Engine.__init__, which already saves the first day
+        self.output = output
+        self.point = point
+        Wofost71_WLP_FD.__init__(
+            self, parameterprovider, weatherdataprovider, agromanagement
+        )
+        self.mconf.OUTPUT_VARS = output.spec.daily
+        self.mconf.SUMMARY_OUTPUT_VARS = output.spec.summary
+
+    def _save_output(self, day):
+        self.flag_output = False
+        values = [self.get_variable(var) for var in self.output.spec.daily]
+        self.output.write_day(self.point, day, values)
+
+    def _save_summary_output(self):
+        values = [self.get_variable(var) for var in self.output.spec.summary]
+        self.output.write_summary(self.point, values)
+        self._saved_summary_output.append(dict(zip(self.output.spec.summary, values)))
@@ -1,20 +1,24 @@
-from models.dssat import DSSAT
-
-
-polygon = (1000, 1000)
-
-# 100 на 100
-
-
-weather = get_weather(region="EU")  # type weather: xarry
-
-soil = get_soil(region="EU")  # type soil: xarry
-
-for lon, lat in weather["lon", "lat"]:
-    point_weather = get_weather(lon, lat)
-    point_soil = get_soil_point()
-
-    agro[lon, lat] = point_soil
-    # DSSAT.compute(lon, lat, weather = weather)
-    # WOFOST.compute(lon, lat, weather = weather)
-agro.apply(DSSAT.compute())
+import geopandas as gpd
+from shapely.geometry import box
+
+from pyCropModels.weather.aws_weather import AwsNasaPower
+from pyCropModels.models.grid import run_tiled
+
+
+if __name__ == "__main__":
+    # EU bounding box, replace with a country or field polygon
+    region = gpd.GeoDataFrame(geometry=[box(-10.0, 35.0, 40.0, 70.0)], crs="EPSG:4326")
+
+    # the EU does not fit in memory at once, load and simulate tile by tile
+    ds_yield = run_tiled(
+        power=AwsNasaPower(gdf=region),
+        model="wofost",
+        crop="maize",
+        crop_variety="Grain_maize_201",
+        sowing="2022-04-22",
+        harvest="2022-09-29",
+        time_start="2022-01-01",
+        time_end="2022-12-31",
+        memory_budget_mb=1024,
+    )
+    ds_yield.to_netcdf("wofost_maize_yield.nc")
@@ -0,0 +1,179 @@
+"""
+Elevation provider
+
+Bulk elevation lookup from a local DEM (GeoTIFF or zarr) with an on-disk
+memo cache. Without a DEM the OpenTopoData API is queried in batches.
+"""
+import os
+import atexit
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+import xarray as xr
+import requests
+
+logger = logging.getLogger(__name__)
+
+OPENTOPODATA_URL = "https://api.opentopodata.org/v1/aster30m"
+# OpenTopoData accepts at most 100 locations per request
+OPENTOPODATA_BATCH = 100
+
+
+class ElevationProvider:
+    """Elevation (m) for arrays of WGS84 coordinates
+
+    Args:
+        dem_path (str, optional): DEM raster readable by rioxarray or a zarr
+            store with a single elevation variable on lon/lat (or x/y)
+        cache_path (str, optional): .npz file used as persistent memo cache
+        default (float, optional): elevation used where lookup fails
+        decimals (int, optional): coordinates are rounded to this number of
+            decimals for the cache key
+    """
+
+    def __init__(
+        self,
+        dem_path: Optional[str] = None,
+        cache_path: Optional[str] = None,
+        default: float = 200.0,
+        decimals: int = 4,
+    ) -> None:
+        self.dem_path = dem_path
+        self.cache_path = cache_path
+        self.default = default
+        self.decimals = decimals
+        self._dem = None
+        self._cache = {}
+        self._cache_dirty = False
+        if cache_path is not None:
+            if os.path.exists(cache_path):
+                self._load_cache()
+            atexit.register(self.save)
+
+    def __call__(self, longitude: float, latitude: float) -> float:
+        return float(self.lookup([longitude], [latitude])[0])
+
+    @property
+    def dem(self) -> xr.DataArray:
+        """DEM opened lazily and renamed to (lat, lon)"""
+        if self._dem is None:
+            self._dem = self._open_dem(self.dem_path)  # type: ignore
+        return self._dem
+
+    def _open_dem(self, dem_path: str) -> xr.DataArray:
+        if dem_path.rstrip("/").endswith(".zarr") or os.path.isdir(dem_path):
+            ds = xr.open_zarr(dem_path)
+            dem = ds[list(ds.data_vars)[0]]
+        else:
+            import rioxarray
+
+            dem = rioxarray.open_rasterio(dem_path, masked=True)
+            dem = dem.squeeze("band", drop=True)  # type: ignore
+        names = {"x": "lon", "y": "lat", "longitude": "lon", "latitude": "lat"}
+        dem = dem.rename({k: v for k, v in names.items() if k in dem.dims})
+        return dem.sortby("lat").sortby("lon")
+
+    def lookup(self, longitude, latitude) -> np.ndarray:
+        """Elevation for arrays of coordinates
+
+        Args:
+            longitude: array of longitudes in WGS84
+            latitude: array of latitudes in WGS84
+
+        Returns:
+            np.ndarray: elevation (m) per point
+        """
+        lon = np.round(np.asarray(longitude, dtype=float), self.decimals)
+        lat = np.round(np.asarray(latitude, dtype=float), self.decimals)
+        elevation = np.array(
+            [self._cache.get(key, np.nan) for key in zip(lon.tolist(), lat.tolist())]
+        )
+        missing = np.isnan(elevation)
+        if missing.any():
+            if self.dem_path is not None:
+                found = self._lookup_dem(lon[missing], lat[missing])
+            else:
+                found = self._lookup_opentopodata(lon[missing], lat[missing])
+            elevation[missing] = found
+            keys = zip(lon[missing].tolist(), lat[missing].tolist())
+            self._cache.update(
+                (key, value)
+                for key, value in zip(keys, found.tolist())
+                if not np.isnan(value)
+            )
+            self._cache_dirty = True
+        return np.where(np.isnan(elevation), self.default, elevation)
+
+    def _lookup_dem(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        dem = self.dem
+        points = dem.sel(
+            lon=xr.DataArray(lon, dims="points"),
+            lat=xr.DataArray(lat, dims="points"),
+            method="nearest",
+        ).values.astype(float)
+        outside = (
+            (lon < float(dem.lon.min()))
+            | (lon > float(dem.lon.max()))
+            | (lat < float(dem.lat.min()))
+            | (lat > float(dem.lat.max()))
+        )
+        points[outside] = np.nan
+        n_missing = int(np.isnan(points).sum())
+        if n_missing:
+            msg = "%i points outside DEM or without data, using default %s m"
+            logger.warning(msg % (n_missing, self.default))
+        return points
+
+    def _lookup_opentopodata(self, lon: np.ndarray, lat: np.ndarray) -> np.ndarray:
+        elevation = np.full(len(lon), np.nan)
+        for start in range(0, len(lon), OPENTOPODATA_BATCH):
+            batch = slice(start, start + OPENTOPODATA_BATCH)
+            locations = "|".join(
+                f"{y},{x}" for x, y in zip(lon[batch].tolist(), lat[batch].tolist())
+            )
+            try:
+                resp = requests.get(
+                    url=OPENTOPODATA_URL, params={"locations": locations}, timeout=10
+                )
+                resp.raise_for_status()
+                results = resp.json()["results"]
+                elevation[batch] = [
+                    np.nan if r["elevation"] is None else r["elevation"]
+                    for r in results
+                ]
+            except (requests.RequestException, KeyError, ValueError) as e:
+                msg = "OpenTopoData request failed (%s), using default %s m"
+                logger.warning(msg % (e, self.default))
+        return elevation
+
+    def _load_cache(self):
+        with np.load(self.cache_path) as cache:  # type: ignore
+            keys = zip(cache["lon"].tolist(), cache["lat"].tolist())
+            self._cache = dict(zip(keys, cache["elevation"].tolist()))
+
+    def save(self):
+        """Write the memo cache to cache_path"""
+        if self.cache_path is None or not self._cache_dirty or not self._cache:
+            return
+        lon, lat = (np.array(v) for v in zip(*self._cache.keys()))
+        tmp_path = self.cache_path + ".tmp.npz"
+        np.savez(
+            tmp_path, lon=lon, lat=lat, elevation=np.array(list(self._cache.values()))
+        )
+        os.replace(tmp_path, self.cache_path)
+        self._cache_dirty = False
+
+
+@lru_cache(maxsize=1)
+def default_elevation_provider() -> ElevationProvider:
+    """Provider shared by the model adapters
+
+    The DEM and cache file are read from the PYCROPMODELS_DEM and
+    PYCROPMODELS_ELEVATION_CACHE environment variables.
+    """
+    return ElevationProvider(
+        dem_path=os.environ.get("PYCROPMODELS_DEM"),
+        cache_path=os.environ.get("PYCROPMODELS_ELEVATION_CACHE"),
+    )
@@ -8,20 +8,36 @@ import xarray as xr
 import math
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 import fsspec
 import xarray as xr
 import rioxarray
 import geopandas as gpd
 import requests
+import shapely
+from shapely.geometry import box
 
 from typing import Union
 import datetime as dt
 
 from pcse.base import WeatherDataProvider, WeatherDataContainer
-from pcse.util import ea_from_tdew, reference_ET, check_angstromAB
+from pcse.util import check_angstromAB
 from pcse.exceptions import PCSEError
 
+from pyCropModels.weather.evapotranspiration import (
+    reference_ET,
+    check_reference_ET,
+    estimate_angstrom_ab,
+    reference_et_cube,
+)
+from pyCropModels.weather.power_conversion import power_cube_to_pcse, solar_on_grid
+from pyCropModels.utils.elevation import ElevationProvider, default_elevation_provider
+from pyCropModels.weather.extract import PointExtractor
+from pyCropModels.weather.cell_weather import CellWeather
+from pyCropModels.weather.power_cache import NasaPowerCache, select_bbox
+from pyCropModels.weather.loading import load_concurrently
+
 # TO-DO: move logging level settings to settings.py
 import logging
 
@@ -34,9 +50,34 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+POWER_STORE_URL = "https://power-analysis-ready-datastore.s3.amazonaws.com"
+
+
 class AwsNasaPower:
-    def __init__(self, gdf: gpd.GeoDataFrame):
+    """Download AWS NASA POWER products for a region
+
+    Args:
+        gdf (gpd.GeoDataFrame): region of interest
+        store_url (str, optional): fsspec URL of the directory holding the
+            zarr products, e.g. a local "file://" mirror for offline use
+        cache_dir (str, optional): directory of the local zarr cache, see
+            NasaPowerCache. If None, products are read remotely on every call.
+    """
+
+    def __init__(
+        self,
+        gdf: gpd.GeoDataFrame,
+        store_url: str = POWER_STORE_URL,
+        cache_dir: Union[str, None] = None,
+    ):
         self.gdf = gdf
+        self.store_url = store_url.rstrip("/")
+        self.cache = None
+        if cache_dir is not None:
+            self.cache = NasaPowerCache(
+                cache_dir=cache_dir, open_product=self.aws_nasapower
+            )
+        self.download_stats = {}
         self.solar_variables = ["ALLSKY_SFC_SW_DWN", "TOA_SW_DWN"]
 
         self.weather_variables = [
@@ -52,24 +93,176 @@ class AwsNasaPower:
         self.solar_product = "power_901_daily_radiation_lst.zarr"
 
     def download(
-        self, time_start: str = "2022-01-01", time_end: str = "2022-12-31"
+        self,
+        time_start: str = "2022-01-01",
+        time_end: str = "2022-12-31",
+        concurrent: bool = False,
+        max_workers: int = 8,
+        gdf: Union[gpd.GeoDataFrame, None] = None,
     ) -> dict:
+        """download
 
-        solar = self.proccess_nasa_dataset(
-            gdf=self.gdf,
-            product=self.solar_product,
-            variables=self.solar_variables,
-            time_start=time_start,
-            time_end=time_end,
+        Load the meteorology and radiation products for the region
+
+        Args:
+            time_start (str, optional): first day
+            time_end (str, optional): last day
+            concurrent (bool, optional): fetch both products at the same time
+                and read their zarr chunks in parallel
+            max_workers (int, optional): maximum number of concurrent chunk
+                reads, shared by the two products
+            gdf (gpd.GeoDataFrame, optional): region to load, defaults to
+                the region of the instance
+
+        Returns:
+            dict: {"meteo": xr.Dataset, "solar": xr.Dataset}
+        """
+        gdf = self.gdf if gdf is None else gdf
+        # the ~1 degree radiation cells are not clipped by the region, a
+        # cell near its border takes the radiation of the nearest of them
+        products = {
+            "solar": (self.solar_product, self.solar_variables, False),
+            "meteo": (self.meteo_product, self.weather_variables, True),
+        }
+        start = time.perf_counter()
+        if not concurrent:
+            result = {
+                name: self.proccess_nasa_dataset(
+                    gdf=gdf,
+                    product=product,
+                    variables=variables,
+                    time_start=time_start,
+                    time_end=time_end,
+                    clip=clip,
+                )
+                for name, (product, variables, clip) in products.items()
+            }
+        else:
+            chunk_workers = max(1, max_workers // len(products))
+            with ThreadPoolExecutor(max_workers=len(products)) as executor:
+                futures = {
+                    name: executor.submit(
+                        self.proccess_nasa_dataset,
+                        gdf=gdf,
+                        product=product,
+                        variables=variables,
+                        time_start=time_start,
+                        time_end=time_end,
+                        max_workers=chunk_workers,
+                        clip=clip,
+                    )
+                    for name, (product, variables, clip) in products.items()
+                }
+                result = {name: future.result() for name, future in futures.items()}
+        seconds = time.perf_counter() - start
+        stats = [self.download_stats[product] for product, _, _ in products.values()]
+        nbytes = sum(product_stats["decoded_bytes"] for product_stats in stats)
+        blocks = sum(product_stats["blocks"] for product_stats in stats)
+        msg = "Downloaded %.1f MB (decoded) in %i blocks, %.1f s (%.1f MB/s)" % (
+            nbytes / 1e6,
+            blocks,
+            seconds,
+            nbytes / 1e6 / seconds if seconds > 0 else float("inf"),
         )
-        meteo = self.proccess_nasa_dataset(
-            gdf=self.gdf,
-            product=self.meteo_product,
-            variables=self.weather_variables,
+        logger.info(msg)
+        return result
+
+    def tiles(
+        self,
+        time_start: str = "2022-01-01",
+        time_end: str = "2022-12-31",
+        memory_budget_mb: float = 1024.0,
+    ) -> gpd.GeoDataFrame:
+        """tiles
+
+        Split the region into tiles whose weather fits the memory budget
+
+        Tile edges run halfway between grid cells, so every cell of the
+        region belongs to exactly one tile. The budget covers both products
+        and the unclipped copy held while a tile is clipped.
+
+        Args:
+            time_start (str, optional): first day
+            time_end (str, optional): last day
+            memory_budget_mb (float, optional): peak weather memory per tile
+
+        Returns:
+            gpd.GeoDataFrame: region geometry clipped per tile, empty tiles
+                dropped
+        """
+        meteo = self.aws_nasapower(self.meteo_product)[self.weather_variables]
+        solar = self.aws_nasapower(self.solar_product)[self.solar_variables]
+        grid = select_bbox(meteo, tuple(self.gdf.total_bounds))
+        lat, lon = np.sort(grid.lat.values), grid.lon.values
+        dlat = float(np.abs(np.diff(meteo.lat.values[:2])).max())
+        dlon = float(np.abs(np.diff(meteo.lon.values[:2])).max())
+
+        n_days = len(pd.date_range(time_start, time_end, freq="D"))
+        itemsize = sum(v.dtype.itemsize for v in meteo.data_vars.values()) + sum(
+            v.dtype.itemsize for v in solar.data_vars.values()
+        )
+        cell_bytes = 2 * n_days * itemsize
+        side = max(1, int(math.sqrt(memory_budget_mb * 1e6 / cell_bytes)))
+
+        region = self.gdf.set_crs("EPSG:4326", allow_override=True)  # type: ignore
+        tiles = []
+        for i in range(0, len(lat), side):
+            for j in range(0, len(lon), side):
+                tile = box(
+                    lon[j] - dlon / 2,
+                    lat[i] - dlat / 2,
+                    lon[min(j + side, len(lon)) - 1] + dlon / 2,
+                    lat[min(i + side, len(lat)) - 1] + dlat / 2,
+                )
+                clipped = gpd.clip(region, tile)
+                if clipped.empty:
+                    continue
+                geometry = clipped.geometry.union_all()
+                # skip slivers of the region without any cell centre
+                lon_grid, lat_grid = np.meshgrid(lon[j : j + side], lat[i : i + side])
+                if shapely.contains_xy(geometry, lon_grid, lat_grid).any():
+                    tiles.append(geometry)
+        msg = "Region split into %i tiles of up to %ix%i cells" % (
+            len(tiles),
+            side,
+            side,
+        )
+        logger.info(msg)
+        return gpd.GeoDataFrame(geometry=tiles, crs="EPSG:4326")
+
+    def iter_tiles(
+        self,
+        time_start: str = "2022-01-01",
+        time_end: str = "2022-12-31",
+        memory_budget_mb: float = 1024.0,
+        **kwargs,
+    ):
+        """iter_tiles
+
+        Load the weather of the region one tile at a time
+
+        Args:
+            time_start (str, optional): first day
+            time_end (str, optional): last day
+            memory_budget_mb (float, optional): peak weather memory per tile
+            **kwargs: passed to download(), e.g. concurrent=True
+
+        Yields:
+            tuple: (tile gpd.GeoDataFrame, weather dict of the tile)
+        """
+        tiles = self.tiles(
             time_start=time_start,
             time_end=time_end,
+            memory_budget_mb=memory_budget_mb,
         )
-        return {"meteo": meteo, "solar": solar}
+        for i in range(len(tiles)):
+            tile = tiles.iloc[[i]]
+            msg = "Tile %i/%i: %s" % (i + 1, len(tiles), tile.total_bounds)
+            logger.info(msg)
+            weather = self.download(
+                time_start=time_start, time_end=time_end, gdf=tile, **kwargs
+            )
+            yield tile, weather
 
     def clip_netCDF_by_region(self, ds: xr.Dataset, gdf: gpd.GeoDataFrame):
         """clip_netCDF_by_region _summary_
@@ -99,7 +292,7 @@ class AwsNasaPower:
         Returns:
             xr.Dataset: product dataset
         """
-        filepath = f"https://power-analysis-ready-datastore.s3.amazonaws.com/{product}"
+        filepath = f"{self.store_url}/{product}"
         filepath_mapped = fsspec.get_mapper(filepath)
         ds = xr.open_zarr(store=filepath_mapped, consolidated=True)
         return ds
@@ -111,16 +304,48 @@ class AwsNasaPower:
         variables: list,
         time_start: str = "2022-01-01",
         time_end: str = "2022-12-31",
+        max_workers: int = 1,
+        clip: bool = True,
     ):
+        """Load a product for the bbox of gdf and the time window
 
+        Args:
+            clip (bool, optional): mask the cells outside of the gdf
+                geometry, otherwise keep the bbox padded by one cell
+        """
         msg = f"Start loading:{product}"
         logger.info(msg)
-        ds = self.aws_nasapower(product)
-        ds = ds[variables]
-        region_ds = self.clip_netCDF_by_region(ds=ds, gdf=gdf)
-        region_ds = region_ds.sel(time=slice(time_start, time_end))
-        region_ds.load()
-        msg = f"Downloaded: {product}"
+        if self.cache is not None:
+            ds = self.cache.get(
+                product=product,
+                variables=variables,
+                bbox=tuple(gdf.total_bounds),
+                time_start=time_start,
+                time_end=time_end,
+                max_workers=max_workers,
+            )
+            region_ds = self.clip_netCDF_by_region(ds=ds, gdf=gdf) if clip else ds
+            region_ds.load()
+            # reads of the remote store, none if the cache had the window
+            stats = dict(self.cache.read_stats[product])
+        else:
+            # slice the bbox before masking, so only the region is read, the
+            # bbox chunks are read in parallel and clipped in memory
+            ds = self.aws_nasapower(product)
+            ds = select_bbox(ds[variables], tuple(gdf.total_bounds))
+            ds = ds.sel(time=slice(time_start, time_end))
+            ds, stats = load_concurrently(ds, max_workers=max_workers)
+            region_ds = self.clip_netCDF_by_region(ds=ds, gdf=gdf) if clip else ds
+        # decoded bytes and blocks read from the remote store, the clipped region
+        # kept in memory is usually smaller than the bbox chunks read
+        stats["region_bytes"] = region_ds.nbytes
+        self.download_stats[product] = stats
+        msg = "Downloaded: %s, %.1f MB (decoded) in %i blocks, %.1f s" % (
+            product,
+            stats["decoded_bytes"] / 1e6,
+            stats["blocks"],
+            stats["seconds"],
+        )
         logger.info(msg)
 
         return region_ds
@@ -133,32 +358,22 @@ class Aws_Wofost(WeatherDataProvider):
     :param longitude: longitude to request weather data for
     :keyword ETmodel: "PM"|"P" for selecting penman-monteith or Penman
         method for reference evapotranspiration. Defaults to "PM".
+    :keyword ds_et: output of weather_reference_et for ds_weather, the E0,
+        ES0 and ET0 (cm/day), the Angstrom A/B and the elevation of the
+        cell are then sliced from it instead of computed for the point.
+    :keyword elevation_provider: ElevationProvider used for the site
+        elevation, defaults to the shared default_elevation_provider()
+    :keyword cell_weather: CellWeather of the point, e.g. from a
+        CellWeatherCache shared with other models. Extracted from
+        ds_weather/ds_solar if not given.
 
     TO-DO: check while init class if xr.Dataset loaded into memory or not
 
     """
 
-    power_variables = [
-        "TOA_SW_DWN",
-        "ALLSKY_SFC_SW_DWN",
-        "T2M",
-        "T2M_MIN",
-        "T2M_MAX",
-        "T2MDEW",
-        "WS2M",
-        "PRECTOTCORR",
-    ]
     angstA = 0.29
     angstB = 0.49
 
-    MJ_to_J = lambda x: x * 1e6
-    mm_to_cm = lambda x: x / 10.0
-    tdew_to_hpa = lambda x: ea_from_tdew(x) * 10.0
-    to_date = lambda d: d.date()
-    watt_to_joules = lambda x: x * 86400
-    kg_m2_to_mm = lambda x: x * 86400
-    K_to_C = lambda x: x - 273.15
-
     def __init__(
         self,
         latitude: float,
@@ -166,8 +381,10 @@ class Aws_Wofost(WeatherDataProvider):
         ds_weather: xr.Dataset,
         ds_solar: xr.Dataset,
         ETmodel: str = "PM",
+        ds_et: Union[xr.Dataset, None] = None,
+        elevation_provider: Union[ElevationProvider, None] = None,
+        cell_weather: Union[CellWeather, None] = None,
     ):
-
         WeatherDataProvider.__init__(self)
 
         if latitude < -90 or latitude > 90:
@@ -177,76 +394,78 @@ class Aws_Wofost(WeatherDataProvider):
             msg = "Longitude should be between -180 and 180 degrees."
             raise ValueError(msg)
 
-        self.solar_variables = ["ALLSKY_SFC_SW_DWN", "TOA_SW_DWN"]
-        self.MJ_to_J = lambda x: x * 1e6
-        self.mm_to_cm = lambda x: x / 10.0
-        self.tdew_to_hpa = lambda x: ea_from_tdew(x) * 10.0
-        self.to_date = lambda d: d.date()
-        self.watt_to_joules = lambda x: x * 86400
-        self.kg_m2_to_mm = lambda x: x * 86400
-        self.K_to_C = lambda x: x - 273.15
-        self.power_meteo_variables = [
-            "T2M",
-            "T2M_MIN",
-            "T2M_MAX",
-            "T2MDEW",
-            "WS2M",
-            "PRECTOTCORR",
-            "RH2M",
-        ]
         self.ds_weather = ds_weather
         self.ds_solar = ds_solar
+        self.extractor = PointExtractor(ds_weather=ds_weather, ds_solar=ds_solar)
         self.latitude = float(latitude)
         self.longitude = float(longitude)
         self.ETmodel = ETmodel
+        self.ds_et = ds_et
+        self.elevation_provider = elevation_provider or default_elevation_provider()
+        self.cell_weather = cell_weather
         self.logger.debug("Start loading")
         self._get_and_process_NASAPower(self.latitude, self.longitude)
 
     def select_from_xarray(self, longitude: float, latitude: float):
-        point_weather = self.ds_weather.sel(
-            lon=longitude, lat=latitude, method="nearest"
-        )
-        point_solar = self.ds_solar.sel(lon=longitude, lat=latitude, method="nearest")
-        df_power = self.xr_dataset_to_pandas(ds=point_weather)
-
-        df_solar = self.xr_dataset_to_pandas(ds=point_solar)
-
-        df_power["DAY"] = pd.to_datetime(point_weather.time.values, format="%Y%m%d")
+        values, _ = self.extractor.extract(longitude=[longitude], latitude=[latitude])
+        return self.extractor.to_frame(values[0])
 
-        df_solar = (
-            df_solar.apply(self.watt_to_joules) / 1e6
-        )  # Convert to MJ for A,B computing
-
-        df_power = pd.concat([df_power, df_solar], axis=1)
-        return df_power
-
-    def xr_dataset_to_pandas(self, ds: xr.Dataset) -> pd.DataFrame:
-        """Convert xarray point to pandas -> faster than implimented"""
-        dict_to_pandas = {}
-        for key in list(ds.keys()):
-            dict_to_pandas[key] = ds[key].values
-        return pd.DataFrame(dict_to_pandas)
+    def get_cell_weather(self, longitude: float, latitude: float) -> CellWeather:
+        """Canonical weather of the point"""
+        if self.cell_weather is not None:
+            return self.cell_weather
+        df_power = self.select_from_xarray(longitude=longitude, latitude=latitude)
+        return CellWeather.from_power(
+            df_power, day=df_power.DAY.values, latitude=latitude, longitude=longitude
+        )
 
     def _get_and_process_NASAPower(self, latitude: float, longitude: float):
         """Handles the retrieval and processing of the NASA Power data"""
 
-        df_power = self.select_from_xarray(longitude=longitude, latitude=latitude)
+        weather = self.get_cell_weather(longitude=longitude, latitude=latitude)
 
         # Store the informational header then parse variables
         self.description = "NASA POWER AWS S3"
-        self.elevation = float(
-            self._get_elevation(longitude=longitude, latitude=latitude)
-        )
-        self.df_power = df_power
-
-        # Determine Angstrom A/B parameters
-        self.angstA, self.angstB = self._estimate_AngstAB(df_power)
+        self.df_power = weather.frame()
+        if self.ds_et is not None:
+            # one source of the site parameters for the ET and the provider
+            self.cell_et = self._select_cell_et(longitude=longitude, latitude=latitude)
+            self.elevation = float(self.cell_et.ELEV)
+            self.angstA = float(self.cell_et.ANGSTA)
+            self.angstB = float(self.cell_et.ANGSTB)
+        else:
+            self.elevation = float(
+                self._get_elevation(longitude=longitude, latitude=latitude)
+            )
+            # Determine Angstrom A/B parameters
+            self.angstA, self.angstB = self._estimate_AngstAB(
+                pd.DataFrame(
+                    {"ALLSKY_SFC_SW_DWN": weather.RAD, "TOA_SW_DWN": weather.TOA}
+                )
+            )
 
         # Convert power records to PCSE compatible structure
-        df_pcse = self._POWER_to_PCSE(df_power)
+        df_pcse = self._POWER_to_PCSE(weather)
         self.df_pcse = df_pcse
         # Start building the weather data containers
-        self._make_WeatherDataContainers(df_pcse.to_dict(orient="records"))
+        self._make_WeatherDataContainers(df_pcse)
+
+    def _select_cell_et(self, longitude: float, latitude: float) -> xr.Dataset:
+        """Cell of the point in ds_et, which must share the grid and days
+        of ds_weather"""
+        for coord in ["lat", "lon", "time"]:
+            if not np.array_equal(
+                self.ds_et[coord].values, self.ds_weather[coord].values
+            ):
+                msg = (
+                    "ds_et is not on the %s of ds_weather, see weather_reference_et"
+                    % (coord)
+                )
+                raise ValueError(msg)
+        lat_idx, lon_idx = self.extractor.cell_index(
+            self.ds_weather, [longitude], [latitude]
+        )
+        return self.ds_et.isel(lat=int(lat_idx[0]), lon=int(lon_idx[0]))
 
     def _estimate_AngstAB(self, df_power: pd.DataFrame):
         """Determine Angstrom A/B parameters from Top-of-Atmosphere (ALLSKY_TOA_SW_DWN) and
@@ -300,7 +519,7 @@ class Aws_Wofost(WeatherDataProvider):
 
     def _get_elevation(self, longitude: float, latitude: float) -> float:
         """_get_elevation
-        Get elevation from OpenTopoData API by lon and lat
+        Get elevation of the point from the elevation provider
 
         Args:
             longitude (float): longitude in WGS84
@@ -309,77 +528,100 @@ class Aws_Wofost(WeatherDataProvider):
         Returns:
             float: elevation (m)
         """
-        url = (
-            f"https://api.opentopodata.org/v1/aster30m?locations={latitude},{longitude}"
-        )
-        resp = requests.get(url=url, timeout=10)
-        if resp.status_code == 200:
-            data = resp.json()
-            elevation = data["results"][0]["elevation"]
-        else:
-            elevation = 200
-        return elevation
-
-    def _make_WeatherDataContainers(self, recs):
-        """Create a WeatherDataContainers from recs, compute ET and store the WDC's."""
-
-        for rec in recs:
-            # Reference evapotranspiration in mm/day
-            try:
-                E0, ES0, ET0 = reference_ET(
-                    rec["DAY"],
-                    rec["LAT"],
-                    rec["ELEV"],
-                    rec["TMIN"],
-                    rec["TMAX"],
-                    rec["IRRAD"],
-                    rec["VAP"],
-                    rec["WIND"],
-                    self.angstA,
-                    self.angstB,
-                    self.ETmodel,
-                )
-            except ValueError as e:
-                msg = (
-                    ("Failed to calculate reference ET values on %s. " % rec["DAY"])
-                    + ("With input values:\n %s.\n" % str(rec))
-                    + ("Due to error: %s" % e)
-                )
-                raise PCSEError(msg)
+        return self.elevation_provider(longitude=longitude, latitude=latitude)
 
-            # update record with ET values value convert to cm/day
-            rec.update({"E0": E0 / 10.0, "ES0": ES0 / 10.0, "ET0": ET0 / 10.0})
+    def _make_WeatherDataContainers(self, df_pcse: pd.DataFrame):
+        """Create a WeatherDataContainers from df_pcse, compute ET and store the WDC's."""
 
+        # Reference evapotranspiration in cm/day for all days at once
+        if self.ds_et is not None:
+            point_et = self.cell_et.sel(
+                time=df_pcse.DAY.values.astype("datetime64[ns]")
+            )
+            E0, ES0, ET0 = (point_et[v].values for v in ["E0", "ES0", "ET0"])
+        else:
+            E0, ES0, ET0 = reference_ET(
+                DAY=df_pcse.DAY.values,
+                LAT=self.latitude,
+                ELEV=self.elevation,
+                TMIN=df_pcse.TMIN.values,
+                TMAX=df_pcse.TMAX.values,
+                IRRAD=df_pcse.IRRAD.values,
+                VAP=df_pcse.VAP.values,
+                WIND=df_pcse.WIND.values,
+                ANGSTA=self.angstA,
+                ANGSTB=self.angstB,
+                ETMODEL=self.ETmodel,
+            )
+            E0, ES0, ET0 = E0 / 10.0, ES0 / 10.0, ET0 / 10.0
+        check_reference_ET(E0, ES0, ET0, days=df_pcse.DAY.values)
+
+        df_pcse = df_pcse.assign(E0=E0, ES0=ES0, ET0=ET0)
+        for rec in df_pcse.to_dict(orient="records"):
             # Build weather data container from dict 't'
             wdc = WeatherDataContainer(**rec)
 
             # add wdc to dictionary for thisdate
             self._store_WeatherDataContainer(wdc, wdc.DAY)
 
-    def _POWER_to_PCSE(self, df_power):
-        # find all rows with one or more missing values (NaN)
-        df_power = df_power.ffill()
-        ix = df_power.isnull().any(axis=1)
-        # Get all rows without missing values
-        df_power = df_power[~ix]
-
-        # Convert POWER data to a dataframe with PCSE compatible inputs
-        df_pcse = pd.DataFrame(
-            {
-                "TMAX": df_power.T2M_MAX.apply(self.K_to_C),
-                "TMIN": df_power.T2M_MIN.apply(self.K_to_C),
-                "TEMP": df_power.T2M.apply(self.K_to_C),
-                "IRRAD": df_power.ALLSKY_SFC_SW_DWN.apply(self.MJ_to_J),
-                "RAIN": df_power.PRECTOTCORR.apply(self.kg_m2_to_mm).apply(
-                    self.mm_to_cm
-                ),
-                "WIND": df_power.WS2M,
-                "VAP": df_power.T2MDEW.apply(self.K_to_C).apply(self.tdew_to_hpa),
-                "DAY": df_power.DAY.apply(self.to_date),
-                "LAT": self.latitude,
-                "LON": self.longitude,
-                "ELEV": self.elevation,
-            }
-        )
+    def _POWER_to_PCSE(self, weather: CellWeather):
+        # forward fill gaps and drop the days still missing a value
+        df_pcse = weather.complete().to_pcse()
+        df_pcse["LAT"] = self.latitude
+        df_pcse["LON"] = self.longitude
+        df_pcse["ELEV"] = self.elevation
 
         return df_pcse
+
+
+def weather_reference_et(
+    weather: dict,
+    ETmodel: str = "PM",
+    elevation_provider: Union[ElevationProvider, None] = None,
+) -> xr.Dataset:
+    """Reference ET of every cell of a download, for Aws_Wofost(ds_et=...)
+
+    The ET of all cells and days is computed in one pass with
+    reference_et_cube, with the Angstrom A/B of every cell estimated from
+    its radiation as Aws_Wofost does for a point.
+
+    Args:
+        weather (dict): dict returned by AwsNasaPower.download()
+        ETmodel (str, optional): "PM" or "P"
+        elevation_provider (ElevationProvider, optional): defaults to the
+            shared default_elevation_provider()
+
+    Returns:
+        xr.Dataset: E0, ES0 and ET0 (cm/day) on the (time, lat, lon) grid of
+            the meteorology, ANGSTA, ANGSTB and ELEV (m) on (lat, lon)
+    """
+    meteo = weather["meteo"]
+    solar = solar_on_grid(meteo, weather["solar"])
+    angstA, angstB = estimate_angstrom_ab(
+        solar.ALLSKY_SFC_SW_DWN,
+        solar.TOA_SW_DWN,
+        default=(Aws_Wofost.angstA, Aws_Wofost.angstB),
+    )
+    provider = elevation_provider or default_elevation_provider()
+    lon_grid, lat_grid = np.meshgrid(meteo.lon.values, meteo.lat.values)
+    elevation = xr.DataArray(
+        provider.lookup(lon_grid.ravel(), lat_grid.ravel()).reshape(lon_grid.shape),
+        dims=("lat", "lon"),
+        coords={"lat": meteo.lat.values, "lon": meteo.lon.values},
+    )
+    ds_et = reference_et_cube(
+        power_cube_to_pcse(meteo, weather["solar"]),
+        elevation=elevation,
+        angstA=angstA,
+        angstB=angstB,
+        ETmodel=ETmodel,
+    )
+    return ds_et.assign(ANGSTA=angstA, ANGSTB=angstB, ELEV=elevation)
+
+
+def shared_reference_et(weather: dict) -> xr.Dataset:
+    """weather_reference_et of a download, computed once and kept in
+    weather["et"] for all models built on the same weather"""
+    if "et" not in weather:
+        weather["et"] = weather_reference_et(weather)
+    return weather["et"]
@@ -0,0 +1,299 @@
+"""
+Canonical daily weather of a grid cell
+
+NASA POWER variables of a cell are converted once to one set of units
+(CellWeather). The inputs of WOFOST (PCSE), DSSAT and MONICA are projections
+of it: renamed columns, a few scaled by a constant. A CellWeatherCache shared
+by several models extracts and converts every cell only once.
+"""
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from pyCropModels.weather.extract import PointExtractor
+from pyCropModels.weather.power_conversion import (
+    K_to_C,
+    ea_from_tdew,
+    ffill,
+    to_date,
+)
+
+# canonical variables, their units and the POWER variable they come from
+UNITS = {
+    "TMIN": "C",
+    "TMAX": "C",
+    "TEMP": "C",
+    "TDEW": "C",
+    "RAD": "MJ/m2/day",
+    "TOA": "MJ/m2/day",
+    "WIND": "m/s",
+    "RAIN": "mm/day",
+    "RHUM": "%",
+}
+POWER_NAMES = {
+    "TMIN": "T2M_MIN",
+    "TMAX": "T2M_MAX",
+    "TEMP": "T2M",
+    "TDEW": "T2MDEW",
+    "RAD": "ALLSKY_SFC_SW_DWN",
+    "TOA": "TOA_SW_DWN",
+    "WIND": "WS2M",
+    "RAIN": "PRECTOTCORR",
+    "RHUM": "RH2M",
+}
+
+
+class CellWeather:
+    """Daily weather of one cell in the canonical UNITS
+
+    Args:
+        day (np.ndarray): days, datetime64[D]
+        latitude (float): latitude of the cell
+        longitude (float): longitude of the cell
+        **variables: arrays of the UNITS variables, missing ones are NaN
+    """
+
+    def __init__(self, day, latitude: float, longitude: float, **variables) -> None:
+        self.day = np.asarray(day, dtype="datetime64[D]")
+        self.latitude = float(latitude)
+        self.longitude = float(longitude)
+        self.variables = {}
+        for name in UNITS:
+            values = variables.get(name)
+            if values is None:
+                values = np.full(len(self.day), np.nan)
+            self.variables[name] = np.asarray(values, dtype=float)
+
+    def __getattr__(self, name: str) -> np.ndarray:
+        variables = self.__dict__.get("variables", {})
+        if name in variables:
+            return variables[name]
+        raise AttributeError(name)
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    @classmethod
+    def from_power(cls, power, day, latitude: float, longitude: float):
+        """Cell weather from AWS NASA POWER values
+
+        Args:
+            power: mapping of POWER variables in the AWS units, K and
+                kg/m2/s, solar variables in MJ/m2/day
+            day: days of the values
+            latitude (float): latitude of the cell
+            longitude (float): longitude of the cell
+        """
+        variables = {
+            name: np.asarray(power[power_name], dtype=float)
+            for name, power_name in POWER_NAMES.items()
+            if power_name in power
+        }
+        for name in ["TMIN", "TMAX", "TEMP", "TDEW"]:
+            if name in variables:
+                variables[name] = K_to_C(variables[name])
+        if "RAIN" in variables:
+            variables["RAIN"] = variables["RAIN"] * 86400  # kg/m2/s -> mm/day
+        return cls(day, latitude=latitude, longitude=longitude, **variables)
+
+    @classmethod
+    def from_power_json(cls, powerdata: dict, latitude: float, longitude: float):
+        """Cell weather from a NASA POWER daily point API response
+
+        The API returns C, MJ/m2/day, m/s, mm/day and %, the canonical
+        units. Fill values become NaN.
+        """
+        fill_value = float(powerdata["header"]["fill_value"])
+        parameters = powerdata["properties"]["parameter"]
+        days = sorted(next(iter(parameters.values())))
+        variables = {}
+        for name, power_name in POWER_NAMES.items():
+            if power_name in parameters:
+                values = np.array(
+                    [parameters[power_name][d] for d in days], dtype=float
+                )
+                values[values == fill_value] = np.nan
+                variables[name] = values
+        day = pd.to_datetime(days, format="%Y%m%d").values
+        return cls(day, latitude=latitude, longitude=longitude, **variables)
+
+    def select(self, mask: np.ndarray) -> "CellWeather":
+        """Weather of the days where mask is True"""
+        return CellWeather(
+            self.day[mask],
+            latitude=self.latitude,
+            longitude=self.longitude,
+            **{name: values[mask] for name, values in self.variables.items()},
+        )
+
+    def complete(self, fill: bool = True) -> "CellWeather":
+        """Weather of the days without missing values
+
+        Args:
+            fill (bool, optional): forward fill gaps first, so only days
+                before the first value of a variable are dropped
+        """
+        variables = self.variables
+        if fill:
+            variables = {name: ffill(values) for name, values in variables.items()}
+        weather = CellWeather(
+            self.day, latitude=self.latitude, longitude=self.longitude, **variables
+        )
+        present = [v for v in variables.values() if not np.isnan(v).all()]
+        mask = ~np.isnan(np.stack(present)).any(axis=0) if present else None
+        return weather if mask is None or mask.all() else weather.select(mask)
+
+    def frame(self) -> pd.DataFrame:
+        """Canonical variables with a DAY column"""
+        return pd.DataFrame({"DAY": self.day, **self.variables})
+
+    def to_pcse(self) -> pd.DataFrame:
+        """PCSE weather: DAY (date), TMAX, TMIN, TEMP (C), IRRAD (J/m2/day),
+        RAIN (cm/day), WIND (m/s) and VAP (hPa)"""
+        return pd.DataFrame(
+            {
+                "TMAX": self.TMAX,
+                "TMIN": self.TMIN,
+                "TEMP": self.TEMP,
+                "IRRAD": self.RAD * 1e6,
+                "RAIN": self.RAIN / 10.0,
+                "WIND": self.WIND,
+                "VAP": ea_from_tdew(self.TDEW) * 10.0,
+                "DAY": to_date(self.day),
+            }
+        )
+
+    def to_dssat(self) -> pd.DataFrame:
+        """DSSAT weather: DATE, TMEAN, TMIN, TMAX, DEWP (C), WIND (km/day),
+        RAD (MJ/m2/day), RAIN (mm/day) and RHUM (%)"""
+        return pd.DataFrame(
+            {
+                "DATE": pd.to_datetime(self.day),
+                "TMEAN": self.TEMP,
+                "TMIN": self.TMIN,
+                "TMAX": self.TMAX,
+                "WIND": self.WIND * 86.4,
+                "RAD": self.RAD,
+                "RAIN": self.RAIN,
+                "DEWP": self.TDEW,
+                "RHUM": self.RHUM,
+            }
+        )
+
+    def to_monica(self) -> pd.DataFrame:
+        """MONICA climate.csv columns: de-date ("%d.%m.%Y"), tavg, tmin,
+        tmax (C), wind (m/s), globrad (MJ/m2/day), precip (mm/day) and
+        relhumid (%)"""
+        return pd.DataFrame(
+            {
+                "de-date": pd.to_datetime(self.day).strftime("%d.%m.%Y"),
+                "tavg": self.TEMP,
+                "tmin": self.TMIN,
+                "tmax": self.TMAX,
+                "wind": self.WIND,
+                "globrad": self.RAD,
+                "precip": self.RAIN,
+                "relhumid": self.RHUM,
+            }
+        )
+
+
+class CellWeatherCache:
+    """Size-bounded LRU cache of the CellWeather of AWS NASA POWER cells
+
+    Share one cache between the models of an ensemble, so each cell is
+    extracted and converted once for all of them. The cache is thread-safe,
+    cells are extracted outside of its lock.
+
+    Args:
+        ds_weather (xr.Dataset): meteorology product (time, lat, lon)
+        ds_solar (xr.Dataset): radiation product (time, lat, lon)
+        maxsize (int, optional): maximum number of cached cells
+    """
+
+    def __init__(
+        self, ds_weather: xr.Dataset, ds_solar: xr.Dataset, maxsize: int = 256
+    ) -> None:
+        self.extractor = PointExtractor(ds_weather=ds_weather, ds_solar=ds_solar)
+        self.maxsize = maxsize
+        self._cells = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def serves(self, ds_weather: xr.Dataset, ds_solar: xr.Dataset) -> bool:
+        """True if the cache extracts from these datasets"""
+        return (
+            self.extractor.ds_weather is ds_weather
+            and self.extractor.ds_solar is ds_solar
+        )
+
+    def _extract(self, cell_id: int) -> CellWeather:
+        """Extract and convert the weather of one cell"""
+        lat_idx, lon_idx = divmod(cell_id, len(self.extractor.lon))
+        cell_lat = float(self.extractor.lat[lat_idx])
+        cell_lon = float(self.extractor.lon[lon_idx])
+        values, _ = self.extractor.extract(longitude=[cell_lon], latitude=[cell_lat])
+        df_power = self.extractor.to_frame(values[0])
+        return CellWeather.from_power(
+            df_power, day=df_power.DAY.values, latitude=cell_lat, longitude=cell_lon
+        )
+
+    def get(self, lon: float, lat: float) -> CellWeather:
+        """Weather of the grid cell of (lon, lat)
+
+        The lock only guards the cache dict, a cell is extracted outside of
+        it. Requests of a cell that is being extracted wait for its future
+        instead of extracting it again.
+        """
+        cell_id = int(self.extractor.cell_id([lon], [lat])[0])
+        with self._lock:
+            future = self._cells.get(cell_id)
+            hit = future is not None
+            if hit:
+                self.hits += 1
+                self._cells.move_to_end(cell_id)
+            else:
+                self.misses += 1
+                future = self._cells[cell_id] = Future()
+                if len(self._cells) > self.maxsize:
+                    self._cells.popitem(last=False)
+        if hit:
+            return future.result()
+        try:
+            weather = self._extract(cell_id)
+        except BaseException as e:
+            with self._lock:
+                if self._cells.get(cell_id) is future:
+                    del self._cells[cell_id]
+            future.set_exception(e)
+            raise
+        future.set_result(weather)
+        return weather
+
+    def stats(self) -> dict:
+        """Hit/miss statistics of the cache"""
+        calls = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / calls if calls else 0.0,
+            "size": len(self._cells),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self) -> None:
+        """Drop all cells and reset the statistics"""
+        with self._lock:
+            self._cells.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+def shared_cell_weather(weather: dict, maxsize: int = 256) -> CellWeatherCache:
+    """One CellWeatherCache for the dict returned by AwsNasaPower.download()"""
+    return CellWeatherCache(weather["meteo"], weather["solar"], maxsize=maxsize)
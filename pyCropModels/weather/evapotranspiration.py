@@ -0,0 +1,262 @@
+"""
+Vectorized reference evapotranspiration
+
+NumPy ports of pcse.util.astro, penman, penman_monteith and reference_ET.
+Every input may be a scalar, a NumPy array or an xarray DataArray; inputs
+are broadcast against each other, so a whole (time, lat, lon) cube is
+processed in a single pass instead of one reference_ET call per day and point.
+"""
+import numpy as np
+import xarray as xr
+
+from pcse.util import check_angstromAB
+from pcse.exceptions import PCSEError
+
+
+def day_of_year(day) -> np.ndarray:
+    """Day of year (Jan 1st = 1) of an array of dates or datetime64"""
+    days = np.asarray(day, dtype="datetime64[D]")
+    return (days - days.astype("datetime64[Y]")).astype(int) + 1
+
+
+def astro(doy, latitude, radiation):
+    """Vectorized pcse.util.astro, only the outputs needed for ET
+
+    Args:
+        doy: day of year
+        latitude: latitude (degrees)
+        radiation: daily global radiation (J/m2/day)
+
+    Returns:
+        tuple: (ANGOT, ATMTR), Angot radiation at top of atmosphere (J/m2/day)
+            and daily atmospheric transmission (-)
+    """
+    RAD = np.radians(1.0)
+    DEC = -np.arcsin(np.sin(23.45 * RAD) * np.cos(2.0 * np.pi * (doy + 10.0) / 365.0))
+    SC = 1370.0 * (1.0 + 0.033 * np.cos(2.0 * np.pi * doy / 365.0))
+
+    SINLD = np.sin(RAD * latitude) * np.sin(DEC)
+    COSLD = np.cos(RAD * latitude) * np.cos(DEC)
+    AOB = SINLD / COSLD
+
+    # daylength limited to 0 or 24 hours at high latitudes
+    AOB_LIM = np.clip(AOB, -1.0, 1.0)
+    DAYL = 12.0 * (1.0 + 2.0 * np.arcsin(AOB_LIM) / np.pi)
+    DSINB = 3600.0 * (DAYL * SINLD + 24.0 * COSLD * np.sqrt(1.0 - AOB_LIM**2) / np.pi)
+
+    ANGOT = SC * DSINB
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ATMTR = xr.where(DAYL > 0.0, radiation / ANGOT, 0.0)
+    return ANGOT, ATMTR
+
+
+def penman(doy, LAT, ELEV, TMIN, TMAX, AVRAD, VAP, WIND2, ANGSTA, ANGSTB):
+    """Vectorized pcse.util.penman
+
+    Returns:
+        tuple: (E0, ES0, ET0) in mm/day
+    """
+    PSYCON = 0.67
+    REFCFW = 0.05
+    REFCFS = 0.15
+    REFCFC = 0.25
+    LHVAP = 2.45e6
+    STBC = 5.670373e-8 * 24 * 60 * 60
+
+    TMPA = (TMIN + TMAX) / 2.0
+    TDIF = TMAX - TMIN
+    BU = 0.54 + 0.35 * np.clip((TDIF - 12.0) / 4.0, 0.0, 1.0)
+
+    PBAR = 1013.0 * np.exp(-0.034 * ELEV / (TMPA + 273.0))
+    GAMMA = PSYCON * PBAR / 1013.0
+
+    SVAP = 6.10588 * np.exp(17.32491 * TMPA / (TMPA + 238.102))
+    DELTA = 238.102 * 17.32491 * SVAP / (TMPA + 238.102) ** 2
+    VAP = np.minimum(VAP, SVAP)
+
+    _, ATMTR = astro(doy, LAT, AVRAD)
+    RELSSD = np.clip((ATMTR - np.abs(ANGSTA)) / np.abs(ANGSTB), 0.0, 1.0)
+
+    RB = (
+        STBC
+        * (TMPA + 273.0) ** 4
+        * (0.56 - 0.079 * np.sqrt(VAP))
+        * (0.1 + 0.9 * RELSSD)
+    )
+
+    RNW = (AVRAD * (1.0 - REFCFW) - RB) / LHVAP
+    RNS = (AVRAD * (1.0 - REFCFS) - RB) / LHVAP
+    RNC = (AVRAD * (1.0 - REFCFC) - RB) / LHVAP
+
+    EA = 0.26 * np.maximum(0.0, SVAP - VAP) * (0.5 + BU * WIND2)
+    EAC = 0.26 * np.maximum(0.0, SVAP - VAP) * (1.0 + BU * WIND2)
+
+    E0 = (DELTA * RNW + GAMMA * EA) / (DELTA + GAMMA)
+    ES0 = (DELTA * RNS + GAMMA * EA) / (DELTA + GAMMA)
+    ET0 = (DELTA * RNC + GAMMA * EAC) / (DELTA + GAMMA)
+
+    return np.maximum(0.0, E0), np.maximum(0.0, ES0), np.maximum(0.0, ET0)
+
+
+def penman_monteith(doy, LAT, ELEV, TMIN, TMAX, AVRAD, VAP, WIND2):
+    """Vectorized pcse.util.penman_monteith
+
+    Returns:
+        ET0 in mm/day
+    """
+    PSYCON = 0.665
+    REFCFC = 0.23
+    CRES = 70.0
+    LHVAP = 2.45e6
+    STBC = 4.903e-3
+    G = 0.0
+
+    sat_vap = lambda temp: 0.6108 * np.exp((17.27 * temp) / (237.3 + temp))
+
+    TMPA = (TMIN + TMAX) / 2.0
+    VAP = VAP / 10.0
+
+    T = 293.0
+    PATM = 101.3 * ((T - (0.0065 * ELEV)) / T) ** 5.26
+    GAMMA = PSYCON * PATM * 1.0e-3
+
+    DELTA = (4098.0 * sat_vap(TMPA)) / (TMPA + 237.3) ** 2
+    SVAP = (sat_vap(TMAX) + sat_vap(TMIN)) / 2.0
+    VAP = np.minimum(VAP, SVAP)
+
+    STB_TMAX = STBC * (TMAX + 273.16) ** 4
+    STB_TMIN = STBC * (TMIN + 273.16) ** 4
+    RNL_TMP = ((STB_TMAX + STB_TMIN) / 2.0) * (0.34 - 0.14 * np.sqrt(VAP))
+
+    ANGOT, _ = astro(doy, LAT, AVRAD)
+    CSKYRAD = (0.75 + (2e-05 * ELEV)) * ANGOT
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        RNL = RNL_TMP * (1.35 * (AVRAD / CSKYRAD) - 0.35)
+    RN = ((1 - REFCFC) * AVRAD - RNL) / LHVAP
+    EA = (900.0 / (TMPA + 273)) * WIND2 * (SVAP - VAP)
+    MGAMMA = GAMMA * (1.0 + (CRES / 208.0 * WIND2))
+
+    ET0 = (DELTA * (RN - G)) / (DELTA + MGAMMA) + (GAMMA * EA) / (DELTA + MGAMMA)
+    return xr.where(CSKYRAD > 0, np.maximum(0.0, ET0), 0.0)
+
+
+def reference_ET(
+    DAY, LAT, ELEV, TMIN, TMAX, IRRAD, VAP, WIND, ANGSTA, ANGSTB, ETMODEL="PM"
+):
+    """Vectorized pcse.util.reference_ET
+
+    Args:
+        DAY: dates, datetime64 or day of year (int)
+        LAT: latitude (degrees)
+        ELEV: elevation (m)
+        TMIN: minimum temperature (C)
+        TMAX: maximum temperature (C)
+        IRRAD: daily shortwave radiation (J/m2/day)
+        VAP: 24-hour average vapour pressure (hPa)
+        WIND: 24-hour average windspeed at 2 meter (m/s)
+        ANGSTA: Angstrom A
+        ANGSTB: Angstrom B
+        ETMODEL (str): "PM" or "P" for Penman-Monteith or Penman canopy ET0
+
+    Returns:
+        tuple: (E0, ES0, ET0) in mm/day
+    """
+    if ETMODEL not in ["PM", "P"]:
+        msg = "Variable ETMODEL can have values 'PM'|'P' only."
+        raise RuntimeError(msg)
+
+    doy = DAY
+    if not np.issubdtype(np.asarray(DAY).dtype, np.integer):
+        doy = day_of_year(DAY)
+        if isinstance(DAY, xr.DataArray):
+            doy = DAY.copy(data=doy)
+
+    E0, ES0, ET0 = penman(doy, LAT, ELEV, TMIN, TMAX, IRRAD, VAP, WIND, ANGSTA, ANGSTB)
+    if ETMODEL == "PM":
+        ET0 = penman_monteith(doy, LAT, ELEV, TMIN, TMAX, IRRAD, VAP, WIND)
+    return E0, ES0, ET0
+
+
+def estimate_angstrom_ab(
+    sfc_sw_dwn: xr.DataArray,
+    toa_sw_dwn: xr.DataArray,
+    default: tuple = (0.29, 0.49),
+    dim: str = "time",
+):
+    """Angstrom A/B for every cell of the radiation cube
+
+    Same estimate as Aws_Wofost._estimate_AngstAB: 5 and 98 percentiles of
+    the relative radiation, cells with less than 200 days of data or values
+    outside the range accepted by pcse.util.check_angstromAB get the default.
+
+    Returns:
+        tuple: (angstA, angstB) DataArrays without the dim dimension
+    """
+    relative_radiation = sfc_sw_dwn / toa_sw_dwn
+    angstrom_a = relative_radiation.quantile(0.05, dim=dim, skipna=True).drop_vars(
+        "quantile"
+    )
+    angstrom_ab = relative_radiation.quantile(0.98, dim=dim, skipna=True).drop_vars(
+        "quantile"
+    )
+    angstrom_b = angstrom_ab - angstrom_a
+
+    # vectorized check_angstromAB
+    valid = (
+        (relative_radiation.count(dim=dim) >= 200)
+        & (angstrom_a >= 0.1)
+        & (angstrom_a <= 0.4)
+        & (angstrom_b >= 0.3)
+        & (angstrom_b <= 0.7)
+        & (angstrom_ab >= 0.6)
+        & (angstrom_ab <= 0.9)
+    )
+    check_angstromAB(*default)
+    return angstrom_a.where(valid, default[0]), angstrom_b.where(valid, default[1])
+
+
+def reference_et_cube(
+    ds_pcse: xr.Dataset,
+    elevation,
+    angstA,
+    angstB,
+    ETmodel: str = "PM",
+) -> xr.Dataset:
+    """E0, ES0 and ET0 for a whole PCSE weather cube
+
+    Args:
+        ds_pcse (xr.Dataset): output of power_cube_to_pcse, (time, lat, lon)
+        elevation: elevation (m), scalar or DataArray on (lat, lon)
+        angstA: Angstrom A, scalar or DataArray on (lat, lon)
+        angstB: Angstrom B, scalar or DataArray on (lat, lon)
+        ETmodel (str): "PM" or "P"
+
+    Returns:
+        xr.Dataset: E0, ES0 and ET0 in cm/day on the cube grid
+    """
+    E0, ES0, ET0 = reference_ET(
+        DAY=ds_pcse.time,
+        LAT=ds_pcse.lat,
+        ELEV=elevation,
+        TMIN=ds_pcse.TMIN,
+        TMAX=ds_pcse.TMAX,
+        IRRAD=ds_pcse.IRRAD,
+        VAP=ds_pcse.VAP,
+        WIND=ds_pcse.WIND,
+        ANGSTA=angstA,
+        ANGSTB=angstB,
+        ETMODEL=ETmodel,
+    )
+    # convert to cm/day
+    ds_et = xr.Dataset({"E0": E0 / 10.0, "ES0": ES0 / 10.0, "ET0": ET0 / 10.0})
+    return ds_et.transpose(*ds_pcse.TMIN.dims)
+
+
+def check_reference_ET(E0, ES0, ET0, days):
+    """Raise PCSEError on the first day with a non finite ET value"""
+    finite = np.isfinite(E0) & np.isfinite(ES0) & np.isfinite(ET0)
+    if not bool(np.all(finite)):
+        day = np.asarray(days)[~np.asarray(finite)][0]
+        msg = "Failed to calculate reference ET values on %s." % day
+        raise PCSEError(msg)
@@ -0,0 +1,95 @@
+"""
+Batched extraction of many points from the AWS NASA POWER cube
+"""
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from pyCropModels.weather.power_conversion import watt_to_MJ
+
+
+class PointExtractor:
+    """Nearest-cell extraction of N points from the meteorology and solar cubes
+
+    Both products are indexed once with vectorized pointwise indexing
+    instead of two ds.sel(..., method="nearest") calls per point.
+
+    Args:
+        ds_weather (xr.Dataset): meteorology product (time, lat, lon)
+        ds_solar (xr.Dataset): radiation product (time, lat, lon)
+    """
+
+    def __init__(self, ds_weather: xr.Dataset, ds_solar: xr.Dataset) -> None:
+        self.ds_weather = ds_weather
+        self.ds_solar = ds_solar
+        self.weather_variables = list(ds_weather.data_vars)
+        self.solar_variables = list(ds_solar.data_vars)
+        self.variables = self.weather_variables + self.solar_variables
+        self.time = ds_weather.time.values
+        self.lat = ds_weather.lat.values
+        self.lon = ds_weather.lon.values
+
+    def cell_index(self, ds: xr.Dataset, longitude, latitude) -> tuple:
+        """Nearest (lat_idx, lon_idx) of every point in the grid of ds"""
+        lat_idx = ds.indexes["lat"].get_indexer(np.asarray(latitude), method="nearest")
+        lon_idx = ds.indexes["lon"].get_indexer(np.asarray(longitude), method="nearest")
+        return lat_idx, lon_idx
+
+    def cell_id(self, longitude, latitude) -> np.ndarray:
+        """Flat id (lat_idx * n_lon + lon_idx) of the weather cell of every point"""
+        lat_idx, lon_idx = self.cell_index(self.ds_weather, longitude, latitude)
+        return lat_idx * len(self.lon) + lon_idx
+
+    def _isel_points(self, ds: xr.Dataset, longitude, latitude) -> np.ndarray:
+        lat_idx, lon_idx = self.cell_index(ds, longitude, latitude)
+        points = ds.isel(
+            lat=xr.DataArray(lat_idx, dims="point"),
+            lon=xr.DataArray(lon_idx, dims="point"),
+        )
+        if not np.array_equal(points.time.values, self.time):
+            points = points.reindex(time=self.time)
+        return points.to_array("variable").transpose("point", "time", "variable").values
+
+    def extract(self, longitude, latitude) -> tuple:
+        """Weather of N points
+
+        Points in the same grid cell are extracted only once.
+
+        Args:
+            longitude: array of N longitudes
+            latitude: array of N latitudes
+
+        Returns:
+            tuple: (values, cell_id), values is a (point, time, variable)
+                array with the variables in self.variables order, cell_id
+                maps every point to its weather grid cell
+        """
+        cell_id = self.cell_id(longitude, latitude)
+        unique_id, inverse = np.unique(cell_id, return_inverse=True)
+        lat_idx, lon_idx = np.divmod(unique_id, len(self.lon))
+        cell_lat, cell_lon = self.lat[lat_idx], self.lon[lon_idx]
+        values = np.concatenate(
+            [
+                self._isel_points(self.ds_weather, cell_lon, cell_lat),
+                self._isel_points(self.ds_solar, cell_lon, cell_lat),
+            ],
+            axis=-1,
+        )
+        return values[inverse], cell_id
+
+    def to_frame(self, values: np.ndarray) -> pd.DataFrame:
+        """(time, variable) array of one point to the select_from_xarray frame
+
+        Args:
+            values (np.ndarray): one point of the extract() output
+
+        Returns:
+            pd.DataFrame: POWER variables, DAY and solar variables in MJ/m2/day
+        """
+        n_weather = len(self.weather_variables)
+        df_power = pd.DataFrame(values[:, :n_weather], columns=self.weather_variables)
+        df_power["DAY"] = pd.to_datetime(self.time, format="%Y%m%d")
+        df_solar = pd.DataFrame(
+            watt_to_MJ(values[:, n_weather:]), columns=self.solar_variables
+        )
+        return pd.concat([df_power, df_solar], axis=1)
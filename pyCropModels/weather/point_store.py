@@ -0,0 +1,344 @@
+"""
+Consolidated point weather store
+
+One chunked zarr store on (point, day) replaces the per-point
+NASA_weather_latitude_<lat>_longitude_<lon>.csv files. Variables are kept in
+the units of those CSV files, with the site description of every point
+(elevation and Angstrom A/B) as point variables. Reading a point touches one
+chunk per variable. Appending a point writes to the last point chunks only.
+
+The store has a single writer, do not append from several processes at once.
+"""
+import os
+import logging
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+from scipy import spatial
+
+from pcse.base import WeatherDataProvider, WeatherDataContainer
+
+from pyCropModels.weather.evapotranspiration import reference_ET, check_reference_ET
+from pyCropModels.weather.weather_converter import CSVWeatherDataProvider
+from pyCropModels.weather.weather_index import parse_weather_filename
+
+logger = logging.getLogger(__name__)
+
+# weather variables in the units of the CSV weather files
+VARIABLES = ["IRRAD", "TMIN", "TMAX", "VAP", "WIND", "RAIN"]
+SITE_VARIABLES = ["elevation", "angstA", "angstB"]
+# points per chunk of lat, lon and SITE_VARIABLES
+SITE_CHUNK = 65536
+
+# CSV units to PCSE units
+TO_PCSE = {
+    "IRRAD": lambda x: x * 1000.0,  # kJ/m2/day -> J/m2/day
+    "TMIN": lambda x: x,
+    "TMAX": lambda x: x,
+    "VAP": lambda x: x * 10.0,  # kPa -> hPa
+    "WIND": lambda x: x,
+    "RAIN": lambda x: x / 10.0,  # mm -> cm
+}
+# PCSE units back to CSV units
+FROM_PCSE = {
+    "IRRAD": lambda x: x / 1000.0,
+    "TMIN": lambda x: x,
+    "TMAX": lambda x: x,
+    "VAP": lambda x: x / 10.0,
+    "WIND": lambda x: x,
+    "RAIN": lambda x: x * 10.0,
+}
+
+
+def read_weather_csv(path: str) -> tuple:
+    """Site description and daily rows of a CSV weather file
+
+    The file is parsed by CSVWeatherDataProvider, so its npz cache is used
+    and rows it rejects are left out.
+
+    Args:
+        path (str): CSV file in the pattern.csv layout
+
+    Returns:
+        tuple: (site, df), site with latitude, longitude, elevation, angstA
+            and angstB, df with DAY (datetime64) and VARIABLES
+    """
+    provider = CSVWeatherDataProvider(path)
+    columns = getattr(provider.store, "columns", None)
+    if columns is None:
+        msg = "No weather observations in %s" % path
+        raise ValueError(msg)
+    df = pd.DataFrame({"DAY": columns["DAY"].astype("datetime64[ns]")})
+    for name in VARIABLES:
+        df[name] = FROM_PCSE[name](columns[name])
+    site = {
+        "latitude": provider.latitude,
+        "longitude": provider.longitude,
+        "elevation": provider.elevation,
+        "angstA": provider.angstA,
+        "angstB": provider.angstB,
+    }
+    return site, df
+
+
+class WeatherPointStore:
+    """Daily weather of many points in one zarr store
+
+    Args:
+        path (str): path of the zarr store, created on the first append
+        point_chunk (int, optional): points per chunk of a new store
+    """
+
+    def __init__(self, path: str, point_chunk: int = 64) -> None:
+        self.path = path
+        self.point_chunk = point_chunk
+        self._ds = None
+        self._points = None
+        # keys of the stored points and their KDTree, built on the first
+        # nearest query and dropped on append
+        self._keys = None
+        self._tree = None
+
+    @property
+    def ds(self) -> Optional[xr.Dataset]:
+        """Lazily opened store, None while it does not exist"""
+        if self._ds is None and os.path.exists(self.path):
+            self._ds = xr.open_zarr(self.path, consolidated=True)
+        return self._ds
+
+    def _key(self, latitude: float, longitude: float) -> tuple:
+        return round(float(latitude), 6), round(float(longitude), 6)
+
+    @property
+    def points(self) -> dict:
+        """{(latitude, longitude): point index} of the stored points"""
+        if self._points is None:
+            self._points = {}
+            if self.ds is not None:
+                keys = zip(self.ds.lat.values.tolist(), self.ds.lon.values.tolist())
+                self._points = {self._key(*k): i for i, k in enumerate(keys)}
+        return self._points
+
+    def __len__(self) -> int:
+        return len(self.points)
+
+    def __contains__(self, point: tuple) -> bool:
+        return self._key(*point) in self.points
+
+    def _reset(self):
+        if self._ds is not None:
+            self._ds.close()
+        self._ds, self._points, self._keys, self._tree = None, None, None, None
+
+    def read(self, latitude: float, longitude: float) -> tuple:
+        """Site description and daily weather of a stored point
+
+        Returns:
+            tuple: (site, df) as read_weather_csv, days without data dropped
+        """
+        key = self._key(latitude, longitude)
+        if key not in self.points:
+            msg = "No weather of (%s, %s) in %s" % (latitude, longitude, self.path)
+            raise KeyError(msg)
+        point = self.ds.isel(point=self.points[key]).load()  # type: ignore
+        site = {"latitude": float(point.lat), "longitude": float(point.lon)}
+        site.update({name: float(point[name]) for name in SITE_VARIABLES})
+        df = pd.DataFrame({"DAY": point.day.values})
+        for name in VARIABLES:
+            df[name] = point[name].values
+        return site, df.dropna().reset_index(drop=True)
+
+    def append(self, sites: Iterable[dict], frames: Iterable[pd.DataFrame]) -> None:
+        """Append points, points already in the store are skipped
+
+        Args:
+            sites (Iterable[dict]): latitude, longitude, elevation, angstA
+                and angstB of every point
+            frames (Iterable[pd.DataFrame]): DAY and VARIABLES of every point
+        """
+        new_sites, new_frames = [], []
+        for site, df in zip(sites, frames):
+            key = self._key(site["latitude"], site["longitude"])
+            if key not in self.points and key not in {
+                self._key(s["latitude"], s["longitude"]) for s in new_sites
+            }:
+                new_sites.append(site)
+                new_frames.append(df)
+        if not new_sites:
+            return
+        days = self._days(new_frames)
+        data = {
+            name: (
+                ("point", "day"),
+                np.stack(
+                    [
+                        df.set_index("DAY")[name].reindex(days).values
+                        for df in new_frames
+                    ]
+                ).astype("float32"),
+            )
+            for name in VARIABLES
+        }
+        for name in SITE_VARIABLES:
+            data[name] = ("point", np.array([s[name] for s in new_sites], dtype=float))
+        ds = xr.Dataset(
+            data,
+            coords={
+                "lat": ("point", np.array([s["latitude"] for s in new_sites])),
+                "lon": ("point", np.array([s["longitude"] for s in new_sites])),
+                "day": days,
+            },
+        )
+        if self.ds is None:
+            encoding = {
+                name: {"chunks": (self.point_chunk, len(days))} for name in VARIABLES
+            }
+            for name in SITE_VARIABLES + ["lat", "lon"]:
+                encoding[name] = {"chunks": (SITE_CHUNK,)}
+            ds.to_zarr(self.path, mode="w", consolidated=True, encoding=encoding)
+        else:
+            ds.to_zarr(self.path, append_dim="point", consolidated=True)
+        msg = "Appended %i points to %s" % (len(new_sites), self.path)
+        logger.info(msg)
+        self._reset()
+
+    def _days(self, frames: list) -> pd.DatetimeIndex:
+        """Day axis of the store, grown at the end to cover frames"""
+        first = min(df.DAY.min() for df in frames)
+        last = max(df.DAY.max() for df in frames)
+        if self.ds is None:
+            return pd.date_range(first, last, freq="D")
+        days = pd.DatetimeIndex(self.ds.day.values)
+        if first < days[0]:
+            msg = "Days before %s are not stored in %s" % (days[0].date(), self.path)
+            logger.warning(msg)
+        if last > days[-1]:
+            extra = pd.date_range(days[-1] + pd.Timedelta(days=1), last, freq="D")
+            n_points = self.ds.sizes["point"]
+            filler = xr.Dataset(
+                {
+                    name: (
+                        ("point", "day"),
+                        np.full((n_points, len(extra)), np.nan, dtype="float32"),
+                    )
+                    for name in VARIABLES
+                },
+                coords={"day": extra},
+            )
+            filler.to_zarr(self.path, append_dim="day", consolidated=True)
+            self._reset()
+            days = days.append(extra)
+        return days
+
+    def query(self, latitude: float, longitude: float) -> tuple:
+        """Stored point closest to a point
+
+        Returns:
+            tuple: (distance, (latitude, longitude)), distance in degrees
+        """
+        if not len(self):
+            msg = "No weather points in %s" % self.path
+            raise FileNotFoundError(msg)
+        if self._tree is None:
+            self._keys = list(self.points)
+            self._tree = spatial.cKDTree(np.array(self._keys))
+        distance, position = self._tree.query([latitude, longitude])
+        return float(distance), self._keys[position]  # type: ignore
+
+    def nearest(self, latitude: float, longitude: float) -> tuple:
+        """(latitude, longitude) of the stored point closest to a point"""
+        return self.query(latitude, longitude)[1]
+
+    def provider(
+        self, latitude: float, longitude: float, ETmodel: str = "PM"
+    ) -> "StoreWeatherDataProvider":
+        """PCSE weather of a stored point"""
+        site, df = self.read(latitude, longitude)
+        return StoreWeatherDataProvider(site, df, ETmodel=ETmodel)
+
+    def import_csv_dir(self, path_CSV_dir: str, batch_size: int = 256) -> int:
+        """Move the weather of per-point CSV files into the store
+
+        The CSV files are left in place.
+
+        Args:
+            path_CSV_dir (str): directory of NASA_weather_*.csv files
+            batch_size (int, optional): points appended at once
+
+        Returns:
+            int: number of files read
+        """
+        names = [
+            name
+            for name in sorted(os.listdir(path_CSV_dir))
+            if parse_weather_filename(name) is not None
+        ]
+        for start in range(0, len(names), batch_size):
+            batch = [
+                read_weather_csv(os.path.join(path_CSV_dir, name))
+                for name in names[start : start + batch_size]
+            ]
+            self.append([site for site, _ in batch], [df for _, df in batch])
+        return len(names)
+
+
+class StoreWeatherDataProvider(WeatherDataProvider):
+    """WeatherDataProvider of one point of a WeatherPointStore
+
+    :param site: latitude, longitude, elevation, angstA and angstB
+    :param df: DAY and VARIABLES in the units of the CSV weather files
+    :keyword ETmodel: "PM"|"P" for selecting Penman-Monteith or Penman
+        method for reference evapotranspiration. Defaults to "PM".
+    """
+
+    def __init__(self, site: dict, df: pd.DataFrame, ETmodel: str = "PM"):
+        WeatherDataProvider.__init__(self)
+        self.latitude = site["latitude"]
+        self.longitude = site["longitude"]
+        self.elevation = site["elevation"]
+        self.angstA = site["angstA"]
+        self.angstB = site["angstB"]
+        self.ETmodel = ETmodel
+        self.description = "NASA POWER point weather store"
+
+        df_pcse = pd.DataFrame(
+            {name: TO_PCSE[name](df[name].values) for name in VARIABLES}
+        )
+        days = df.DAY.values.astype("datetime64[D]")
+        E0, ES0, ET0 = reference_ET(
+            DAY=days,
+            LAT=self.latitude,
+            ELEV=self.elevation,
+            TMIN=df_pcse.TMIN.values,
+            TMAX=df_pcse.TMAX.values,
+            IRRAD=df_pcse.IRRAD.values,
+            VAP=df_pcse.VAP.values,
+            WIND=df_pcse.WIND.values,
+            ANGSTA=self.angstA,
+            ANGSTB=self.angstB,
+            ETMODEL=self.ETmodel,
+        )
+        E0, ES0, ET0 = E0 / 10.0, ES0 / 10.0, ET0 / 10.0
+        check_reference_ET(E0, ES0, ET0, days=days)
+
+        df_pcse = df_pcse.assign(
+            DAY=days.astype(object),
+            LAT=self.latitude,
+            LON=self.longitude,
+            ELEV=self.elevation,
+            E0=E0,
+            ES0=ES0,
+            ET0=ET0,
+        )
+        for rec in df_pcse.to_dict(orient="records"):
+            wdc = WeatherDataContainer(**rec)
+            self._store_WeatherDataContainer(wdc, wdc.DAY)
+
+
+@lru_cache(maxsize=None)
+def get_point_store(path: str) -> WeatherPointStore:
+    """Store of path, opened once per process"""
+    return WeatherPointStore(os.path.abspath(path))
@@ -0,0 +1,193 @@
+"""
+Local zarr mirror of the AWS NASA POWER products
+
+Region extracts are stored per (product, variables, bbox). A later request
+with a wider time window only fetches the missing days.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+import xarray as xr
+
+from pyCropModels.weather.loading import load_concurrently
+
+logger = logging.getLogger(__name__)
+
+
+class NasaPowerCache:
+    """Local zarr cache in front of the remote NASA POWER zarr products
+
+    Args:
+        cache_dir (str): directory holding the local zarr stores
+        open_product (Callable[[str], xr.Dataset]): opens a remote product
+            by name, e.g. AwsNasaPower.aws_nasapower
+    """
+
+    def __init__(self, cache_dir: str, open_product: Callable[[str], xr.Dataset]):
+        self.cache_dir = cache_dir
+        self.open_product = open_product
+        # {product: read statistics of the last get}
+        self.read_stats = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, product: str, variables: list, bbox: tuple) -> str:
+        """Cache key of a product extract"""
+        meta = {
+            "product": product,
+            "variables": sorted(variables),
+            "bbox": [round(float(v), 4) for v in bbox],
+        }
+        return hashlib.sha1(json.dumps(meta).encode()).hexdigest()[:16]
+
+    def store_path(self, product: str, variables: list, bbox: tuple) -> str:
+        """Path of the local zarr store of a product extract"""
+        name = os.path.splitext(product)[0]
+        key = self.key(product, variables, bbox)
+        return os.path.join(self.cache_dir, f"{name}_{key}.zarr")
+
+    def _fetch(
+        self,
+        product: str,
+        variables: list,
+        bbox: tuple,
+        time_start,
+        time_end,
+        max_workers: int = 1,
+    ) -> xr.Dataset:
+        """Read the bbox and time window from the remote product, the read
+        statistics are added to read_stats"""
+        ds = self.open_product(product)[variables]
+        ds = select_bbox(ds, bbox).sel(time=slice(time_start, time_end))
+        msg = "Fetch %s: %s - %s" % (product, time_start, time_end)
+        logger.info(msg)
+        ds, stats = load_concurrently(ds, max_workers=max_workers)
+        self.read_stats[product] = add_read_stats(self.read_stats[product], stats)
+        for var in ds.variables.values():
+            var.encoding = {}
+        return ds
+
+    def get(
+        self,
+        product: str,
+        variables: list,
+        bbox: tuple,
+        time_start: str,
+        time_end: str,
+        max_workers: int = 1,
+    ) -> xr.Dataset:
+        """Product extract for bbox and time window, served from the cache
+
+        Args:
+            product (str): name of the NASA POWER zarr product
+            variables (list): variables to keep
+            bbox (tuple): (minx, miny, maxx, maxy) in WGS84
+            time_start (str): first day
+            time_end (str): last day
+            max_workers (int, optional): concurrent chunk reads of a fetch
+
+        Returns:
+            xr.Dataset: lazily opened local extract, the remote reads it
+                took are in read_stats[product]
+        """
+        self.read_stats[product] = empty_read_stats()
+        path = self.store_path(product, variables, bbox)
+        start, end = pd.Timestamp(time_start), pd.Timestamp(time_end)
+        one_day = pd.Timedelta(days=1)
+
+        if not os.path.exists(path):
+            ds = self._fetch(product, variables, bbox, start, end, max_workers)
+            ds.attrs["cache_key"] = self.key(product, variables, bbox)
+            ds.to_zarr(path, mode="w", consolidated=True)
+        else:
+            cached = xr.open_zarr(path, consolidated=True)
+            cached_start = pd.Timestamp(cached.time.values[0])
+            cached_end = pd.Timestamp(cached.time.values[-1])
+            if end > cached_end:
+                # append only the missing days at the end
+                ds = self._fetch(
+                    product, variables, bbox, cached_end + one_day, end, max_workers
+                )
+                if ds.sizes["time"]:
+                    ds.to_zarr(path, append_dim="time", consolidated=True)
+            if start < cached_start:
+                # zarr can not prepend, rewrite the store with the earlier days
+                ds = self._fetch(
+                    product,
+                    variables,
+                    bbox,
+                    start,
+                    cached_start - one_day,
+                    max_workers,
+                )
+                if ds.sizes["time"]:
+                    merged = xr.concat(
+                        [ds, xr.open_zarr(path, consolidated=True).load()], dim="time"
+                    )
+                    for var in merged.variables.values():
+                        var.encoding = {}
+                    tmp_path = path + ".tmp"
+                    merged.to_zarr(tmp_path, mode="w", consolidated=True)
+                    shutil.rmtree(path)
+                    os.rename(tmp_path, path)
+
+        ds = xr.open_zarr(path, consolidated=True)
+        return ds.sel(time=slice(start, end))
+
+
+def empty_read_stats() -> dict:
+    """Read statistics of no remote reads, see load_concurrently"""
+    return {
+        "decoded_bytes": 0,
+        "blocks": 0,
+        "seconds": 0.0,
+        "decoded_MB/s": 0.0,
+        "mean_block_seconds": 0.0,
+        "max_block_seconds": 0.0,
+    }
+
+
+def add_read_stats(total: dict, stats: dict) -> dict:
+    """Sum of two load_concurrently read statistics"""
+    blocks = total["blocks"] + stats["blocks"]
+    seconds = total["seconds"] + stats["seconds"]
+    nbytes = total["decoded_bytes"] + stats["decoded_bytes"]
+    return {
+        "decoded_bytes": nbytes,
+        "blocks": blocks,
+        "seconds": seconds,
+        "decoded_MB/s": nbytes / 1e6 / seconds if seconds > 0 else 0.0,
+        "mean_block_seconds": (
+            (
+                total["mean_block_seconds"] * total["blocks"]
+                + stats["mean_block_seconds"] * stats["blocks"]
+            )
+            / blocks
+            if blocks
+            else 0.0
+        ),
+        "max_block_seconds": max(
+            total["max_block_seconds"], stats["max_block_seconds"]
+        ),
+    }
+
+
+def select_bbox(ds: xr.Dataset, bbox: tuple) -> xr.Dataset:
+    """Slice a (lat, lon) dataset to bbox (minx, miny, maxx, maxy)
+
+    The bbox is padded by one grid cell so that clipping by the region
+    polygon afterwards sees every cell touching the region.
+    """
+    minx, miny, maxx, maxy = bbox
+    dlat = float(np.abs(np.diff(ds.lat.values[:2])).max()) if ds.sizes["lat"] > 1 else 0
+    dlon = float(np.abs(np.diff(ds.lon.values[:2])).max()) if ds.sizes["lon"] > 1 else 0
+    lat_slice = slice(miny - dlat, maxy + dlat)
+    if ds.lat.values[0] > ds.lat.values[-1]:
+        lat_slice = slice(maxy + dlat, miny - dlat)
+    return ds.sel(lat=lat_slice, lon=slice(minx - dlon, maxx + dlon))
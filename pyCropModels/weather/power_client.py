@@ -0,0 +1,363 @@
+"""
+NASA POWER daily point API client
+
+Responses are cached on disk per (point, parameters). The cache remembers
+the date ranges it holds, so a request for a wider range only fetches the
+missing dates. Many points are fetched concurrently through asyncio with a
+request rate limit and retries of failed requests.
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import datetime as dt
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import requests
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_exponential,
+)
+
+logger = logging.getLogger(__name__)
+
+POWER_URL = "https://power.larc.nasa.gov/api/temporal/daily/point"
+POWER_VARIABLES = [
+    "TOA_SW_DWN",
+    "ALLSKY_SFC_SW_DWN",
+    "T2M",
+    "T2M_MIN",
+    "T2M_MAX",
+    "T2MDEW",
+    "WS2M",
+    "PRECTOTCORR",
+    "RH2M",
+]
+HTTP_OK = 200
+DEFAULT_CACHE_DIR = os.path.join("~", ".cache", "pyCropModels", "power")
+DATE_FORMAT = "%Y%m%d"
+
+
+class PowerServerBusy(Exception):
+    """Rate limited (HTTP 429) or server error (5xx), worth a retry"""
+
+
+RETRYABLE = (PowerServerBusy, requests.ConnectionError, requests.Timeout)
+
+
+def to_date(day) -> dt.date:
+    """date of a date, datetime or "%Y%m%d" / "%Y-%m-%d" string"""
+    if isinstance(day, dt.datetime):
+        return day.date()
+    if isinstance(day, dt.date):
+        return day
+    return dt.datetime.strptime(str(day).replace("-", ""), DATE_FORMAT).date()
+
+
+def merge_ranges(ranges: Iterable) -> list:
+    """Sorted union of inclusive (start, end) date ranges"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + dt.timedelta(days=1):
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def missing_ranges(ranges: Iterable, start: dt.date, end: dt.date) -> list:
+    """Parts of the inclusive range start - end not covered by ranges"""
+    missing = []
+    for cached_start, cached_end in merge_ranges(ranges):
+        if cached_end < start or cached_start > end:
+            continue
+        if cached_start > start:
+            missing.append((start, cached_start - dt.timedelta(days=1)))
+        start = cached_end + dt.timedelta(days=1)
+    if start <= end:
+        missing.append((start, end))
+    return missing
+
+
+class RateLimiter:
+    """Spaces request starts at least 1 / rate seconds apart
+
+    Create it inside the event loop that uses it.
+
+    Args:
+        rate (float): requests per second, None for no limit
+    """
+
+    def __init__(self, rate: Optional[float]) -> None:
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        async with self._lock:
+            delay = self._next - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next = max(self._next, time.monotonic()) + self.interval
+
+
+class PowerClient:
+    """Client of the NASA POWER daily point API with an on-disk cache
+
+    Args:
+        cache_dir (str, optional): directory of the response cache, no
+            caching without it
+        base_url (str, optional): API endpoint, e.g. a local stand-in server
+        max_concurrency (int, optional): requests in flight at once
+        rate_limit (float, optional): requests per second, None for no limit
+        retries (int, optional): attempts per request
+        backoff (float, optional): first wait (s) between attempts, doubled
+            after every failure
+        timeout (float, optional): request timeout (s)
+        community (str, optional): POWER user community
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        base_url: str = POWER_URL,
+        max_concurrency: int = 4,
+        rate_limit: Optional[float] = 2.0,
+        retries: int = 5,
+        backoff: float = 1.0,
+        timeout: float = 120.0,
+        community: str = "AG",
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.base_url = base_url
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.community = community
+        self.session = requests.Session()
+        self.requests_sent = 0
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, latitude: float, longitude: float, parameters: list) -> str:
+        """Cache key of a point and its parameters"""
+        meta = {
+            "latitude": round(float(latitude), 4),
+            "longitude": round(float(longitude), 4),
+            "parameters": sorted(parameters),
+            "community": self.community,
+        }
+        return hashlib.sha1(json.dumps(meta).encode()).hexdigest()[:16]
+
+    def cache_path(self, latitude: float, longitude: float, parameters: list) -> str:
+        """Path of the cached responses of a point"""
+        key = self.key(latitude, longitude, parameters)
+        return os.path.join(self.cache_dir, f"power_{key}.json")  # type: ignore
+
+    def _read_cache(self, path: Optional[str]) -> dict:
+        if path is None or not os.path.exists(path):
+            return {"ranges": [], "response": None}
+        with open(path, "r") as f:
+            cached = json.load(f)
+        cached["ranges"] = [tuple(map(to_date, r)) for r in cached["ranges"]]
+        return cached
+
+    def _write_cache(self, path: Optional[str], cached: dict) -> None:
+        if path is None:
+            return
+        doc = {
+            "ranges": [
+                [s.strftime(DATE_FORMAT), e.strftime(DATE_FORMAT)]
+                for s, e in cached["ranges"]
+            ],
+            "response": cached["response"],
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(doc, f)
+        os.replace(tmp_path, path)
+
+    async def _get(self, params: dict, limiter: RateLimiter) -> dict:
+        """One request, retried on connection errors, 429 and 5xx"""
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.retries),
+            wait=wait_exponential(multiplier=self.backoff, max=60),
+            retry=retry_if_exception_type(RETRYABLE),
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                await limiter.wait()
+                self.requests_sent += 1
+                req = await asyncio.to_thread(
+                    self.session.get, self.base_url, params=params, timeout=self.timeout
+                )
+                if req.status_code == 429 or req.status_code >= 500:
+                    msg = "POWER server returned HTTP %i on %s" % (
+                        req.status_code,
+                        req.url,
+                    )
+                    logger.warning(msg)
+                    raise PowerServerBusy(msg)
+                if req.status_code != HTTP_OK:
+                    msg = (
+                        "Failed retrieving POWER data, server returned HTTP "
+                        + "code: %i on following URL %s"
+                    ) % (req.status_code, req.url)
+                    raise ValueError(msg)
+                return req.json()
+        raise AssertionError("unreachable")
+
+    async def _fetch(
+        self,
+        latitude: float,
+        longitude: float,
+        start: dt.date,
+        end: dt.date,
+        parameters: list,
+        semaphore: asyncio.Semaphore,
+        limiter: RateLimiter,
+    ) -> dict:
+        path = None
+        if self.cache_dir is not None:
+            path = self.cache_path(latitude, longitude, parameters)
+        cached = self._read_cache(path)
+        gaps = missing_ranges(cached["ranges"], start, end)
+        fetched = []
+        try:
+            for gap_start, gap_end in gaps:
+                params = {
+                    "request": "execute",
+                    "parameters": ",".join(parameters),
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "start": gap_start.strftime(DATE_FORMAT),
+                    "end": gap_end.strftime(DATE_FORMAT),
+                    "community": self.community,
+                    "format": "JSON",
+                    "user": "anonymous",
+                }
+                async with semaphore:
+                    response = await self._get(params, limiter)
+                cached["response"] = merge_responses(cached["response"], response)
+                fetched.append((gap_start, gap_end))
+        finally:
+            # one cache write per point, also keeps the gaps fetched before
+            # a failed request
+            if fetched:
+                cached["ranges"] = merge_ranges(cached["ranges"] + fetched)
+                self._write_cache(path, cached)
+        if gaps:
+            msg = "POWER (%s, %s): fetched %i missing date ranges" % (
+                latitude,
+                longitude,
+                len(gaps),
+            )
+            logger.debug(msg)
+        return select_dates(cached["response"], start, end)
+
+    async def fetch_many_async(
+        self, points: Iterable, start, end, parameters: Optional[list] = None
+    ) -> list:
+        """Daily POWER responses of many points, see fetch_many"""
+        parameters = list(parameters or POWER_VARIABLES)
+        start, end = to_date(start), to_date(end)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        limiter = RateLimiter(self.rate_limit)
+        points = [(float(lat), float(lon)) for lat, lon in points]
+        unique = list(dict.fromkeys(points))
+        responses = await asyncio.gather(
+            *(
+                self._fetch(lat, lon, start, end, parameters, semaphore, limiter)
+                for lat, lon in unique
+            )
+        )
+        by_point = dict(zip(unique, responses))
+        return [by_point[point] for point in points]
+
+    def fetch_many(
+        self, points: Iterable, start, end, parameters: Optional[list] = None
+    ) -> list:
+        """Daily POWER responses of many points
+
+        Args:
+            points (Iterable): (latitude, longitude) pairs
+            start: first day, date or "%Y%m%d"
+            end: last day, date or "%Y%m%d"
+            parameters (list, optional): POWER parameters, POWER_VARIABLES
+                by default
+
+        Returns:
+            list: POWER JSON response of every point, restricted to
+                start - end
+        """
+        return run_sync(self.fetch_many_async(points, start, end, parameters))
+
+    def fetch(
+        self,
+        latitude: float,
+        longitude: float,
+        start,
+        end,
+        parameters: Optional[list] = None,
+    ) -> dict:
+        """Daily POWER response of one point, see fetch_many"""
+        return self.fetch_many([(latitude, longitude)], start, end, parameters)[0]
+
+
+def merge_responses(cached: Optional[dict], response: dict) -> dict:
+    """POWER JSON response with the daily values of both responses"""
+    if cached is None:
+        return response
+    merged = dict(cached)
+    parameters = {
+        name: dict(values) for name, values in cached["properties"]["parameter"].items()
+    }
+    for name, values in response["properties"]["parameter"].items():
+        parameters.setdefault(name, {}).update(values)
+    merged["properties"] = dict(cached["properties"], parameter=parameters)
+    return merged
+
+
+def select_dates(response: dict, start: dt.date, end: dt.date) -> dict:
+    """POWER JSON response restricted to the days start - end"""
+    first, last = start.strftime(DATE_FORMAT), end.strftime(DATE_FORMAT)
+    parameters = {
+        name: {day: v for day, v in values.items() if first <= day <= last}
+        for name, values in response["properties"]["parameter"].items()
+    }
+    return dict(response, properties=dict(response["properties"], parameter=parameters))
+
+
+def run_sync(coroutine):
+    """Run a coroutine to completion, also from a running event loop
+    (e.g. a notebook)"""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+
+@lru_cache(maxsize=1)
+def default_power_client() -> PowerClient:
+    """Client shared by the weather helpers, created once per process
+
+    The cache directory and endpoint are read from the
+    PYCROPMODELS_POWER_CACHE and PYCROPMODELS_POWER_URL environment
+    variables, the cache defaults to ~/.cache/pyCropModels/power.
+    """
+    cache_dir = os.environ.get("PYCROPMODELS_POWER_CACHE", DEFAULT_CACHE_DIR)
+    return PowerClient(
+        cache_dir=os.path.expanduser(cache_dir),
+        base_url=os.environ.get("PYCROPMODELS_POWER_URL", POWER_URL),
+    )
@@ -0,0 +1,137 @@
+"""
+Vectorized unit conversions of NASA POWER variables to PCSE inputs
+
+All functions take whole NumPy arrays or xarray DataArrays, so the same
+code converts a single point or the whole (time, lat, lon) cube.
+"""
+import numpy as np
+import xarray as xr
+
+
+def K_to_C(x):
+    """Kelvin to Celsius"""
+    return x - 273.15
+
+
+def MJ_to_J(x):
+    """MJ/m2/day to J/m2/day"""
+    return x * 1e6
+
+
+def watt_to_MJ(x):
+    """Daily mean W/m2 to MJ/m2/day"""
+    return x * 86400 / 1e6
+
+
+def kg_m2_to_cm(x):
+    """Precipitation flux kg/m2/s to cm/day"""
+    return x * 86400 / 10.0
+
+
+def ea_from_tdew(tdew):
+    """Vectorized pcse.util.ea_from_tdew
+
+    Actual vapour pressure [kPa] from dewpoint temperature [C],
+    equation (14) of FAO-56.
+
+    Args:
+        tdew: dewpoint temperature (C)
+
+    Raises:
+        ValueError: if any value is outside -95 to +65 C
+
+    Returns:
+        actual vapour pressure (kPa)
+    """
+    out_of_range = (tdew < -95.0) | (tdew > 65.0)
+    if bool(out_of_range.any()):
+        msg = "tdew=%g is not in range -95 to +60 deg C" % float(
+            np.asarray(tdew)[np.asarray(out_of_range)][0]
+        )
+        raise ValueError(msg)
+    tmp = (17.27 * tdew) / (tdew + 237.3)
+    return 0.6108 * np.exp(tmp)
+
+
+def to_date(day) -> np.ndarray:
+    """datetime64 array to array of datetime.date as used by PCSE"""
+    days = np.asarray(day, dtype="datetime64[D]")
+    return np.array(days.tolist(), dtype=object)
+
+
+def ffill(values: np.ndarray, axis: int = 0) -> np.ndarray:
+    """Forward fill NaN along axis, leading NaN are kept"""
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, 0)
+    valid = ~np.isnan(values)
+    shape = (-1,) + (1,) * (values.ndim - 1)
+    idx = np.where(valid, np.arange(len(values)).reshape(shape), 0)
+    idx = np.maximum.accumulate(idx, axis=0)
+    filled = np.take_along_axis(values, idx, axis=0)
+    return np.moveaxis(filled, 0, axis)
+
+
+def power_to_pcse(power) -> dict:
+    """Convert POWER variables to PCSE compatible inputs
+
+    Args:
+        power: mapping (DataFrame, Dataset or dict) with T2M, T2M_MIN, T2M_MAX,
+            T2MDEW, WS2M, PRECTOTCORR (kg/m2/s) and ALLSKY_SFC_SW_DWN (MJ/m2/day)
+
+    Returns:
+        dict: TMAX, TMIN, TEMP (C), IRRAD (J/m2/day), RAIN (cm/day),
+            WIND (m/s) and VAP (hPa), same shape as the inputs
+    """
+    return {
+        "TMAX": K_to_C(power["T2M_MAX"]),
+        "TMIN": K_to_C(power["T2M_MIN"]),
+        "TEMP": K_to_C(power["T2M"]),
+        "IRRAD": MJ_to_J(power["ALLSKY_SFC_SW_DWN"]),
+        "RAIN": kg_m2_to_cm(power["PRECTOTCORR"]),
+        "WIND": power["WS2M"],
+        "VAP": ea_from_tdew(K_to_C(power["T2MDEW"])) * 10.0,
+    }
+
+
+def solar_on_grid(ds_weather: xr.Dataset, ds_solar: xr.Dataset) -> xr.Dataset:
+    """Radiation of the nearest radiation cell of every meteorology cell
+
+    The cell is picked as PointExtractor picks it for a point at the centre
+    of the meteorology cell.
+
+    Args:
+        ds_weather (xr.Dataset): meteorology product (time, lat, lon)
+        ds_solar (xr.Dataset): radiation product on its own coarser grid
+
+    Returns:
+        xr.Dataset: radiation on the grid and days of ds_weather
+    """
+    lat_idx = ds_solar.indexes["lat"].get_indexer(
+        ds_weather.lat.values, method="nearest"
+    )
+    lon_idx = ds_solar.indexes["lon"].get_indexer(
+        ds_weather.lon.values, method="nearest"
+    )
+    solar = ds_solar.isel(lat=lat_idx, lon=lon_idx).assign_coords(
+        lat=ds_weather.lat.values, lon=ds_weather.lon.values
+    )
+    return solar.reindex(time=ds_weather.time.values)
+
+
+def power_cube_to_pcse(ds_weather: xr.Dataset, ds_solar: xr.Dataset) -> xr.Dataset:
+    """Convert the whole AWS NASA POWER cube to PCSE inputs at once
+
+    Args:
+        ds_weather (xr.Dataset): meteorology product (time, lat, lon)
+        ds_solar (xr.Dataset): radiation product (time, lat, lon), W/m2,
+            on its own grid, see solar_on_grid
+
+    Returns:
+        xr.Dataset: PCSE variables on the (time, lat, lon) grid of
+            ds_weather, days with missing values are forward filled along time
+    """
+    solar = solar_on_grid(ds_weather, ds_solar)
+    power = xr.merge([ds_weather, watt_to_MJ(solar)], compat="override")
+    power = power.map(
+        lambda da: da.copy(data=ffill(da.values, axis=da.get_axis_num("time")))
+    )
+    return xr.Dataset(power_to_pcse(power))
@@ -7,15 +7,20 @@
 """
 import os
 import datetime as dt
-import csv
 import math
+from itertools import repeat
 
 from ast import literal_eval
 
-from ..base import WeatherDataContainer, WeatherDataProvider
-from ..util import reference_ET, angstrom, check_angstromAB
-from ..exceptions import PCSEError
-from ..settings import settings
+import numpy as np
+import pandas as pd
+
+from pcse.base import WeatherDataContainer, WeatherDataProvider
+from pcse.util import angstrom, check_angstromAB
+from pcse.exceptions import PCSEError
+from pcse.settings import settings
+
+from pyCropModels.weather.evapotranspiration import reference_ET
 
 
 class ParseError(PCSEError):
@@ -78,6 +83,45 @@ def kPa_to_hPa(x, d):
     return float(x)*10.
 
 
+# Whole-column versions of the conversion functions
+array_conversions = {
+    NoConversion: lambda x: x,
+    kJ_to_J: lambda x: x*1000.,
+    mm_to_cm: lambda x: x/10.,
+    kPa_to_hPa: lambda x: x*10.,
+}
+
+
+class ColumnarWeatherStore(dict):
+    """Store of a WeatherDataProvider on top of column arrays
+
+    Keys are (day, member_id) as in WeatherDataProvider.store, the
+    WeatherDataContainer of a day is only built when it is looked up.
+
+    :param columns: dict of arrays with DAY (datetime64[D]) and the weather
+        variables
+    :keyword LAT, LON, ELEV: site of the weather
+    """
+
+    labels = ["DAY", "TMAX", "TMIN", "IRRAD", "VAP", "WIND", "RAIN", "SNOWDEPTH",
+              "E0", "ES0", "ET0"]
+
+    def __init__(self, columns, LAT, LON, ELEV):
+        days = np.asarray(columns["DAY"], dtype="datetime64[D]").astype(object)
+        dict.__init__(self, zip(zip(days, repeat(0)), range(len(days))))
+        self.columns = columns
+        self.site = {"LAT": LAT, "LON": LON, "ELEV": ELEV}
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if isinstance(value, int):
+            row = {label: float(values[value]) for label, values in self.columns.items()
+                   if label != "DAY" and not math.isnan(values[value])}
+            value = WeatherDataContainer(DAY=key[0], **self.site, **row)
+            dict.__setitem__(self, key, value)
+        return value
+
+
 class CSVWeatherDataProvider(WeatherDataProvider):
     """Reading weather data from a CSV file.
 
@@ -162,6 +206,8 @@ class CSVWeatherDataProvider(WeatherDataProvider):
         for line in csv_file:
             if line.startswith('## Daily weather observations'):
                 break
+            if line.startswith('#') or '=' not in line:
+                continue
             statements = line.split(';')
             for stmt in statements:
                 key, val = stmt.split('=')
@@ -189,40 +235,89 @@ class CSVWeatherDataProvider(WeatherDataProvider):
 
     def _read_observations(self, csv_file, delimiter):
         """Processes the rows with meteo data and converts into the correct units.
+
+        The whole table is parsed at once and converted column by column,
+        rows with a missing value (except SNOWDEPTH) or an unreadable date
+        are skipped.
         """
-        obs = csv.DictReader(csv_file, delimiter=delimiter, quotechar='"')
-        for i, d in enumerate(obs):
-            try:
-                day = None
-                day = csvdate_to_date(d.pop("DAY"), self.dateformat)
-                row = {"DAY":  day}
-                for label in self.obs_conversions.keys():
-                    func = self.obs_conversions[label]
-                    value = float(d[label])
-                    r = func(value, day)
-                    if math.isnan(r):
-                        if label == "SNOWDEPTH":
-                            continue
-                        raise ParseError
-                    row[label] = r
-
-                # Reference ET in mm/day
-                e0, es0, et0 = reference_ET(LAT=self.latitude, ELEV=self.elevation,
-                                            ANGSTA=self.angstA, ANGSTB=self.angstB,
-                                            ETMODEL=self.ETmodel, **row)
-                # convert to cm/day
-                row["E0"] = e0/10.
-                row["ES0"] = es0/10.
-                row["ET0"] = et0/10.
-
-                wdc = WeatherDataContainer(LAT=self.latitude, LON=self.longitude, ELEV=self.elevation, **row)
-                self._store_WeatherDataContainer(wdc, day)
-            except (ParseError, KeyError):
-                msg = "Failed reading element '%s' for day '%s' at line %i. Skipping ..." % (label, day, i)
-                self.logger.warn(msg)
-            except ValueError as e:  # strange value in cell
-                msg = "Failed computing a value for day '%s' at row %i" % (day, i)
-                self.logger.warn(msg)
+        df = pd.read_csv(csv_file, delimiter=delimiter, quotechar='"',
+                         dtype={"DAY": str}, skipinitialspace=True)
+        missing = [label for label in ["DAY"] + list(self.obs_conversions)
+                   if label not in df.columns and label != "SNOWDEPTH"]
+        if missing:
+            msg = "Missing columns %s in weather file %s" % (missing, self.fp_csv_fname)
+            self.logger.warning(msg)
+            return
+
+        days = pd.to_datetime(df["DAY"].str.strip(), format=self.dateformat,
+                              errors="coerce").values.astype("datetime64[D]")
+        columns = {"DAY": days}
+        for label, func in self.obs_conversions.items():
+            if label not in df.columns:
+                columns[label] = np.full(len(df), np.nan)
+                continue
+            values = pd.to_numeric(df[label], errors="coerce").values.astype(float)
+            if func in array_conversions:
+                columns[label] = array_conversions[func](values)
+            else:
+                columns[label] = np.array([func(v, d) if np.isfinite(v) else np.nan
+                                           for v, d in zip(values, days.astype(object))])
+
+        valid = ~np.isnat(days)
+        for label in self.obs_conversions:
+            if label != "SNOWDEPTH":
+                valid &= np.isfinite(columns[label])
+
+        # Reference ET in mm/day for all rows at once
+        with np.errstate(invalid="ignore", divide="ignore"):
+            e0, es0, et0 = reference_ET(LAT=self.latitude, ELEV=self.elevation,
+                                        ANGSTA=self.angstA, ANGSTB=self.angstB,
+                                        ETMODEL=self.ETmodel,
+                                        **{label: columns[label] for label in
+                                           ["DAY", "TMIN", "TMAX", "IRRAD", "VAP", "WIND"]})
+        et_valid = np.isfinite(e0) & np.isfinite(es0) & np.isfinite(et0)
+        for i in np.flatnonzero(~valid):
+            msg = "Failed reading weather for day '%s' at row %i. Skipping ..." % (days[i], i)
+            self.logger.warning(msg)
+        for i in np.flatnonzero(valid & ~et_valid):
+            msg = "Failed computing a value for day '%s'" % days[i]
+            self.logger.warning(msg)
+        valid &= et_valid
+
+        # convert to cm/day
+        columns["E0"] = e0/10.
+        columns["ES0"] = es0/10.
+        columns["ET0"] = et0/10.
+        columns = {label: values[valid] for label, values in columns.items()}
+        self.store = ColumnarWeatherStore(columns, LAT=self.latitude, LON=self.longitude,
+                                          ELEV=self.elevation)
+
+    def _dump(self, cache_fname):
+        """Writes the columns and site description to an npz cache file"""
+        columns = self.store.columns if isinstance(self.store, ColumnarWeatherStore) else {}
+        with open(cache_fname, "wb") as fp:
+            np.savez(fp, elevation=self.elevation, longitude=self.longitude,
+                     latitude=self.latitude, angstA=self.angstA, angstB=self.angstB,
+                     description=np.array(self.description, dtype=str),
+                     ETmodel=self.ETmodel, **columns)
+
+    def _load(self, cache_fname):
+        """Reads the columns written by _dump, no objects are unpickled"""
+        with np.load(cache_fname, allow_pickle=False) as cache:
+            if str(cache["ETmodel"]) != self.ETmodel:
+                msg = "Mismatch in reference ET from cache file."
+                raise PCSEError(msg)
+            self.elevation = float(cache["elevation"])
+            self.longitude = float(cache["longitude"])
+            self.latitude = float(cache["latitude"])
+            self.angstA = float(cache["angstA"])
+            self.angstB = float(cache["angstB"])
+            self.description = cache["description"].tolist()
+            columns = {label: cache[label] for label in ColumnarWeatherStore.labels
+                       if label in cache.files}
+        if "DAY" in columns:
+            self.store = ColumnarWeatherStore(columns, LAT=self.latitude, LON=self.longitude,
+                                              ELEV=self.elevation)
 
     def _load_cache_file(self, csv_fname):
 
@@ -254,7 +349,7 @@ class CSVWeatherDataProvider(WeatherDataProvider):
         basename = os.path.basename(csv_fname)
         filename, ext = os.path.splitext(basename)
 
-        tmp = "%s_%s.cache" % (self.__class__.__name__, filename)
+        tmp = "%s_%s.npz" % (self.__class__.__name__, filename)
         cache_filename = os.path.join(settings.METEO_CACHE_DIR, tmp)
         return cache_filename
 
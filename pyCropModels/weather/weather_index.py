@@ -0,0 +1,159 @@
+"""
+Persistent index of the CSV weather database
+
+The coordinates of the NASA_weather_latitude_<lat>_longitude_<lon>.csv files
+of a directory are kept in a sidecar npz next to the directory, so nearest
+weather lookups do not list and parse the directory on every call.
+"""
+import os
+import logging
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from scipy import spatial
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = ".index.npz"
+
+
+def weather_filename(latitude: float, longitude: float) -> str:
+    """Name of the CSV weather file of a point"""
+    return f"NASA_weather_latitude_{latitude}_longitude_{longitude}.csv"
+
+
+def parse_weather_filename(name: str) -> Optional[tuple]:
+    """(latitude, longitude) of a CSV weather file name, None for other files"""
+    parts = os.path.splitext(name)[0].split("_")
+    if len(parts) != 6 or parts[2] != "latitude" or parts[4] != "longitude":
+        return None
+    try:
+        return float(parts[3]), float(parts[5])
+    except ValueError:
+        return None
+
+
+class WeatherIndex:
+    """Coordinates of the weather files of a directory with a KDTree on top
+
+    The sidecar stores the modification time of the directory. When it has
+    changed since, only the files added or removed in between are parsed.
+
+    Args:
+        path_CSV_dir (str): directory of the CSV weather files
+        sidecar (str, optional): index file, defaults to
+            <path_CSV_dir>.index.npz
+    """
+
+    def __init__(self, path_CSV_dir: str, sidecar: Optional[str] = None) -> None:
+        self.path_CSV_dir = path_CSV_dir
+        self.sidecar = sidecar or os.path.normpath(path_CSV_dir) + SIDECAR_SUFFIX
+        self.files = np.array([], dtype=str)
+        self.coords = np.empty((0, 2))
+        self.dir_mtime_ns = -1
+        self._tree = None
+        if os.path.exists(self.sidecar):
+            self._load()
+        self.refresh()
+
+    def _load(self):
+        with np.load(self.sidecar) as index:
+            self.files = index["files"]
+            self.coords = index["coords"]
+            self.dir_mtime_ns = int(index["dir_mtime_ns"])
+
+    def save(self):
+        """Write the index to the sidecar"""
+        tmp_path = self.sidecar + ".tmp.npz"
+        np.savez(
+            tmp_path,
+            files=self.files,
+            coords=self.coords,
+            dir_mtime_ns=self.dir_mtime_ns,
+        )
+        os.replace(tmp_path, self.sidecar)
+
+    def refresh(self) -> bool:
+        """Sync the index with the directory if it changed
+
+        Returns:
+            bool: True if the index was updated
+        """
+        if not os.path.isdir(self.path_CSV_dir):
+            return False
+        dir_mtime_ns = os.stat(self.path_CSV_dir).st_mtime_ns
+        if dir_mtime_ns == self.dir_mtime_ns:
+            return False
+        names = set(os.listdir(self.path_CSV_dir))
+        keep = np.array([name in names for name in self.files], dtype=bool)
+        known = set(self.files.tolist())
+        new_files, new_coords = [], []
+        for name in sorted(names - known):
+            coords = parse_weather_filename(name)
+            if coords is not None:
+                new_files.append(name)
+                new_coords.append(coords)
+        msg = "Weather index of %s: %i files added, %i removed" % (
+            self.path_CSV_dir,
+            len(new_files),
+            int((~keep).sum()),
+        )
+        logger.info(msg)
+        self._set(
+            np.concatenate([self.files[keep], np.array(new_files, dtype=str)]),
+            np.concatenate([self.coords[keep], np.reshape(new_coords, (-1, 2))]),
+        )
+        self.dir_mtime_ns = dir_mtime_ns
+        self.save()
+        return True
+
+    def _set(self, files: np.ndarray, coords: np.ndarray):
+        self.files = files.astype(str)
+        self.coords = coords.astype(float)
+        self._tree = None
+
+    @property
+    def tree(self) -> spatial.cKDTree:
+        """KDTree of the (latitude, longitude) of the files"""
+        if self._tree is None:
+            self._tree = spatial.cKDTree(self.coords)
+        return self._tree
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def query(self, latitude, longitude, k: int = 1) -> tuple:
+        """k nearest weather files of many points
+
+        Args:
+            latitude: array of N latitudes
+            longitude: array of N longitudes
+            k (int, optional): number of neighbours
+
+        Returns:
+            tuple: (distance, path), arrays of shape (N, k) with distances
+                in degrees and paths of the weather files
+        """
+        if not len(self):
+            msg = "No weather files in %s" % self.path_CSV_dir
+            raise FileNotFoundError(msg)
+        points = np.column_stack(
+            [np.atleast_1d(latitude), np.atleast_1d(longitude)]
+        ).astype(float)
+        k = min(k, len(self))
+        distance, position = self.tree.query(points, k=k)
+        distance = np.reshape(distance, (len(points), k))
+        position = np.reshape(position, (len(points), k))
+        paths = np.char.add(self.path_CSV_dir + os.sep, self.files[position])
+        return distance, paths
+
+    def nearest(self, latitude: float, longitude: float) -> str:
+        """Path of the weather file closest to one point"""
+        return str(self.query([latitude], [longitude], k=1)[1][0, 0])
+
+
+@lru_cache(maxsize=None)
+def get_weather_index(path_CSV_dir: str) -> WeatherIndex:
+    """Index of a weather directory, loaded once per process"""
+    return WeatherIndex(os.path.abspath(path_CSV_dir))
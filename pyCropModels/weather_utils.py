@@ -31,7 +31,10 @@ import time
 
 import numpy as np
 import pandas as pd
-from functools import lru_cache
+from typing import Optional
+
+from pyCropModels.weather.power_client import PowerClient, default_power_client
+from pyCropModels.weather.cell_weather import CellWeather
 
 
 import datetime as dt 
@@ -90,30 +93,26 @@ def kPa_to_hPa(x, d):
 
 
 
-@lru_cache(maxsize=128)
-def query_NASAPower_server(latitude, longitude):
-    start_date = dt.date(2019,1,1)
-    end_date = dt.date(2021,1,1)
-
-    server = "https://power.larc.nasa.gov/api/temporal/daily/point"
-    payload = {"request": "execute",
-                "parameters": ",".join(power_variables),
-                "latitude": latitude,
-                "longitude": longitude,
-                "start": start_date.strftime("%Y%m%d"),
-                "end": end_date.strftime("%Y%m%d"),
-                "community": "AG",
-                "format": "JSON",
-                "user": "anonymous"
-                }
-    req = requests.get(server, params=payload)
+def query_NASAPower_server(latitude, longitude,
+                           start_date=dt.date(2019,1,1),
+                           end_date=dt.date(2021,1,1),
+                           parameters=None,
+                           client: Optional[PowerClient] = None):
+    """Daily NASA POWER JSON of a point, served from the on-disk cache of
+    the shared PowerClient (see default_power_client)"""
+    client = client or default_power_client()
+    return client.fetch(latitude, longitude, start_date, end_date,
+                        parameters=parameters or power_variables)
 
-    if req.status_code != 200:
-        msg = ("Failed retrieving POWER data, server returned HTTP " +
-                "code: %i on following URL %s") % (req.status_code, req.url)
-        raise ValueError(msg)
 
-    return req.json()
+def query_NASAPower_points(points, start_date=dt.date(2019,1,1),
+                           end_date=dt.date(2021,1,1), parameters=None,
+                           client: Optional[PowerClient] = None):
+    """Daily NASA POWER JSON of many (latitude, longitude) points, fetched
+    concurrently"""
+    client = client or default_power_client()
+    return client.fetch_many(points, start_date, end_date,
+                             parameters=parameters or power_variables)
 
 
 
@@ -134,7 +133,8 @@ class NASA_MONICA:
           "TEMP": (-50., 60.),
           "TMINRA": (-50., 60.)}
 
-    def __init__(self, latitude, longitude):
+    def __init__(self, latitude, longitude,
+                 start_date=dt.date(2019,1,1), end_date=dt.date(2021,1,1)):
         if latitude < -90 or latitude > 90:
             msg = "Latitude should be between -90 and 90 degrees."
             raise ValueError(msg)
@@ -152,6 +152,8 @@ class NASA_MONICA:
 
         self.latitude = latitude
         self.longitude = longitude
+        self.start_date = start_date
+        self.end_date = end_date
 
         self.power_variables = ["TOA_SW_DWN", "ALLSKY_SFC_SW_DWN", "T2M", "T2M_MIN",
                             "T2M_MAX", "T2MDEW", "WS2M", "PRECTOTCORR", 'RH2M']
@@ -160,7 +162,7 @@ class NASA_MONICA:
     def _get_and_process_NASAPower(self, latitude, longitude):
             """Handles the retrieval and processing of the NASA Power data
             """
-            powerdata = query_NASAPower_server(latitude, longitude)
+            powerdata = self._query_NASAPower_server(latitude, longitude)
             if not powerdata:
                 msg = "Failure retrieving POWER data from server. This can be a connection problem with " \
                     "the NASA POWER server, retry again later."
@@ -171,72 +173,33 @@ class NASA_MONICA:
             self.elevation = float(powerdata["geometry"]["coordinates"][2])
             
             
-            df_power = self._process_POWER_records(powerdata)
-#             self.angstA, self.angstB = self._estimate_AngstAB(df_power)
-            df_monica = self._POWER_to_PCSE(df_power)
+            weather = self._process_POWER_records(powerdata)
+#             self.angstA, self.angstB = self._estimate_AngstAB(weather)
+            df_monica = self._POWER_to_PCSE(weather)
             self.df_monica = df_monica
             return df_monica
         
-    @lru_cache(maxsize=128)
     def _query_NASAPower_server(self, latitude, longitude):
-        start_date = dt.date(2019,1,1)
-        end_date = dt.date(2021,1,1)
-        # build URL for retrieving data, using new NASA POWER api
-        server = "https://power.larc.nasa.gov/api/temporal/daily/point"
-        payload = {"request": "execute",
-                    "parameters": ",".join(self.power_variables),
-                    "latitude": latitude,
-                    "longitude": longitude,
-                    "start": start_date.strftime("%Y%m%d"),
-                    "end": end_date.strftime("%Y%m%d"),
-                    "community": "AG",
-                    "format": "JSON",
-                    "user": "anonymous"
-                    }
-        req = requests.get(server, params=payload)
-
-        if req.status_code != self.HTTP_OK:
-            msg = ("Failed retrieving POWER data, server returned HTTP " +
-                    "code: %i on following URL %s") % (req.status_code, req.url)
-            raise ValueError(msg)
-
-        return req.json()
+        return query_NASAPower_server(latitude, longitude,
+                                      start_date=self.start_date,
+                                      end_date=self.end_date,
+                                      parameters=self.power_variables)
 
     def _process_POWER_records(self, powerdata):
         """Process the meteorological records returned by NASA POWER
-        """
-
 
-        fill_value = float(powerdata["header"]["fill_value"])
-
-        df_power = {}
-        for varname in self.power_variables:
-            s = pd.Series(powerdata["properties"]["parameter"][varname])
-            s[s == fill_value] = np.NaN
-            df_power[varname] = s
-        df_power = pd.DataFrame(df_power)
-        df_power["DAY"] = pd.to_datetime(df_power.index, format="%Y%m%d")
-
-        # find all rows with one or more missing values (NaN)
-        ix = df_power.isnull().any(axis=1)
-        # Get all rows without missing values
-        df_power = df_power[~ix]
-
-        return df_power
+        :return: CellWeather of the days without missing values
+        """
+        weather = CellWeather.from_power_json(powerdata,
+                                              latitude=self.latitude,
+                                              longitude=self.longitude)
+        return weather.complete(fill=False)
     
-    def _POWER_to_PCSE(self, df_power):
-
-            # Convert POWER data to a dataframe with PCSE compatible inputs
-            df_pcse = pd.DataFrame({"de-date": df_power.DAY.apply(self.to_date),
-                                    "tavg": df_power.T2M,
-                                    "tmin": df_power.T2M_MIN,
-                                    "tmax": df_power.T2M_MAX,
-                                    "wind": df_power.WS2M,
-                                    "globrad": df_power.ALLSKY_SFC_SW_DWN,
-                                    "precip": df_power.PRECTOTCORR,
-                                    "relhumid": df_power.RH2M})
-            df_pcse.loc[:, 'de-date'] = df_pcse.loc[:, 'de-date'].apply(lambda x: csvdate_to_date(x, '%Y-%m-%d'))
-            self.df_pcse = df_pcse.reset_index(drop=True)
+    def _POWER_to_PCSE(self, weather):
+
+            # MONICA climate columns, a projection of the canonical weather
+            df_pcse = weather.to_monica()
+            self.df_pcse = df_pcse
             return df_pcse
         
 
@@ -265,7 +228,7 @@ class NASA_DSSAT(NASA_MONICA):
     
     def get_dssat_weather(self, longitude:float, latitude:float):
         
-        powerdata = query_NASAPower_server(latitude, longitude)
+        powerdata = self._query_NASAPower_server(latitude, longitude)
         if not powerdata:
             msg = "Failure retrieving POWER data from server. This can be a connection problem with " \
                 "the NASA POWER server, retry again later."
@@ -276,24 +239,9 @@ class NASA_DSSAT(NASA_MONICA):
         self.elevation = float(powerdata["geometry"]["coordinates"][2])
 
 
-        df_power = self._process_POWER_records(powerdata)
-
-        df_dssat = pd.DataFrame(
-            {
-                "DATE": df_power.DAY.apply(self.to_date),
-                "TMEAN": df_power.T2M,
-                "TMIN": df_power.T2M_MIN,
-                "TMAX": df_power.T2M_MAX,
-                "WIND": df_power.WS2M,
-                "RAD": df_power.ALLSKY_SFC_SW_DWN,
-                "RAIN": df_power.PRECTOTCORR,
-                "DEWP": df_power.T2MDEW,
-                "RHUM": df_power.RH2M,
-            }
-        )
-        df_dssat.loc[:, "DATE"] = df_dssat.loc[:, "DATE"].apply(
-            lambda x: self.csvdate_to_date(x, "%Y-%m-%d")
-        )
+        weather = self._process_POWER_records(powerdata)
+        # WIND in km/day as in DSSATModel, the other columns keep their units
+        df_dssat = weather.to_dssat()
         self.df_dssat = df_dssat.reset_index(drop=True)
         return df_dssat
 
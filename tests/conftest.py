@@ -0,0 +1,153 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+
+import pcse
+from pcse.fileinput import CABOFileReader
+
+import pyCropModels
+from pyCropModels.models.monica_worker import MonicaWorkerPool
+
+ROOT = os.path.dirname(os.path.abspath(list(pyCropModels.__path__)[0]))
+
+
+def _cube(rng, time, lat, lon, low, high):
+    return (
+        ("time", "lat", "lon"),
+        rng.uniform(low, high, (len(time), len(lat), len(lon))),
+    )
+
+
+def _power_products(time, seasonal=False):
+    rng = np.random.default_rng(7)
+    lat = np.array([50.0, 50.5, 51.0])
+    lon = np.array([36.875, 37.5, 38.125, 38.75])
+    tmin = _cube(rng, time, lat, lon, 265.0, 280.0)
+    if seasonal:
+        # cold winters and warm summers, so crop models finish a season
+        doy = time.dayofyear.values[:, None, None]
+        tmin = (tmin[0], tmin[1] + 12.0 + 12.0 * np.sin((doy - 105) / 365 * 2 * np.pi))
+    meteo = xr.Dataset(
+        {
+            "T2M_MIN": tmin,
+            "T2M_MAX": (tmin[0], tmin[1] + rng.uniform(3, 12, tmin[1].shape)),
+            "T2M": (tmin[0], tmin[1] + 2.0),
+            "T2MDEW": (tmin[0], tmin[1] - 1.0),
+            "WS2M": _cube(rng, time, lat, lon, 0.5, 8.0),
+            "PRECTOTCORR": _cube(rng, time, lat, lon, 0.0, 1e-4),
+            "RH2M": _cube(rng, time, lat, lon, 40.0, 100.0),
+        },
+        coords={"time": time, "lat": lat, "lon": lon},
+    )
+    solar_lat = np.array([49.6, 50.6, 51.6])
+    solar_lon = np.array([36.6, 37.6, 38.6, 39.6])
+    solar = xr.Dataset(
+        {
+            "ALLSKY_SFC_SW_DWN": _cube(rng, time, solar_lat, solar_lon, 20.0, 250.0),
+            "TOA_SW_DWN": _cube(rng, time, solar_lat, solar_lon, 250.0, 400.0),
+        },
+        coords={"time": time, "lat": solar_lat, "lon": solar_lon},
+    )
+    return {"meteo": meteo, "solar": solar}
+
+
+@pytest.fixture
+def power_weather():
+    """Small AWS NASA POWER like products in their units: K, kg/m2/s, m/s,
+    % and W/m2, the solar product on its own coarser grid"""
+    return _power_products(pd.date_range("2021-03-01", periods=40))
+
+
+@pytest.fixture
+def season_weather():
+    """power_weather of the whole of 2021 with a seasonal temperature cycle"""
+    return _power_products(pd.date_range("2021-01-01", "2021-12-31"), seasonal=True)
+
+
+@pytest.fixture
+def wofost_crop():
+    """Crop parameters shipped with the pcse tests, YAMLCropDataProvider
+    downloads its crops"""
+    path = os.path.join(os.path.dirname(pcse.__file__), "tests", "test_data")
+    return CABOFileReader(os.path.join(path, "wofost_npk.crop"))
+
+
+@pytest.fixture
+def wheat_calendar():
+    """Coarse calendar with descending latitudes, as the source files"""
+    return xr.Dataset(
+        {
+            "plant": (
+                ("latitude", "longitude"),
+                [[120.0, 60.0, np.nan], [100.0, 110.0, 130.0], [90.0, 95.0, 105.0]],
+            ),
+            "harvest": (
+                ("latitude", "longitude"),
+                [[220.0, 280.0, 200.0], [210.0, 230.0, 240.0], [200.0, 205.0, 215.0]],
+            ),
+        },
+        coords={"latitude": [51.25, 50.75, 50.25], "longitude": [37.0, 38.0, 39.0]},
+    )
+
+
+@pytest.fixture
+def power_store(tmp_path):
+    """file:// directory of zarr products laid out as the AWS NASA POWER
+    store, 2021-03-01 to 2021-04-29"""
+    rng = np.random.default_rng(11)
+    time = pd.date_range("2021-03-01", periods=60)
+    lat = np.arange(48.0, 53.01, 0.5)
+    lon = np.arange(35.0, 41.26, 0.625)
+    tmin = _cube(rng, time, lat, lon, 265.0, 280.0)
+    meteo = xr.Dataset(
+        {
+            "T2M_MIN": tmin,
+            "T2M_MAX": (tmin[0], tmin[1] + rng.uniform(3, 12, tmin[1].shape)),
+            "T2M": (tmin[0], tmin[1] + 2.0),
+            "T2MDEW": (tmin[0], tmin[1] - 1.0),
+            "WS2M": _cube(rng, time, lat, lon, 0.5, 8.0),
+            "PRECTOTCORR": _cube(rng, time, lat, lon, 0.0, 1e-4),
+            "RH2M": _cube(rng, time, lat, lon, 40.0, 100.0),
+        },
+        coords={"time": time, "lat": lat, "lon": lon},
+    )
+    solar_lat = np.arange(47.5, 54.0, 1.0)
+    solar_lon = np.arange(34.5, 42.0, 1.0)
+    solar = xr.Dataset(
+        {
+            "ALLSKY_SFC_SW_DWN": _cube(rng, time, solar_lat, solar_lon, 20.0, 250.0),
+            "TOA_SW_DWN": _cube(rng, time, solar_lat, solar_lon, 250.0, 400.0),
+        },
+        coords={"time": time, "lat": solar_lat, "lon": solar_lon},
+    )
+    store = tmp_path / "power"
+    axes = {
+        "lat": {"standard_name": "latitude", "units": "degrees_north", "axis": "Y"},
+        "lon": {"standard_name": "longitude", "units": "degrees_east", "axis": "X"},
+    }
+    for name, ds in [
+        ("power_901_daily_meteorology_lst.zarr", meteo),
+        ("power_901_daily_radiation_lst.zarr", solar),
+    ]:
+        for dim, attrs in axes.items():
+            ds[dim].attrs.update(attrs)
+        encoding = {var: {"chunks": (20, 4, 4)} for var in ds.data_vars}
+        ds.astype("float32").to_zarr(store / name, encoding=encoding, consolidated=True)
+    return "file://" + str(store)
+
+
+@pytest.fixture
+def worker_env(monkeypatch):
+    """Worker processes import this checkout of pyCropModels"""
+    monkeypatch.setenv("PYTHONPATH", ROOT)
+
+
+@pytest.fixture
+def stand_in_workers(worker_env):
+    worker_cmd = [sys.executable, "-m", "pyCropModels.models.monica_worker"]
+    with MonicaWorkerPool(size=2, worker_cmd=worker_cmd + ["--stand-in"]) as workers:
+        yield workers
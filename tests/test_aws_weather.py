@@ -0,0 +1,137 @@
+import datetime as dt
+
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import Point
+
+from pyCropModels.models import grid
+from pyCropModels.models.grid import GridRunner, run_tiled
+from pyCropModels.weather.aws_weather import (
+    Aws_Wofost,
+    AwsNasaPower,
+    weather_reference_et,
+)
+from pyCropModels.weather.cell_weather import shared_cell_weather
+
+
+class RadiationModel:
+    """Stand-in crop model, the radiation sum of the cell"""
+
+    def __init__(self, weather):
+        self.cell_weather = shared_cell_weather(weather)
+
+    def compute(self, lat, lon, **kwargs):
+        return self.cell_weather.get(lon=lon, lat=lat).RAD.sum()
+
+
+@pytest.fixture
+def radiation_model(monkeypatch):
+    monkeypatch.setattr(
+        grid, "make_model", lambda model, weather, **kwargs: RadiationModel(weather)
+    )
+
+
+@pytest.fixture
+def power(power_store):
+    region = gpd.GeoDataFrame(geometry=[Point(38.1, 50.6).buffer(1.6)])
+    return AwsNasaPower(gdf=region, store_url=power_store)
+
+
+def test_download_keeps_the_solar_cells_around_the_region(power):
+    weather = power.download(time_start="2021-03-01", time_end="2021-03-10")
+    meteo, solar = weather["meteo"], weather["solar"]
+    assert meteo.sizes["time"] == solar.sizes["time"] == 10
+    # the region polygon masks the meteorology, not the coarse radiation
+    assert meteo.T2M.isnull().any()
+    assert not solar.ALLSKY_SFC_SW_DWN.isnull().any()
+    minx, miny, maxx, maxy = power.gdf.total_bounds
+    assert solar.lat.min() < miny and solar.lat.max() > maxy
+    assert solar.lon.min() < minx and solar.lon.max() > maxx
+
+
+def test_run_tiled_matches_the_whole_region(power, radiation_model):
+    kwargs = {
+        "model": "monica",
+        "crop": "wheat",
+        "crop_variety": "winter-wheat",
+        "sowing": "2021-03-01",
+        "harvest": "2021-03-10",
+        "time_start": "2021-03-01",
+        "time_end": "2021-03-10",
+        "max_workers": 1,
+    }
+    tiled = run_tiled(power, memory_budget_mb=0.003, **kwargs)
+    assert len(power.tiles("2021-03-01", "2021-03-10", memory_budget_mb=0.003)) > 4
+
+    weather = power.download(time_start="2021-03-01", time_end="2021-03-10")
+    runner = GridRunner(
+        weather=weather,
+        gdf=power.gdf,
+        **{k: kwargs[k] for k in ["model", "crop", "crop_variety", "max_workers"]},
+    )
+    whole = runner.run(sowing=kwargs["sowing"], harvest=kwargs["harvest"])
+    whole = whole.dropna("lat", how="all").dropna("lon", how="all")
+    tiled = tiled.reindex_like(whole)
+    np.testing.assert_allclose(tiled["yield"].values, whole["yield"].values)
+    assert np.isfinite(whole["yield"].values).sum() == len(runner.cells) > 20
+
+
+class FlatElevation:
+    def __call__(self, longitude, latitude):
+        return 150.0
+
+    def lookup(self, longitude, latitude):
+        return np.full(len(longitude), 150.0)
+
+
+@pytest.fixture
+def clear_sky_weather(season_weather):
+    """season_weather with Angstrom A/B that pass check_angstromAB"""
+    solar = season_weather["solar"].copy(deep=True)
+    rng = np.random.default_rng(3)
+    solar["ALLSKY_SFC_SW_DWN"] = solar.TOA_SW_DWN * rng.uniform(
+        0.25, 0.75, solar.TOA_SW_DWN.shape
+    )
+    return {"meteo": season_weather["meteo"], "solar": solar}
+
+
+def test_provider_slices_the_reference_et_cube(clear_sky_weather):
+    weather = clear_sky_weather
+    ds_et = weather_reference_et(weather, elevation_provider=FlatElevation())
+    assert ds_et.ET0.dims == ("time", "lat", "lon")
+    for lon, lat in [(37.5, 50.5), (38.75, 51.0), (36.875, 50.0)]:
+        kwargs = {
+            "latitude": lat,
+            "longitude": lon,
+            "ds_weather": weather["meteo"],
+            "ds_solar": weather["solar"],
+            "elevation_provider": FlatElevation(),
+        }
+        sliced = Aws_Wofost(ds_et=ds_et, **kwargs)
+        computed = Aws_Wofost(**kwargs)
+        assert 0.2 < sliced.angstA < 0.35
+        assert (sliced.angstA, sliced.angstB) == pytest.approx(
+            (computed.angstA, computed.angstB), rel=1e-6
+        )
+        assert sliced.elevation == computed.elevation == 150.0
+        for day in [dt.date(2021, 1, 15), dt.date(2021, 6, 21), dt.date(2021, 12, 31)]:
+            for name in ["E0", "ES0", "ET0"]:
+                assert getattr(sliced(day), name) == pytest.approx(
+                    getattr(computed(day), name), rel=1e-5, abs=1e-9
+                )
+
+
+def test_provider_rejects_a_reference_et_of_other_weather(
+    clear_sky_weather, power_weather
+):
+    ds_et = weather_reference_et(power_weather, elevation_provider=FlatElevation())
+    with pytest.raises(ValueError, match="time"):
+        Aws_Wofost(
+            latitude=50.5,
+            longitude=37.5,
+            ds_weather=clear_sky_weather["meteo"],
+            ds_solar=clear_sky_weather["solar"],
+            ds_et=ds_et,
+            elevation_provider=FlatElevation(),
+        )
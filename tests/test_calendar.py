@@ -0,0 +1,81 @@
+import datetime as dt
+import math
+
+import numpy as np
+import pytest
+import xarray as xr
+
+from pyCropModels.agrotechnology.calendar import Agrotechnology, calendar_dates
+
+
+def scalar_crop_calendar(dataset, lon, lat, year):
+    """getCropCalendar as it was before calendar_dates"""
+    point = dataset.sel(latitude=lat, longitude=lon, method="nearest")
+    harvest_flt = float(point.harvest.values)
+    plant_flt = float(point.plant.values)
+    if math.isnan(harvest_flt) or math.isnan(plant_flt):
+        return {"plant_day": "NaN", "harvest_day": "NaN"}
+    harvest_day = str(
+        dt.datetime.strptime(f"{year} {int(harvest_flt)}", "%Y %j").date()
+    )
+    plant_day = str(dt.datetime.strptime(f"{year} {int(plant_flt)}", "%Y %j").date())
+    if harvest_day > f"{year}-09-30":
+        harvest_day = f"{year}-09-29"
+    if plant_day < f"{year}-04-22":
+        plant_day = f"{year}-04-22"
+    return {"plant_day": plant_day, "harvest_day": harvest_day}
+
+
+def test_calendar_dates(wheat_calendar):
+    dates = calendar_dates(
+        wheat_calendar, lon=[37.1, 37.9, 39.2], lat=[51.3, 51.2, 51.1], year=2021
+    )
+    assert dates["valid"].tolist() == [True, True, False]
+    # doy 120 and 220 of 2021
+    assert dates["plant_day"][0] == np.datetime64("2021-04-30")
+    assert dates["harvest_day"][0] == np.datetime64("2021-08-08")
+    # early sowing and late harvest are clamped into the season
+    assert dates["plant_day"][1] == np.datetime64("2021-04-22")
+    assert dates["harvest_day"][1] == np.datetime64("2021-09-29")
+    assert np.isnat(dates["plant_day"][2]) and np.isnat(dates["harvest_day"][2])
+
+
+def test_calendar_dates_of_leap_year(wheat_calendar):
+    dates = calendar_dates(wheat_calendar, lon=37.0, lat=51.25, year="2020")
+    assert dates["plant_day"][0] == np.datetime64("2020-04-29")
+
+
+@pytest.mark.parametrize("year", ["2020", "2021"])
+def test_calendar_dates_match_the_scalar_lookup(year):
+    rng = np.random.default_rng(18)
+    lat = np.arange(55.25, 44.0, -0.5)
+    lon = np.arange(30.25, 45.0, 0.5)
+    shape = (len(lat), len(lon))
+    plant = rng.uniform(1.0, 200.0, shape)
+    harvest = rng.uniform(150.0, 365.0, shape)
+    plant[rng.random(shape) < 0.1] = np.nan
+    harvest[rng.random(shape) < 0.1] = np.nan
+    dataset = xr.Dataset(
+        {
+            "plant": (("latitude", "longitude"), plant),
+            "harvest": (("latitude", "longitude"), harvest),
+        },
+        coords={"latitude": lat, "longitude": lon},
+    )
+    # points off the midpoints between cells, where nearest is ambiguous
+    point_lat = rng.choice(lat, 300) + rng.uniform(-0.24, 0.24, 300)
+    point_lon = rng.choice(lon, 300) + rng.uniform(-0.24, 0.24, 300)
+
+    dates = calendar_dates(dataset, lon=point_lon, lat=point_lat, year=year)
+    # the wrapper keeps the scalar interface
+    agrotechnology = Agrotechnology()
+    assert not dates["valid"].all() and dates["valid"].any()
+    for i, (x, y) in enumerate(zip(point_lon, point_lat)):
+        expected = scalar_crop_calendar(dataset, lon=x, lat=y, year=year)
+        assert agrotechnology.getCropCalendar(dataset, x, y, year) == expected
+        if dates["valid"][i]:
+            assert str(dates["plant_day"][i]) == expected["plant_day"]
+            assert str(dates["harvest_day"][i]) == expected["harvest_day"]
+        else:
+            assert expected == {"plant_day": "NaN", "harvest_day": "NaN"}
+            assert np.isnat(dates["plant_day"][i]) and np.isnat(dates["harvest_day"][i])
@@ -0,0 +1,104 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from pyCropModels.agrotechnology.calendar import Agrotechnology, calendar_dates
+from pyCropModels.agrotechnology.calendar_index import CalendarGridIndex
+from pyCropModels.models.grid import GridRunner
+
+
+@pytest.fixture
+def agrotechnology(tmp_path, wheat_calendar):
+    agrotechnology = Agrotechnology(pathCalendar=str(tmp_path))
+    wheat_calendar.to_netcdf(tmp_path / agrotechnology.dictCalendars["wheat"])
+    return agrotechnology
+
+
+def test_build_save_load(agrotechnology, wheat_calendar, power_weather, tmp_path):
+    meteo = power_weather["meteo"]
+    index = CalendarGridIndex.build(
+        agrotechnology, lat=meteo.lat, lon=meteo.lon, crops=["wheat"], years=[2021]
+    )
+    lon_grid, lat_grid = np.meshgrid(meteo.lon.values, meteo.lat.values)
+    expected = calendar_dates(
+        wheat_calendar, lon=lon_grid.ravel(), lat=lat_grid.ravel(), year=2021
+    )
+    dates = index.dates("wheat", 2021)
+    for key in ["plant_day", "harvest_day", "valid"]:
+        np.testing.assert_array_equal(dates[key], expected[key])
+
+    path = str(tmp_path / "calendar_index.npz")
+    index.save(path)
+    loaded = CalendarGridIndex.load(path)
+    for key in ["plant_day", "harvest_day", "valid"]:
+        np.testing.assert_array_equal(loaded.dates("wheat", "2021")[key], dates[key])
+    np.testing.assert_array_equal(loaded.cells["wheat"], index.cells["wheat"])
+    with pytest.raises(KeyError):
+        loaded.dates("wheat", 2022)
+
+
+def test_cell_id_covers_and_on_grid(agrotechnology, power_weather):
+    meteo = power_weather["meteo"]
+    lat, lon = meteo.lat.values, meteo.lon.values
+    index = CalendarGridIndex.build(
+        agrotechnology, lat=lat, lon=lon, crops=["wheat"], years=[2021]
+    )
+    assert index.cell_id(lon=[lon[2], lon[0] + 0.1], lat=[lat[1], lat[2]]).tolist() == [
+        1 * len(lon) + 2,
+        2 * len(lon) + 0,
+    ]
+    assert index.covers(lat=lat, lon=lon, crops=["wheat"], years=["2021"])
+    assert not index.covers(lat=lat, lon=lon, crops=["wheat"], years=[2022])
+    assert not index.covers(lat=lat, lon=lon, crops=["maize"], years=[2021])
+    assert not index.covers(lat=lat[:2], lon=lon, crops=["wheat"], years=[2021])
+    assert index.on_grid(lon=[lon[1], lon[1] + 0.1, lon[3]], lat=lat[0]).tolist() == [
+        True,
+        False,
+        True,
+    ]
+
+
+def test_open_rebuilds_missing_years(agrotechnology, power_weather, tmp_path):
+    meteo = power_weather["meteo"]
+    path = str(tmp_path / "calendar_index.npz")
+    kwargs = {"lat": meteo.lat, "lon": meteo.lon, "crops": ["wheat"]}
+    CalendarGridIndex.open(path, agrotechnology, years=[2021], **kwargs)
+    index = CalendarGridIndex.open(path, agrotechnology, years=[2021, 2022], **kwargs)
+    assert index.covers(years=[2021, 2022], **kwargs)
+    assert CalendarGridIndex.load(path).covers(years=[2022], **kwargs)
+
+
+def test_grid_runner_skips_cells_off_the_index(agrotechnology, power_weather):
+    meteo = power_weather["meteo"]
+    runner = GridRunner(
+        weather=power_weather,
+        gdf=gpd.GeoDataFrame(geometry=[box(36.5, 49.5, 39.0, 51.5)]),
+        model="wofost",
+        crop="wheat",
+        crop_variety="Winter_wheat_101",
+    )
+    # index of the first two rows of the grid only, as for a tile
+    index = CalendarGridIndex.build(
+        agrotechnology,
+        lat=meteo.lat[:2],
+        lon=meteo.lon,
+        crops=["wheat"],
+        years=[2021],
+    )
+    sowing, harvest = runner.calendar_dates(index, year=2021)
+    on_index = runner.cells[:, 0] < 2
+    expected = index.dates(
+        "wheat",
+        2021,
+        cell_id=index.cell_id(
+            lon=runner.lon[runner.cells[:, 1]], lat=runner.lat[runner.cells[:, 0]]
+        ),
+    )
+    for i, cell_on_index in enumerate(on_index):
+        if cell_on_index and expected["valid"][i]:
+            assert sowing[i] == str(expected["plant_day"][i])
+            assert harvest[i] == str(expected["harvest_day"][i])
+        else:
+            assert sowing[i] is None and harvest[i] is None
+    assert (~on_index).any() and on_index.any()
@@ -0,0 +1,184 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyCropModels.models.dssat import DSSATModel
+from pyCropModels.models.monica import MONICA
+from pyCropModels.weather.cell_weather import CellWeather, CellWeatherCache
+from pyCropModels.weather.extract import PointExtractor
+from pyCropModels.weather.power_conversion import power_to_pcse
+
+
+@pytest.fixture
+def df_power(power_weather):
+    extractor = PointExtractor(power_weather["meteo"], power_weather["solar"])
+    values, _ = extractor.extract(longitude=[37.5], latitude=[50.5])
+    return extractor.to_frame(values[0])
+
+
+@pytest.fixture
+def weather(df_power):
+    return CellWeather.from_power(
+        df_power, day=df_power.DAY.values, latitude=50.5, longitude=37.5
+    )
+
+
+def test_to_pcse_matches_power_to_pcse(df_power, weather):
+    expected = power_to_pcse(df_power)
+    df = weather.to_pcse()
+    for name, values in expected.items():
+        np.testing.assert_allclose(df[name].values, np.asarray(values), rtol=1e-12)
+    assert df.DAY.tolist() == [day.date() for day in df_power.DAY]
+
+
+def test_to_dssat(df_power, weather):
+    pcse = power_to_pcse(df_power)
+    df = weather.to_dssat()
+    np.testing.assert_allclose(df.TMIN.values, pcse["TMIN"])
+    np.testing.assert_allclose(df.TMEAN.values, pcse["TEMP"])
+    np.testing.assert_allclose(df.WIND.values, df_power.WS2M.values * 86.4)
+    np.testing.assert_allclose(df.RAD.values, pcse["IRRAD"] / 1e6)
+    np.testing.assert_allclose(df.RAIN.values, pcse["RAIN"] * 10.0)
+    np.testing.assert_allclose(df.DEWP.values, df_power.T2MDEW.values - 273.15)
+    np.testing.assert_allclose(df.RHUM.values, df_power.RH2M.values)
+
+
+def test_to_monica(df_power, weather):
+    pcse = power_to_pcse(df_power)
+    df = weather.to_monica()
+    assert list(df.columns) == [
+        "de-date",
+        "tavg",
+        "tmin",
+        "tmax",
+        "wind",
+        "globrad",
+        "precip",
+        "relhumid",
+    ]
+    assert df["de-date"].iloc[0] == "01.03.2021"
+    np.testing.assert_allclose(df.tmax.values, pcse["TMAX"])
+    np.testing.assert_allclose(df.globrad.values, pcse["IRRAD"] / 1e6)
+    np.testing.assert_allclose(df.precip.values, pcse["RAIN"] * 10.0)
+
+
+def test_from_power_json():
+    powerdata = {
+        "header": {"fill_value": -999.0},
+        "properties": {
+            "parameter": {
+                "T2M": {"20210302": 3.0, "20210301": 2.0},
+                "PRECTOTCORR": {"20210301": -999.0, "20210302": 1.5},
+            }
+        },
+    }
+    weather = CellWeather.from_power_json(powerdata, latitude=50.0, longitude=37.0)
+    assert (
+        weather.day.tolist()
+        == pd.to_datetime(["2021-03-01", "2021-03-02"]).date.tolist()
+    )
+    np.testing.assert_array_equal(weather.TEMP, [2.0, 3.0])
+    np.testing.assert_array_equal(weather.RAIN, [np.nan, 1.5])
+    assert np.isnan(weather.TMIN).all()
+
+
+def test_complete():
+    day = np.arange("2021-03-01", "2021-03-05", dtype="datetime64[D]")
+    weather = CellWeather(
+        day,
+        latitude=50.0,
+        longitude=37.0,
+        TEMP=[np.nan, 1.0, np.nan, 3.0],
+        RAIN=[0.0, 0.0, 1.0, np.nan],
+    )
+    filled = weather.complete()
+    assert len(filled) == 3
+    np.testing.assert_array_equal(filled.TEMP, [1.0, 1.0, 3.0])
+    np.testing.assert_array_equal(filled.RAIN, [0.0, 1.0, 1.0])
+    assert len(weather.complete(fill=False)) == 1
+
+
+@pytest.fixture
+def gappy_weather(power_weather):
+    meteo = power_weather["meteo"].copy(deep=True)
+    meteo["T2M_MAX"][5:7, 1, 1] = np.nan
+    return CellWeatherCache(meteo, power_weather["solar"])
+
+
+def test_dssat_weather_fills_gaps(power_weather, gappy_weather):
+    model = DSSATModel(
+        power_weather["meteo"],
+        power_weather["solar"],
+        elevation_provider=lambda longitude, latitude: 150.0,
+        cell_weather=gappy_weather,
+    )
+    df = model.get_dssat_weather(longitude=37.5, latitude=50.5)
+    assert len(df) == 40 and not df.isna().any().any()
+    assert df.TMAX.iloc[5] == df.TMAX.iloc[6] == df.TMAX.iloc[4]
+
+
+def test_monica_climate_fills_gaps(gappy_weather, tmp_path):
+    model = MONICA(cell_weather=gappy_weather)
+    climate = model.prepare_sandbox(str(tmp_path), lon=37.5, lat=50.5)
+    df = pd.read_csv(climate, sep=";")
+    assert len(df) == 40 and not df.isna().any().any()
+    assert df.tmax.iloc[5] == df.tmax.iloc[6] == df.tmax.iloc[4]
+
+
+def test_cache_extracts_each_cell_once(power_weather, weather):
+    cache = CellWeatherCache(power_weather["meteo"], power_weather["solar"], maxsize=2)
+    first = cache.get(lon=37.45, lat=50.55)
+    assert cache.get(lon=37.55, lat=50.45) is first
+    np.testing.assert_array_equal(first.TMAX, weather.TMAX)
+    assert (first.latitude, first.longitude) == (50.5, 37.5)
+
+    cache.get(lon=36.9, lat=50.0)
+    cache.get(lon=38.75, lat=51.0)  # evicts the least recently used cell
+    assert cache.stats()["size"] == 2
+    assert cache.get(lon=37.5, lat=50.5) is not first
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_cache_concurrent_gets_share_one_extraction(power_weather, monkeypatch):
+    cache = CellWeatherCache(power_weather["meteo"], power_weather["solar"])
+    calls = []
+    extract = cache._extract
+    both_extracting = threading.Barrier(2, timeout=5)
+
+    def slow_extract(cell_id):
+        calls.append(cell_id)
+        # the two cells are extracted at the same time, not one after the
+        # other behind the cache lock
+        both_extracting.wait()
+        time.sleep(0.05)
+        return extract(cell_id)
+
+    monkeypatch.setattr(cache, "_extract", slow_extract)
+    barrier = threading.Barrier(8)
+
+    def get(i):
+        barrier.wait()
+        return cache.get(lon=37.5 + 1.25 * (i % 2), lat=50.5)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(get, range(8)))
+    assert len(calls) == 2
+    assert all(result is results[i % 2] for i, result in enumerate(results))
+
+
+def test_cache_does_not_keep_failed_extractions(power_weather, monkeypatch):
+    cache = CellWeatherCache(power_weather["meteo"], power_weather["solar"])
+    extract = cache._extract
+
+    def failing(cell_id):
+        raise RuntimeError("read failed")
+
+    monkeypatch.setattr(cache, "_extract", failing)
+    with pytest.raises(RuntimeError):
+        cache.get(lon=37.5, lat=50.5)
+    monkeypatch.setattr(cache, "_extract", extract)
+    assert cache.get(lon=37.5, lat=50.5).latitude == 50.5
@@ -0,0 +1,91 @@
+import os
+import queue
+import tempfile
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from pyCropModels.models.dssat import DSSATModel
+from pyCropModels.models.dssat_parallel import DSSATParallelExecutor
+from pyCropModels.models.dssat_workspace import DSSATWorkspacePool
+
+SEASON = {
+    "crop_name": "Wheat",
+    "cultivar": "IB1500",
+    "sowing": dt.datetime(2021, 4, 25),
+    "harvest": dt.datetime(2021, 9, 1),
+}
+
+
+def elevation(longitude, latitude):
+    return 150.0
+
+
+def test_workspace_pool_lends_each_run_directory_once():
+    # DSSAT fails in long paths, keep the default temp directory
+    with DSSATWorkspacePool(size=2) as pool:
+        assert pool.paths == [os.path.join(pool.root, f"run_{i}") for i in range(2)]
+        with pool.acquire() as first, pool.acquire() as second:
+            assert {first._RUN_PATH, second._RUN_PATH} == set(pool.paths)
+            with pytest.raises(queue.Empty):
+                with pool.acquire(timeout=0.01):
+                    pass
+        with pool.acquire(timeout=0.01) as again:
+            assert again in (first, second)
+    assert not os.path.exists(pool.root)
+    with pytest.raises(RuntimeError, match="closed"):
+        with pool.acquire():
+            pass
+    pool.close()
+
+
+def test_reused_run_directory_matches_a_fresh_one(season_weather):
+    model = DSSATModel(
+        season_weather["meteo"],
+        season_weather["solar"],
+        elevation_provider=elevation,
+    )
+    first = model.simulate(lat=50.5, lon=37.5, **SEASON)
+    run_path = model.workspaces.paths[0]
+    files = sorted(os.listdir(run_path))
+    # another cell and then the first one again in the same directory
+    model.simulate(lat=51.0, lon=38.75, **SEASON)
+    again = model.simulate(lat=50.5, lon=37.5, **SEASON)
+    assert sorted(os.listdir(run_path)) == files
+    model.close()
+    assert not os.path.exists(run_path)
+
+    fresh = DSSATModel(
+        season_weather["meteo"],
+        season_weather["solar"],
+        elevation_provider=elevation,
+    )
+    expected = fresh.simulate(lat=50.5, lon=37.5, **SEASON)
+    fresh.close()
+    pd.testing.assert_frame_equal(again, first)
+    pd.testing.assert_frame_equal(again, expected)
+
+
+def test_parallel_runs_match_serial_runs(season_weather):
+    points = [(50.5, 37.5), (51.0, 38.75), (50.0, 36.875), (50.5, 38.125)]
+    tasks = [{"lat": lat, "lon": lon, **SEASON} for lat, lon in points]
+    # an unknown cultivar fails its run only
+    tasks.insert(2, {**tasks[0], "cultivar": "XX0000"})
+    before = set(os.listdir(tempfile.gettempdir()))
+
+    # the workers and the serial model use the same default elevation
+    executor = DSSATParallelExecutor(
+        season_weather["meteo"], season_weather["solar"], max_workers=2
+    )
+    outputs = executor.run(tasks)
+    assert [output is None for output in outputs] == [False] * 2 + [True] + [False] * 2
+    assert executor.timing_stats()["runs"] == len(tasks)
+    # the worker run directories are removed with the batch
+    assert set(os.listdir(tempfile.gettempdir())) <= before
+
+    model = DSSATModel(season_weather["meteo"], season_weather["solar"])
+    for task, output in zip(tasks, outputs):
+        if output is not None:
+            pd.testing.assert_frame_equal(output, model.simulate(**task))
+    model.close()
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+import xarray as xr
+
+from pyCropModels.utils.elevation import ElevationProvider
+
+
+@pytest.fixture
+def dem_path(tmp_path):
+    """zarr DEM on descending y and x, as read from a GeoTIFF"""
+    y = np.arange(52.0, 48.9, -0.5)
+    x = np.arange(35.0, 40.1, 0.5)
+    height = 100.0 * y[:, None] + x[None, :]
+    path = str(tmp_path / "dem.zarr")
+    xr.Dataset({"height": (("y", "x"), height)}, coords={"y": y, "x": x}).to_zarr(path)
+    return path
+
+
+def test_dem_lookup(dem_path, caplog):
+    provider = ElevationProvider(dem_path=dem_path, default=-1.0)
+    elevation = provider.lookup(
+        longitude=[37.0, 37.1, 39.9, 42.0], latitude=[50.0, 50.6, 49.0, 50.0]
+    )
+    # nearest DEM cell, points off the DEM get the default
+    np.testing.assert_allclose(elevation, [5037.0, 5087.0, 4940.0, -1.0])
+    assert "1 points outside DEM" in caplog.text
+    assert provider(longitude=37.0, latitude=50.0) == 5037.0
+
+
+def test_cache_round_trip(dem_path, tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "elevation.npz")
+    provider = ElevationProvider(dem_path=dem_path, cache_path=cache_path)
+    lon, lat = [37.00001, 38.5, 42.0], [50.0, 51.5, 50.0]
+    expected = provider.lookup(lon, lat)
+    provider.save()
+
+    # a new provider answers from the cache, without the DEM
+    cached = ElevationProvider(cache_path=cache_path)
+
+    def no_lookup(lon, lat):
+        raise AssertionError("looked up %s" % list(zip(lon, lat)))
+
+    monkeypatch.setattr(cached, "_lookup_opentopodata", no_lookup)
+    # coordinates are rounded to the cache key
+    np.testing.assert_array_equal(cached.lookup(lon[:2], lat[:2]), expected[:2])
+    # points without elevation are not cached
+    with pytest.raises(AssertionError, match="looked up"):
+        cached.lookup(lon[2:], lat[2:])
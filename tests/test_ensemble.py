@@ -0,0 +1,96 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from pyCropModels.models.dssat import DSSATModel
+from pyCropModels.models.ensemble import EnsembleExecutor, RunningStats
+from pyCropModels.models.monica_env import get_template
+from pyCropModels.models.monica import MONICA_INPUT_DIR
+from pyCropModels.models.monica_worker import stand_in_yield
+
+
+def test_running_stats_matches_numpy():
+    rng = np.random.default_rng(5)
+    values = rng.normal(5000.0, 800.0, (3, 4))
+    values[1, 2] = np.nan  # failed run
+    values[:, 3] = [np.nan, np.nan, 4200.0]
+
+    stats = RunningStats(n_points=4)
+    # results arrive in any order
+    for model, i in rng.permutation([(m, i) for m in range(3) for i in range(4)]):
+        stats.update(i, values[model, i])
+
+    np.testing.assert_array_equal(stats.count, [3, 3, 2, 1])
+    np.testing.assert_allclose(stats.mean, np.nanmean(values, axis=0))
+    np.testing.assert_allclose(
+        stats.variance()[:3], np.nanvar(values[:, :3], axis=0, ddof=1)
+    )
+    np.testing.assert_allclose(
+        stats.std(ddof=0), np.nanstd(values, axis=0, ddof=0), atol=1e-9
+    )
+    assert np.isnan(stats.variance()[3])
+
+
+def test_running_stats_without_values():
+    stats = RunningStats(n_points=2)
+    stats.update(0, np.nan)
+    assert stats.count.tolist() == [0, 0]
+    assert np.isnan(stats.mean).all() and np.isnan(stats.std()).all()
+
+
+def test_ensemble_rejects_unknown_models_and_pools():
+    with pytest.raises(ValueError, match="Unknown models"):
+        EnsembleExecutor(weather={}, crops={"apsim": ("wheat", "x")})
+    with pytest.raises(ValueError, match="Unknown pool kind"):
+        EnsembleExecutor(
+            weather={}, crops={"dssat": ("WH", "x")}, pool_kinds={"dssat": "gpu"}
+        )
+
+
+def elevation(longitude, latitude):
+    return 150.0
+
+
+def test_ensemble_of_dssat_and_monica(season_weather, stand_in_workers):
+    lat, lon = [50.0, 51.0, 50.5], [37.5, 38.75, 38.125]
+    sowing, harvest = "2021-04-25", "2021-09-01"
+    executor = EnsembleExecutor(
+        weather=season_weather,
+        crops={"dssat": ("Wheat", "IB1500"), "monica": ("wheat", None)},
+        pool_sizes={"dssat": 2, "monica": 2},
+        model_kwargs={
+            "dssat": {"elevation_provider": elevation},
+            "monica": {"workers": stand_in_workers},
+        },
+    )
+    df = executor.run(lat=lat, lon=lon, sowing=sowing, harvest=harvest)
+
+    dssat = DSSATModel(
+        season_weather["meteo"],
+        season_weather["solar"],
+        elevation_provider=elevation,
+    )
+    template = get_template(MONICA_INPUT_DIR)
+    for i in range(len(lat)):
+        kwargs = {
+            "lat": lat[i],
+            "lon": lon[i],
+            "sowing": dt.datetime(2021, 4, 25),
+            "harvest": dt.datetime(2021, 9, 1),
+        }
+        # the grain yield of DSSAT, not the biomass compute() returns
+        grain = dssat.compute(
+            crop_name="Wheat", cultivar="IB1500", variable="HWAD", **kwargs
+        )
+        biomass = dssat.compute(crop_name="Wheat", cultivar="IB1500", **kwargs)
+        assert df.dssat[i] == grain and 0 < grain < biomass
+        env = template.env(
+            crop_name="wheat", planting=sowing, harvest=harvest, latitude=lat[i]
+        )
+        assert df.monica[i] == stand_in_yield(env)
+    dssat.close()
+    np.testing.assert_allclose(df["mean"], (df.dssat + df.monica) / 2)
+    np.testing.assert_allclose(df.spread, np.abs(df.dssat - df.monica) / np.sqrt(2))
+    assert df.n_models.tolist() == [2, 2, 2]
+    assert set(executor.timings) == {"dssat", "monica"}
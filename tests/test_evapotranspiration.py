@@ -0,0 +1,138 @@
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+from pcse.util import reference_ET as pcse_reference_ET
+
+from pyCropModels.weather.evapotranspiration import (
+    astro,
+    day_of_year,
+    estimate_angstrom_ab,
+    reference_ET,
+    reference_et_cube,
+)
+
+
+@pytest.fixture
+def daily_inputs():
+    rng = np.random.default_rng(3)
+    day = np.arange("2021-01-01", "2022-01-01", dtype="datetime64[D]")
+    tmin = rng.uniform(-15, 20, len(day))
+    return {
+        "DAY": day,
+        "TMIN": tmin,
+        "TMAX": tmin + rng.uniform(2, 15, len(day)),
+        "IRRAD": rng.uniform(1e6, 3e7, len(day)),
+        "VAP": rng.uniform(2, 20, len(day)),
+        "WIND": rng.uniform(0.5, 8, len(day)),
+    }
+
+
+@pytest.mark.parametrize("etmodel", ["PM", "P"])
+def test_reference_ET_matches_pcse(daily_inputs, etmodel):
+    site = {"LAT": 51.5, "ELEV": 210.0, "ANGSTA": 0.18, "ANGSTB": 0.55}
+    E0, ES0, ET0 = reference_ET(ETMODEL=etmodel, **site, **daily_inputs)
+    for i, day in enumerate(daily_inputs["DAY"].astype(object)):
+        expected = pcse_reference_ET(
+            DAY=day,
+            ETMODEL=etmodel,
+            **site,
+            **{k: v[i] for k, v in daily_inputs.items() if k != "DAY"},
+        )
+        assert (E0[i], ES0[i], ET0[i]) == pytest.approx(expected, abs=1e-9)
+
+
+def test_reference_et_cube_matches_points(daily_inputs):
+    lat = np.array([45.0, 60.0])
+    lon = np.array([30.0, 31.0, 32.0])
+    time = pd.DatetimeIndex(daily_inputs["DAY"])
+    shape = (len(time), len(lat), len(lon))
+    ds_pcse = xr.Dataset(
+        {
+            name: (
+                ("time", "lat", "lon"),
+                np.broadcast_to(values[:, None, None], shape),
+            )
+            for name, values in daily_inputs.items()
+            if name != "DAY"
+        },
+        coords={"time": time, "lat": lat, "lon": lon},
+    )
+    ds_et = reference_et_cube(ds_pcse, elevation=100.0, angstA=0.25, angstB=0.5)
+    assert ds_et.ET0.dims == ("time", "lat", "lon")
+    for j, latitude in enumerate(lat):
+        E0, ES0, ET0 = reference_ET(
+            LAT=latitude, ELEV=100.0, ANGSTA=0.25, ANGSTB=0.5, **daily_inputs
+        )
+        np.testing.assert_allclose(ds_et.E0.values[:, j, 1], E0 / 10.0)
+        np.testing.assert_allclose(ds_et.ET0.values[:, j, 2], ET0 / 10.0)
+
+
+@pytest.fixture
+def polar_cube(daily_inputs):
+    """Cube from the polar circle to near the pole, with no radiation on
+    the days without sun"""
+    lat = np.array([66.6, 70.0, 80.0, 89.5, -80.0])
+    time = pd.DatetimeIndex(daily_inputs["DAY"])
+    doy = day_of_year(daily_inputs["DAY"])[:, None]
+    angot, _ = astro(doy, lat[None, :], 0.0)
+    shape = (len(time), len(lat), 1)
+    variables = {
+        name: np.broadcast_to(values[:, None, None], shape)
+        for name, values in daily_inputs.items()
+        if name != "DAY"
+    }
+    variables["IRRAD"] = (0.5 * angot)[:, :, None]
+    return xr.Dataset(
+        {name: (("time", "lat", "lon"), values) for name, values in variables.items()},
+        coords={"time": time, "lat": lat, "lon": [30.0]},
+    )
+
+
+@pytest.mark.parametrize("etmodel", ["PM", "P"])
+def test_reference_et_cube_in_polar_night(polar_cube, etmodel):
+    ds_et = reference_et_cube(
+        polar_cube, elevation=10.0, angstA=0.25, angstB=0.5, ETmodel=etmodel
+    )
+    assert all(np.isfinite(ds_et[name]).all() for name in ["E0", "ES0", "ET0"])
+    # days without any sun, e.g. midwinter at 80 N
+    assert (polar_cube.IRRAD.values == 0).any()
+    for j, latitude in enumerate(polar_cube.lat.values):
+        for i, day in enumerate(polar_cube.time.values[::7]):
+            point = polar_cube.isel(time=7 * i, lat=j, lon=0)
+            expected = pcse_reference_ET(
+                DAY=pd.Timestamp(day).date(),
+                LAT=latitude,
+                ELEV=10.0,
+                TMIN=float(point.TMIN),
+                TMAX=float(point.TMAX),
+                IRRAD=float(point.IRRAD),
+                VAP=float(point.VAP),
+                WIND=float(point.WIND),
+                ANGSTA=0.25,
+                ANGSTB=0.5,
+                ETMODEL=etmodel,
+            )
+            actual = [
+                float(ds_et[name].values[7 * i, j, 0] * 10.0)
+                for name in ["E0", "ES0", "ET0"]
+            ]
+            assert actual == pytest.approx(expected, abs=1e-9)
+
+
+def test_angstrom_ab_of_polar_cells(polar_cube):
+    doy = day_of_year(polar_cube.time.values)[:, None]
+    toa, _ = astro(doy, polar_cube.lat.values[None, :], 0.0)
+    toa = xr.DataArray(toa, dims=("time", "lat")).expand_dims(lon=[30.0], axis=2)
+    rng = np.random.default_rng(4)
+    sfc = toa * rng.uniform(0.25, 0.75, toa.shape)
+    angstA, angstB = estimate_angstrom_ab(sfc, toa)
+    # the days without sun have no relative radiation, they are not used
+    assert np.isfinite(angstA).all() and np.isfinite(angstB).all()
+    estimated = ((toa > 0).sum("time") >= 200).values
+    # near the pole fewer than 200 days have sun, the default is kept
+    assert estimated.tolist() == [[True], [True], [True], [False], [True]]
+    angstA, angstB = angstA.values, angstB.values
+    assert ((angstA > 0.25) & (angstA < 0.3))[estimated].all()
+    assert ((angstA + angstB > 0.7) & (angstA + angstB < 0.75))[estimated].all()
+    assert (angstA[~estimated] == 0.29).all() and (angstB[~estimated] == 0.49).all()
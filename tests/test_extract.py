@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from pyCropModels.weather.extract import PointExtractor
+
+LON = np.array([37.05, 37.1, 38.7, 36.9])
+LAT = np.array([50.1, 50.2, 50.9, 50.6])
+
+
+def test_extract_matches_nearest_sel(power_weather):
+    meteo, solar = power_weather["meteo"], power_weather["solar"]
+    extractor = PointExtractor(ds_weather=meteo, ds_solar=solar)
+    values, cell_id = extractor.extract(longitude=LON, latitude=LAT)
+
+    assert values.shape == (len(LON), meteo.sizes["time"], len(extractor.variables))
+    assert cell_id[0] == cell_id[1]  # same weather cell
+    assert len(set(cell_id.tolist())) == 3
+    for i, (lon, lat) in enumerate(zip(LON, LAT)):
+        # the solar value of a point is the one of its weather cell centre
+        cell = meteo.sel(lat=lat, lon=lon, method="nearest")
+        for j, name in enumerate(extractor.variables):
+            ds = meteo if name in meteo else solar
+            expected = ds[name].sel(lat=cell.lat, lon=cell.lon, method="nearest")
+            np.testing.assert_array_equal(values[i, :, j], expected.values)
+
+
+def test_cell_id_is_flat_grid_index(power_weather):
+    extractor = PointExtractor(power_weather["meteo"], power_weather["solar"])
+    cell_id = extractor.cell_id([38.7], [50.9])
+    lat_idx, lon_idx = divmod(int(cell_id[0]), len(extractor.lon))
+    assert (extractor.lat[lat_idx], extractor.lon[lon_idx]) == (51.0, 38.75)
+
+
+def test_to_frame_converts_solar(power_weather):
+    meteo, solar = power_weather["meteo"], power_weather["solar"]
+    extractor = PointExtractor(ds_weather=meteo, ds_solar=solar)
+    values, _ = extractor.extract(longitude=LON[:1], latitude=LAT[:1])
+    df = extractor.to_frame(values[0])
+
+    assert list(df.columns) == extractor.weather_variables + ["DAY"] + (
+        extractor.solar_variables
+    )
+    np.testing.assert_array_equal(df.DAY.values, meteo.time.values)
+    np.testing.assert_array_equal(
+        df.T2M.values, meteo.T2M.sel(lat=50.0, lon=36.875).values
+    )
+    radiation = solar.ALLSKY_SFC_SW_DWN.sel(lat=49.6, lon=36.6).values
+    assert df.ALLSKY_SFC_SW_DWN.values == pytest.approx(radiation * 86400 / 1e6)
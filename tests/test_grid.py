@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+import geopandas as gpd
+import numpy as np
+from shapely.geometry import box
+
+from pyCropModels.models.grid import GridRunner
+
+
+def dssat_run_directories():
+    tempdir = tempfile.gettempdir()
+    return {name for name in os.listdir(tempdir) if name.startswith("pycropmodels")}
+
+
+def test_grid_runner_in_process_and_pooled(season_weather):
+    before = dssat_run_directories()
+
+    def run(max_workers):
+        runner = GridRunner(
+            weather=season_weather,
+            gdf=gpd.GeoDataFrame(geometry=[box(36.5, 49.9, 38.5, 50.6)]),
+            model="dssat",
+            crop="Wheat",
+            crop_variety="IB1500",
+            max_workers=max_workers,
+            chunksize=1,
+        )
+        sowing = ["2021-04-25", None, "2021-05-01"] + ["2021-04-25"] * 3
+        assert len(runner.cells) == len(sowing)
+        return runner.run(sowing=sowing, harvest="2021-09-01")
+
+    in_process = run(max_workers=1)
+    pooled = run(max_workers=2)
+    assert in_process.identical(pooled)
+    grid = in_process["yield"].values
+    # 2 x 3 cells inside the region, one of them without sowing date
+    assert np.isfinite(grid).sum() == 6 - 1
+    assert (grid[np.isfinite(grid)] > 0).all()
+    # the run directories of the workers are removed with their batch
+    assert dssat_run_directories() <= before
@@ -0,0 +1,20 @@
+import fsspec
+import xarray as xr
+
+from pyCropModels.weather.loading import load_concurrently, time_chunk
+
+
+def test_concurrent_load_matches_serial_load(power_store):
+    store = fsspec.get_mapper(power_store + "/power_901_daily_meteorology_lst.zarr")
+
+    def lazy():
+        return xr.open_zarr(store, consolidated=True).isel(lat=slice(2, 9))
+
+    assert time_chunk(lazy()) == 20
+    serial = lazy().load()
+    data_bytes = sum(var.nbytes for var in serial.data_vars.values())
+    for max_workers, time_block, blocks in [(1, 0, 3), (8, 0, 3), (8, 7, 9)]:
+        loaded, stats = load_concurrently(lazy(), max_workers, time_block)
+        xr.testing.assert_identical(loaded, serial)
+        assert stats["decoded_bytes"] == data_bytes
+        assert stats["blocks"] == blocks * len(serial.data_vars)
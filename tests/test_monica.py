@@ -0,0 +1,112 @@
+import os
+import sys
+import datetime as dt
+
+import pytest
+
+from pyCropModels.models.monica import MONICA, MONICA_INPUT_DIR
+from pyCropModels.models.monica_worker import stand_in_yield
+from pyCropModels.weather.cell_weather import CellWeatherCache
+
+# monica-run stand-in: checks its inputs in the working directory, logs the
+# run and writes the stand-in yield into out.csv, fails for latitude 0
+MONICA_RUN = """#!{python}
+import os, sys, json, time
+from pyCropModels.models.monica_worker import stand_in_yield
+
+runs = os.environ["MONICA_RUNS"]
+with open(sys.argv[1]) as f:
+    sim = json.load(f)
+env = {{}}
+for key in ["crop", "site"]:
+    with open(sim[key + ".json"]) as f:
+        env[key] = json.load(f)
+assert os.path.exists(sim["climate.csv"])
+if env["site"]["SiteParameters"]["Latitude"] == 0:
+    sys.exit("no soil")
+marker = os.path.join(runs, str(os.getpid()))
+open(marker, "w").close()
+running = len(os.listdir(runs))
+time.sleep(0.2)
+os.remove(marker)
+with open(runs + ".log", "a") as f:
+    f.write("%s %i\\n" % (os.getcwd(), running))
+with open("out.csv", "w") as f:
+    f.write('"crop"\\nCrop,Yield\\n[],[kg]\\nwheat,%r\\n\\n' % stand_in_yield(env))
+"""
+
+
+@pytest.fixture
+def monica_run(tmp_path, worker_env, monkeypatch):
+    """Stand-in executable, its runs are logged to runs.log"""
+    runs = tmp_path / "runs"
+    runs.mkdir()
+    monkeypatch.setenv("MONICA_RUNS", str(runs))
+    path = tmp_path / "monica-run"
+    path.write_text(MONICA_RUN.format(python=sys.executable))
+    path.chmod(0o755)
+    return str(path)
+
+
+def logged_runs(tmp_path):
+    with open(tmp_path / "runs.log") as f:
+        return [(cwd, int(running)) for cwd, running in map(str.split, f)]
+
+
+def input_files():
+    return {
+        name: os.path.getmtime(os.path.join(MONICA_INPUT_DIR, name))
+        for name in os.listdir(MONICA_INPUT_DIR)
+    }
+
+
+def test_runs_in_their_own_sandboxes(monica_run, power_weather, tmp_path):
+    workdir = tmp_path / "sandboxes"
+    workdir.mkdir()
+    before = input_files()
+    cache = CellWeatherCache(power_weather["meteo"], power_weather["solar"])
+    model = MONICA(
+        monica_cmd=monica_run, max_workers=2, workdir=str(workdir), cell_weather=cache
+    )
+    tasks = [
+        {
+            "crop": "wheat",
+            "crop_variety": None,
+            "lat": lat,
+            "lon": 37.5,
+            "sowing": dt.datetime(2021, 4, 25),
+            "harvest": dt.datetime(2021, 9, day),
+        }
+        for lat, day in [(50.0, 1), (50.5, 1), (51.0, 10), (50.5, 20)]
+    ]
+    yields = model.compute_many(tasks)
+
+    for task, monica_yield in zip(tasks, yields):
+        env = model.template.env(
+            crop_name="wheat",
+            planting="2021-04-25",
+            harvest=task["harvest"].strftime("%Y-%m-%d"),
+            latitude=task["lat"],
+        )
+        assert monica_yield == stand_in_yield(env)
+    runs = logged_runs(tmp_path)
+    assert len({cwd for cwd, _ in runs}) == len(tasks)
+    assert all(os.path.dirname(cwd) == str(workdir) for cwd, _ in runs)
+    assert max(running for _, running in runs) <= 2
+    # the sandboxes are removed and the input directory is left untouched
+    assert os.listdir(workdir) == []
+    assert input_files() == before
+
+
+def test_failed_run_removes_its_sandbox(monica_run, tmp_path):
+    model = MONICA(monica_cmd=monica_run, workdir=str(tmp_path))
+    with pytest.raises(RuntimeError, match="no soil"):
+        model.compute(
+            crop="wheat",
+            crop_variety=None,
+            lat=0.0,
+            lon=37.5,
+            sowing=dt.datetime(2021, 4, 25),
+            harvest=dt.datetime(2021, 9, 1),
+        )
+    assert sorted(os.listdir(tmp_path)) == ["monica-run", "runs"]
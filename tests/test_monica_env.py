@@ -0,0 +1,81 @@
+import os
+import copy
+import json
+
+import pytest
+
+from pyCropModels.models.monica import MONICA_INPUT_DIR, prepareCrop, prepareSite
+from pyCropModels.models.monica_env import ENV_FILES, MonicaEnvTemplate, cropsDict
+
+
+def load(name):
+    with open(os.path.join(MONICA_INPUT_DIR, name)) as f:
+        return json.load(f)
+
+
+def old_crop(crop_name, planting, harvest):
+    """Crop document of the prepareCrop that re-read crop.json every run"""
+    cropJson = load("crop.json")
+    cropJson["cropRotation"][0]["worksteps"][0]["date"] = planting
+    cropJson["cropRotation"][0]["worksteps"][1]["date"] = harvest
+    for target in ["species", "cultivar"]:
+        cropJson["cropRotation"][0]["worksteps"][0]["crop"]["cropParams"][target][
+            1
+        ] = cropsDict[crop_name][target]
+    cropJson["cropRotation"][0]["worksteps"][0]["crop"]["residueParams"][1] = cropsDict[
+        crop_name
+    ]["crop-residues"]
+    # the template also sets the winter crop flag of the crop
+    crop = cropJson["cropRotation"][0]["worksteps"][0]["crop"]
+    crop["is-winter-crop"] = cropsDict[crop_name]["is-winter-crop"]
+    return cropJson
+
+
+def old_site(latitude):
+    """Site document of the prepareSite that re-read site.json every run"""
+    siteJson = load("site.json")
+    siteJson["SiteParameters"]["Latitude"] = latitude
+    return siteJson
+
+
+@pytest.mark.parametrize("crop_name", list(cropsDict))
+def test_env_matches_the_documents_of_the_input_files(crop_name):
+    template = MonicaEnvTemplate(MONICA_INPUT_DIR)
+    base = copy.deepcopy((template.crop, template.site, template.sim))
+    env = template.env(
+        crop_name=crop_name, planting="2021-04-25", harvest="2021-09-01", latitude=51.2
+    )
+    assert env["crop"] == old_crop(crop_name, "2021-04-25", "2021-09-01")
+    assert env["site"] == old_site(51.2)
+    assert env["sim"] == load("sim-monica.json")
+
+    # the run documents share the template, which is left unchanged
+    other = template.env(
+        crop_name="barley", planting="2021-03-20", harvest="2021-08-01", latitude=49.0
+    )
+    assert env["crop"] == old_crop(crop_name, "2021-04-25", "2021-09-01")
+    assert other["crop"] == old_crop("barley", "2021-03-20", "2021-08-01")
+    assert (template.crop, template.site, template.sim) == base
+
+
+def test_write_and_prepare_functions(tmp_path):
+    template = MonicaEnvTemplate(MONICA_INPUT_DIR)
+    env = template.env(
+        crop_name="maize", planting="2021-05-01", harvest="2021-10-01", latitude=50.5
+    )
+    template.write(env, str(tmp_path))
+    for key, name in ENV_FILES.items():
+        with open(tmp_path / name) as f:
+            assert json.load(f) == env[key]
+
+    out_dir = tmp_path / "prepared"
+    out_dir.mkdir()
+    crop = prepareCrop(
+        MONICA_INPUT_DIR, "maize", "2021-05-01", "2021-10-01", str(out_dir)
+    )
+    site = prepareSite(MONICA_INPUT_DIR, 50.5, out_dir=str(out_dir))
+    assert (crop, site) == (env["crop"], env["site"])
+    with open(out_dir / "crop-monica.json") as f:
+        assert json.load(f) == old_crop("maize", "2021-05-01", "2021-10-01")
+    with open(out_dir / "site-monica.json") as f:
+        assert json.load(f) == old_site(50.5)
@@ -0,0 +1,52 @@
+import os
+
+import numpy as np
+import pytest
+
+from pyCropModels.models import monica_output
+from pyCropModels.models.monica_output import parse_out_csv, read_out_csv, read_yield
+
+OUT_CSV = os.path.join(os.path.dirname(__file__), "..", "examples", "out.csv")
+
+
+def test_read_out_csv_sections():
+    out = read_out_csv(OUT_CSV)
+
+    assert [name for name in out if name != "units"] == [
+        "daily",
+        "crop",
+        "yearly",
+        "run",
+    ]
+    daily = out["daily"]
+    assert daily["Date"].dtype == np.dtype("datetime64[D]")
+    assert daily["Date"][0] == np.datetime64("2021-01-01")
+    assert len({len(values) for values in daily.values()}) == 1
+    assert out["crop"]["Crop"].tolist() == ["barley/spring barley"]
+    assert out["crop"]["Yield"].tolist() == [9479.0]
+    assert out["crop"]["harvest"][0] == np.datetime64("2022-09-01")
+    assert out["units"]["crop"]["Yield"] == "[kgDM ha-1]"
+    np.testing.assert_array_equal(out["yearly"]["Year"], [2021, 2022, 2023, 2024])
+    assert out["run"]["Precip"].tolist() == [2428.62]
+
+
+def test_parse_out_csv_keeps_wanted_sections():
+    with open(OUT_CSV) as f:
+        out = parse_out_csv(f, sections=["crop"])
+    assert set(out) == {"units", "crop"}
+    assert list(out["units"]) == ["crop"]
+
+
+@pytest.mark.parametrize("tail_block", [monica_output.TAIL_BLOCK, 16])
+def test_read_yield(monkeypatch, tail_block):
+    # a small tail block has to grow until the section start is in it
+    monkeypatch.setattr(monica_output, "TAIL_BLOCK", tail_block)
+    assert read_yield(OUT_CSV) == 9479.0
+    assert read_yield(OUT_CSV, section="yearly", column="RunOff") == 138.7
+
+
+def test_read_yield_without_section(tmp_path):
+    path = tmp_path / "out.csv"
+    path.write_text('"daily"\nDate,Yield\n[],[kg]\n2021-01-01,0\n\n')
+    with pytest.raises(ValueError, match="No 'crop' section"):
+        read_yield(str(path))
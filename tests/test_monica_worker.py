@@ -0,0 +1,103 @@
+import io
+import sys
+import json
+import time
+import datetime as dt
+import threading
+
+import pytest
+
+from pyCropModels.models.monica import MONICA, MONICA_INPUT_DIR
+from pyCropModels.models.monica_env import get_template
+from pyCropModels.models.monica_worker import (
+    MonicaWorkerPool,
+    serve,
+    stand_in_yield,
+)
+
+# answers the first request after a delay, then exits
+ONE_SHOT = """
+import sys, json, time
+line = sys.stdin.readline()
+time.sleep(float(sys.argv[1]))
+sys.stdout.write(json.dumps({"id": json.loads(line)["id"], "yield": 1.0}) + "\\n")
+"""
+
+
+def env(latitude=50.0, harvest="2021-09-01"):
+    return get_template(MONICA_INPUT_DIR).env(
+        crop_name="wheat", planting="2021-04-25", harvest=harvest, latitude=latitude
+    )
+
+
+def test_serve_answers_every_line():
+    def handler(env, climate):
+        if climate == "missing.csv":
+            raise FileNotFoundError(climate)
+        return stand_in_yield(env)
+
+    requests = [
+        {"id": 1, "env": env()},
+        {"id": 2, "env": env(), "climate": "missing.csv"},
+        {"id": 3, "env": env(latitude=52.0)},
+    ]
+    stdin = io.StringIO("\n".join(json.dumps(r) for r in requests) + "\n\n")
+    stdout = io.StringIO()
+    serve(handler, stdin=stdin, stdout=stdout)
+    responses = [json.loads(line) for line in stdout.getvalue().splitlines()]
+    assert [r["id"] for r in responses] == [1, 2, 3]
+    assert responses[0]["yield"] == stand_in_yield(env())
+    assert "missing.csv" in responses[1]["error"]
+    assert responses[2]["yield"] == responses[0]["yield"] + 40.0
+
+
+def test_pool_of_stand_in_workers(stand_in_workers):
+    envs = [
+        env(latitude=lat, harvest=h)
+        for lat in [49.0, 51.5]
+        for h in ["2021-08-20", "2021-09-10"]
+    ]
+    assert stand_in_workers.map(envs) == [stand_in_yield(e) for e in envs]
+    processes = {worker.process.pid for worker in stand_in_workers._workers}
+    stand_in_workers.map(envs)
+    # the same workers answer every request
+    assert {worker.process.pid for worker in stand_in_workers._workers} == processes
+
+
+def test_monica_runs_on_the_workers(stand_in_workers):
+    model = MONICA(workers=stand_in_workers, max_workers=2)
+    result = model.compute(
+        crop="wheat",
+        crop_variety=None,
+        lat=50.5,
+        lon=37.5,
+        sowing=dt.datetime(2021, 4, 25),
+        harvest=dt.datetime(2021, 9, 1),
+    )
+    assert result == stand_in_yield(env(latitude=50.5))
+
+
+def test_pool_replaces_dead_workers(worker_env):
+    with MonicaWorkerPool(
+        size=1, worker_cmd=[sys.executable, "-c", ONE_SHOT, "0"]
+    ) as pool:
+        first = pool._workers[0]
+        assert pool.submit(env()) == 1.0
+        first.process.wait()
+        # the worker exited after its request, the next one gets a new worker
+        assert pool.submit(env()) == 1.0
+        assert pool._workers[0] is not first and len(pool._workers) == 1
+
+
+def test_close_stops_busy_workers(worker_env):
+    pool = MonicaWorkerPool(size=2, worker_cmd=[sys.executable, "-c", ONE_SHOT, "0.5"])
+    workers = list(pool._workers)
+    busy = threading.Thread(target=pool.submit, args=(env(),))
+    busy.start()
+    time.sleep(0.1)  # one worker is busy, the other one is idle
+    assert pool._idle.qsize() == 1
+    pool.close()
+    busy.join()
+    assert not any(worker.alive() for worker in workers)
+    with pytest.raises(RuntimeError):
+        pool.submit(env())
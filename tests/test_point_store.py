@@ -0,0 +1,109 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pyCropModels.weather.point_store import VARIABLES, WeatherPointStore
+
+
+def site(latitude, longitude):
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "elevation": 150.0,
+        "angstA": 0.18,
+        "angstB": 0.55,
+    }
+
+
+def frame(start, periods, offset=0.0):
+    day = pd.date_range(start, periods=periods)
+    i = np.arange(periods, dtype=float)
+    return pd.DataFrame(
+        {
+            "DAY": day,
+            "IRRAD": 8000.0 + 10 * i + offset,
+            "TMIN": 5.0 + 0.1 * i + offset,
+            "TMAX": 15.0 + 0.1 * i + offset,
+            "VAP": 1.0 + offset / 100,
+            "WIND": 3.0,
+            "RAIN": 2.0,
+        }
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    return WeatherPointStore(str(tmp_path / "weather.zarr"), point_chunk=2)
+
+
+def test_append_and_read(store):
+    assert len(store) == 0 and store.ds is None
+    store.append(
+        [site(51.5, 37.1), site(50.0, 36.0)],
+        [frame("2021-04-01", 30), frame("2021-04-01", 30, 1.0)],
+    )
+    assert len(store) == 2
+    assert (50.0, 36.0) in store
+
+    read_site, df = store.read(50.0, 36.0)
+    assert read_site == site(50.0, 36.0)
+    expected = frame("2021-04-01", 30, 1.0)
+    np.testing.assert_array_equal(df.DAY.values, expected.DAY.values)
+    for name in VARIABLES:
+        np.testing.assert_allclose(df[name].values, expected[name].values, rtol=1e-6)
+
+    with pytest.raises(KeyError):
+        store.read(10.0, 10.0)
+
+
+def test_append_skips_stored_points(store):
+    store.append([site(51.5, 37.1)], [frame("2021-04-01", 30)])
+    store.append(
+        [site(51.5, 37.1), site(50.0, 36.0), site(50.0, 36.0)],
+        [
+            frame("2021-04-01", 30, 5.0),
+            frame("2021-04-01", 30),
+            frame("2021-04-01", 30),
+        ],
+    )
+    assert store.ds.sizes["point"] == 2
+    _, df = store.read(51.5, 37.1)
+    assert df.TMIN.iloc[0] == pytest.approx(5.0)
+
+
+def test_append_extends_the_days(store):
+    store.append([site(51.5, 37.1)], [frame("2021-04-01", 30)])
+    # reaches 20 days past the stored days, which grow for all points
+    store.append([site(50.0, 36.0)], [frame("2021-04-21", 30)])
+    days = pd.DatetimeIndex(store.ds.day.values)
+    assert days[0] == pd.Timestamp("2021-04-01")
+    assert days[-1] == pd.Timestamp("2021-05-20")
+
+    _, first = store.read(51.5, 37.1)
+    assert len(first) == 30  # filler days are dropped
+    _, second = store.read(50.0, 36.0)
+    assert second.DAY.iloc[0] == pd.Timestamp("2021-04-21")
+    assert len(second) == 30
+
+
+def test_nearest_follows_appends(store):
+    with pytest.raises(FileNotFoundError):
+        store.nearest(50.0, 36.0)
+    store.append([site(51.5, 37.1)], [frame("2021-04-01", 10)])
+    assert store.nearest(50.0, 36.0) == (51.5, 37.1)
+    store.append([site(50.0, 36.0)], [frame("2021-04-01", 10)])
+    distance, point = store.query(50.1, 36.0)
+    assert point == (50.0, 36.0)
+    assert distance == pytest.approx(0.1)
+
+
+def test_provider(store):
+    store.append([site(51.5, 37.1)], [frame("2021-04-01", 30)])
+    provider = store.provider(51.5, 37.1)
+    wdc = provider(dt.date(2021, 4, 2))
+    assert wdc.IRRAD == pytest.approx(8010.0 * 1000.0)
+    assert wdc.VAP == pytest.approx(10.0)
+    assert wdc.RAIN == pytest.approx(0.2)
+    assert wdc.ET0 > 0
@@ -0,0 +1,42 @@
+import geopandas as gpd
+import pandas as pd
+import xarray as xr
+from shapely.geometry import box
+
+from pyCropModels.weather.aws_weather import AwsNasaPower
+from pyCropModels.weather.power_cache import NasaPowerCache, select_bbox
+
+PRODUCT = "power_901_daily_meteorology_lst.zarr"
+VARIABLES = ["T2M_MIN", "T2M_MAX"]
+BBOX = (36.5, 49.5, 38.5, 51.0)
+
+
+def test_cache_extends_the_window_and_serves_sub_windows(power_store, tmp_path):
+    power = AwsNasaPower(
+        gdf=gpd.GeoDataFrame(geometry=[box(*BBOX)]), store_url=power_store
+    )
+    cache = NasaPowerCache(str(tmp_path / "cache"), open_product=power.aws_nasapower)
+    remote = select_bbox(power.aws_nasapower(PRODUCT)[VARIABLES], BBOX).load()
+
+    day_bytes = (
+        sum(var.nbytes for var in remote.data_vars.values()) / remote.sizes["time"]
+    )
+
+    def days_read(start, end):
+        ds = cache.get(PRODUCT, VARIABLES, BBOX, start, end)
+        xr.testing.assert_equal(ds.load(), remote.sel(time=slice(start, end)))
+        return cache.read_stats[PRODUCT]["decoded_bytes"] / day_bytes
+
+    assert days_read("2021-03-10", "2021-03-20") == 11
+    # forward, only the days after the cached window are read
+    assert days_read("2021-03-10", "2021-04-10") == 21
+    # backward, the store is rewritten with the earlier days
+    assert days_read("2021-03-01", "2021-04-10") == 9
+
+    cached = xr.open_zarr(cache.store_path(PRODUCT, VARIABLES, BBOX))
+    assert pd.Timestamp(cached.time.values[0]) == pd.Timestamp("2021-03-01")
+    assert pd.Timestamp(cached.time.values[-1]) == pd.Timestamp("2021-04-10")
+    assert cached.sizes["time"] == 41
+
+    assert days_read("2021-03-05", "2021-03-25") == 0
+    assert cache.read_stats[PRODUCT]["blocks"] == 0
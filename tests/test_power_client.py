@@ -0,0 +1,121 @@
+import datetime as dt
+
+import pytest
+
+from pyCropModels.weather.power_client import (
+    PowerClient,
+    merge_ranges,
+    missing_ranges,
+    to_date,
+)
+
+
+d = to_date
+
+
+def test_to_date():
+    assert to_date("20210301") == to_date("2021-03-01") == dt.date(2021, 3, 1)
+    assert to_date(dt.datetime(2021, 3, 1, 12)) == dt.date(2021, 3, 1)
+
+
+def test_merge_ranges():
+    assert merge_ranges([]) == []
+    ranges = [
+        (d("20210310"), d("20210320")),
+        (d("20210101"), d("20210131")),
+        (d("20210201"), d("20210205")),  # adjacent to January
+        (d("20210315"), d("20210401")),  # overlaps
+        (d("20210312"), d("20210313")),  # inside
+    ]
+    assert merge_ranges(ranges) == [
+        (d("20210101"), d("20210205")),
+        (d("20210310"), d("20210401")),
+    ]
+
+
+@pytest.mark.parametrize(
+    "start, end, expected",
+    [
+        ("20210101", "20210131", []),
+        ("20201220", "20210110", [("20201220", "20201231")]),
+        (
+            "20201201",
+            "20210430",
+            [
+                ("20201201", "20201231"),
+                ("20210201", "20210228"),
+                ("20210401", "20210430"),
+            ],
+        ),
+        ("20210205", "20210210", [("20210205", "20210210")]),
+        ("20210315", "20210410", [("20210401", "20210410")]),
+    ],
+)
+def test_missing_ranges(start, end, expected):
+    cached = [(d("20210301"), d("20210331")), (d("20210101"), d("20210131"))]
+    assert missing_ranges(cached, d(start), d(end)) == [
+        (d(s), d(e)) for s, e in expected
+    ]
+
+
+def test_missing_ranges_without_cache():
+    assert missing_ranges([], d("20210101"), d("20210105")) == [
+        (d("20210101"), d("20210105"))
+    ]
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """Client answering from a stand-in of the POWER API"""
+    client = PowerClient(cache_dir=str(tmp_path), rate_limit=None)
+    client.requested = []
+    client.writes = 0
+
+    async def get(params, limiter):
+        client.requested.append((params["start"], params["end"]))
+        start, end = d(params["start"]), d(params["end"])
+        days = [
+            (start + dt.timedelta(days=i)).strftime("%Y%m%d")
+            for i in range((end - start).days + 1)
+        ]
+        return {
+            "header": {"fill_value": -999.0},
+            "properties": {"parameter": {"T2M": {day: 1.0 for day in days}}},
+        }
+
+    write_cache = client._write_cache
+
+    def count_writes(path, cached):
+        client.writes += 1
+        write_cache(path, cached)
+
+    monkeypatch.setattr(client, "_get", get)
+    monkeypatch.setattr(client, "_write_cache", count_writes)
+    return client
+
+
+def test_fetch_only_missing_dates(client):
+    response = client.fetch(51.5, 37.1, "20210110", "20210120", ["T2M"])
+    assert len(response["properties"]["parameter"]["T2M"]) == 11
+
+    response = client.fetch(51.5, 37.1, "20210101", "20210131", ["T2M"])
+    days = sorted(response["properties"]["parameter"]["T2M"])
+    assert (days[0], days[-1], len(days)) == ("20210101", "20210131", 31)
+    assert client.requested == [
+        ("20210110", "20210120"),
+        ("20210101", "20210109"),
+        ("20210121", "20210131"),
+    ]
+    # one cache write per fetch of a point, not per missing range
+    assert client.writes == 2
+
+    client.fetch(51.5, 37.1, "20210105", "20210125", ["T2M"])
+    assert len(client.requested) == 3 and client.writes == 2
+
+
+def test_fetch_many_fetches_every_point_once(client):
+    points = [(51.5, 37.1), (50.0, 36.0), (51.5, 37.1)]
+    responses = client.fetch_many(points, "20210101", "20210103", ["T2M"])
+    assert len(responses) == 3
+    assert responses[0] is responses[2]
+    assert len(client.requested) == 2
@@ -0,0 +1,83 @@
+import datetime as dt
+import os
+
+import numpy as np
+import pcse
+import pytest
+from pcse.settings import settings
+
+from pyCropModels.weather.weather_converter import CSVWeatherDataProvider
+
+HEADER = """## Site Characteristics
+Country     = 'USA'
+Station     = 'NASA'
+Description = 'NASA'
+Source      = 'NASA'
+Contact     = 'Peter Uithol'
+Longitude = 37.1; Latitude = 51.5; Elevation = 210.05; AngstromA = 0.18; AngstromB = 0.55; HasSunshine = False
+## Daily weather observations (missing values are NaN)
+DAY,IRRAD,TMIN,TMAX,VAP,WIND,RAIN,SNOWDEPTH
+"""
+
+
+@pytest.fixture
+def weather_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METEO_CACHE_DIR", str(tmp_path / "cache"))
+    os.makedirs(settings.METEO_CACHE_DIR, exist_ok=True)
+    days = np.arange("2020-01-01", "2020-03-01", dtype="datetime64[D]")
+    rows = [
+        "%s,%.1f,%.2f,%.2f,%.3f,%.2f,%.2f,NaN"
+        % (
+            str(d).replace("-", ""),
+            5000 + 50 * i,
+            -5 + 0.1 * i,
+            2 + 0.1 * i,
+            0.5,
+            3.0,
+            0.1 * (i % 3),
+        )
+        for i, d in enumerate(days)
+    ]
+    rows[10] = rows[10].replace(",3.00,", ",NaN,")  # missing WIND
+    path = tmp_path / "NASA_weather_latitude_51.5_longitude_37.1.csv"
+    path.write_text(HEADER + "\n".join(rows) + "\n")
+    return str(path)
+
+
+def test_parse_csv(weather_csv):
+    provider = CSVWeatherDataProvider(weather_csv, force_reload=True)
+    assert (provider.latitude, provider.longitude) == (51.5, 37.1)
+    assert (provider.angstA, provider.angstB) == (0.18, 0.55)
+    assert len(provider.store) == 59
+    with pytest.raises(Exception):
+        provider(dt.date(2020, 1, 11))  # row with missing WIND skipped
+
+    wdc = provider(dt.date(2020, 1, 2))
+    assert wdc.IRRAD == pytest.approx(5050 * 1000.0)
+    assert wdc.TMIN == pytest.approx(-4.9)
+    assert wdc.VAP == pytest.approx(5.0)
+    assert wdc.RAIN == pytest.approx(0.01)
+
+    reference = pcse.fileinput.CSVWeatherDataProvider(weather_csv, force_reload=True)
+    for day in [dt.date(2020, 1, 2), dt.date(2020, 2, 20)]:
+        for name in ["E0", "ES0", "ET0"]:
+            assert getattr(provider(day), name) == pytest.approx(
+                getattr(reference(day), name)
+            )
+
+
+def test_npz_cache_on_second_load(weather_csv, monkeypatch):
+    first = CSVWeatherDataProvider(weather_csv, force_reload=True)
+    cache = first._get_cache_filename(first.fp_csv_fname)
+    assert cache.endswith(".npz") and os.path.exists(cache)
+
+    def no_parse(*args, **kwargs):
+        raise AssertionError("CSV parsed again instead of reading the cache")
+
+    monkeypatch.setattr(CSVWeatherDataProvider, "_read_observations", no_parse)
+    second = CSVWeatherDataProvider(weather_csv)
+    assert (second.angstA, second.angstB) == (first.angstA, first.angstB)
+    assert len(second.store) == len(first.store)
+    day = dt.date(2020, 2, 1)
+    for name in ["IRRAD", "TMIN", "TMAX", "VAP", "WIND", "RAIN", "E0", "ES0", "ET0"]:
+        assert getattr(second(day), name) == getattr(first(day), name)
@@ -0,0 +1,69 @@
+import os
+
+import numpy as np
+import pytest
+
+from pyCropModels.weather.weather_index import (
+    WeatherIndex,
+    parse_weather_filename,
+    weather_filename,
+)
+
+POINTS = [(51.5, 37.1), (50.0, 36.0), (52.25, 38.5)]
+
+
+def touch(directory, name):
+    open(os.path.join(directory, name), "w").close()
+    # the directory mtime has to change, also on coarse filesystem clocks
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def weather_dir(tmp_path):
+    directory = tmp_path / "weather"
+    directory.mkdir()
+    for latitude, longitude in POINTS:
+        touch(str(directory), weather_filename(latitude, longitude))
+    touch(str(directory), "pattern.csv")
+    return str(directory)
+
+
+def test_parse_weather_filename():
+    assert parse_weather_filename(weather_filename(51.5, -37.1)) == (51.5, -37.1)
+    assert parse_weather_filename("pattern.csv") is None
+    assert parse_weather_filename("NASA_weather_latitude_x_longitude_1.csv") is None
+
+
+def test_query(weather_dir):
+    index = WeatherIndex(weather_dir)
+    assert len(index) == 3
+    distance, paths = index.query([51.4, 50.1], [37.0, 36.2], k=2)
+    assert paths.shape == (2, 2)
+    assert paths[0, 0] == os.path.join(weather_dir, weather_filename(51.5, 37.1))
+    assert distance[0, 0] == pytest.approx(np.hypot(0.1, 0.1))
+    assert index.nearest(50.1, 36.2) == os.path.join(
+        weather_dir, weather_filename(50.0, 36.0)
+    )
+    assert os.path.exists(index.sidecar)
+
+
+def test_query_without_files(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        WeatherIndex(str(tmp_path)).nearest(51.0, 37.0)
+
+
+def test_refresh_syncs_added_and_removed_files(weather_dir):
+    index = WeatherIndex(weather_dir)
+    assert not index.refresh()
+
+    os.remove(os.path.join(weather_dir, weather_filename(50.0, 36.0)))
+    touch(weather_dir, weather_filename(49.0, 35.0))
+    assert index.refresh()
+    assert len(index) == 3
+    assert index.nearest(50.0, 36.0).endswith(weather_filename(49.0, 35.0))
+
+    # a new index reads the sidecar instead of parsing the directory
+    reloaded = WeatherIndex(weather_dir)
+    assert sorted(reloaded.files.tolist()) == sorted(index.files.tolist())
+    assert reloaded.dir_mtime_ns == index.dir_mtime_ns
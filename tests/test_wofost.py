@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pcse.models import Wofost71_WLP_FD
+from pcse.util import DummySoilDataProvider, WOFOST71SiteDataProvider
+
+from pyCropModels.models.wofost import (
+    WeatherProviderCache,
+    WofostRunContext,
+    to_date,
+)
+from pyCropModels.models.wofost_output import OutputBuffer, OutputSpec
+from pyCropModels.weather.aws_weather import Aws_Wofost, weather_reference_et
+
+
+class FlatElevation:
+    def __call__(self, longitude, latitude):
+        return 150.0
+
+    def lookup(self, longitude, latitude):
+        return np.full(len(longitude), 150.0)
+
+
+@pytest.fixture
+def ds_et(season_weather):
+    return weather_reference_et(season_weather, elevation_provider=FlatElevation())
+
+
+@pytest.fixture
+def context(wofost_crop):
+    return WofostRunContext(
+        cropd=wofost_crop,
+        sited=WOFOST71SiteDataProvider(WAV=50),
+        soild=DummySoilDataProvider(),
+        crop="wheat",
+        crop_variety="npk",
+    )
+
+
+def test_parameters_overrides_stay_in_their_run(context, wofost_crop):
+    tdwi = wofost_crop["TDWI"]
+    params = context.parameters({"TDWI": 2 * tdwi, "WAV": 10.0})
+    assert (params["TDWI"], params["WAV"]) == (2 * tdwi, 10.0)
+    fresh = context.parameters()
+    assert (fresh["TDWI"], fresh["WAV"]) == (tdwi, 50.0)
+    assert context.cropdata["TDWI"] == tdwi
+    # the context keeps a snapshot, not the provider it was built from
+    wofost_crop["TDWI"] = 3 * tdwi
+    assert context.parameters()["TDWI"] == tdwi
+
+
+def test_runs_with_overrides_do_not_change_later_runs(context, season_weather, ds_et):
+    wdp = Aws_Wofost(
+        longitude=37.5,
+        latitude=50.5,
+        ds_weather=season_weather["meteo"],
+        ds_solar=season_weather["solar"],
+        ds_et=ds_et,
+    )
+    season = {"wdp": wdp, "sowing": "2021-04-01", "harvest": "2021-08-20"}
+    base = context.run(**season)
+    assert base > 0
+    assert context.run(overrides={"TDWI": 300.0}, **season) != base
+    assert context.run(**season) == base
+
+
+def test_provider_cache_hits_and_evictions(season_weather, ds_et):
+    cache = WeatherProviderCache(season_weather, maxsize=2, ds_et=ds_et)
+    first = cache.get(lon=37.45, lat=50.55)
+    # any point of the cell shares the provider built at the cell centre
+    assert cache.get(lon=37.55, lat=50.45) is first
+    assert (first.latitude, first.longitude) == (50.5, 37.5)
+
+    cache.get(lon=36.875, lat=50.0)
+    cache.get(lon=38.75, lat=51.0)  # evicts the least recently used cell
+    assert cache.get(lon=37.5, lat=50.5) is not first
+    assert cache.stats() == {
+        "hits": 1,
+        "misses": 4,
+        "hit_rate": 0.2,
+        "size": 2,
+        "maxsize": 2,
+    }
+    cache.clear()
+    assert cache.stats()["size"] == cache.hits == cache.misses == 0
+
+
+def test_streaming_output_matches_get_output(context, season_weather, ds_et):
+    wdp = Aws_Wofost(
+        longitude=38.125,
+        latitude=51.0,
+        ds_weather=season_weather["meteo"],
+        ds_solar=season_weather["solar"],
+        ds_et=ds_et,
+    )
+    seasons = [("2021-04-01", "2021-08-20"), ("2021-05-01", "2021-09-10")]
+    spec = OutputSpec(daily=["LAI", "TWSO", "SM"], summary=["TWSO", "TAGP"])
+    buffer = OutputBuffer(spec, n_points=2, days=season_weather["meteo"].time.values)
+    for point, (sowing, harvest) in enumerate(seasons):
+        yield_twso = context.run(wdp, sowing, harvest, output=buffer, point=point)
+
+        agro = context.agromanagement(to_date(sowing), to_date(harvest))
+        wofost = Wofost71_WLP_FD(context.parameters(), wdp, agro)
+        wofost.run_till_terminate()
+        expected = pd.DataFrame(wofost.get_output()).set_index("day")
+        days = (pd.DatetimeIndex(expected.index) - pd.Timestamp("2021-01-01")).days
+        for i, var in enumerate(spec.daily):
+            daily = expected[var].astype(float).values
+            np.testing.assert_allclose(buffer.daily[point, days, i], daily, rtol=1e-6)
+        # days outside of the run are left empty
+        assert np.isnan(buffer.daily[point, : days[0]]).all()
+        assert np.isnan(buffer.daily[point, days[-1] + 1 :]).all()
+
+        summary = wofost.get_summary_output()[-1]
+        np.testing.assert_allclose(
+            buffer.summary[point], [summary[var] for var in spec.summary], rtol=1e-6
+        )
+        assert yield_twso == summary["TWSO"]
+    ds = buffer.to_dataset(coords={"lat": [51.0, 51.0]})
+    np.testing.assert_array_equal(ds.LAI.values, buffer.daily[:, :, 0])
+    np.testing.assert_array_equal(ds.TWSO_summary.values, buffer.summary[:, 0])